@@ -0,0 +1,163 @@
+"""
+Background job executor for long-running ingests.
+
+Jobs run on a small thread pool so the event loop (and every /api/query
+served by this worker) is never blocked by cloning, parsing, embedding or
+FAISS work. Each job carries a live `progress` dict that the pipeline
+stages update and that GET /api/ingest/{job_id} reports, with an ETA.
+
+Jobs are single-flight per key: submitting work for a repo that already has
+a queued or running job returns that job instead of starting another one.
+"""
+import os
+import time
+import uuid
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", 2))
+
+# Finished jobs are kept this long so clients can collect their result
+JOB_TTL_SECONDS = 3600
+
+_executor = ThreadPoolExecutor(max_workers=INGEST_WORKERS, thread_name_prefix="ingest-job")
+_jobs = {}
+# single-flight key -> job_id of its queued/running job
+_inflight = {}
+_lock = threading.Lock()
+
+
+def new_progress():
+    return {
+        "stage": "queued",
+        "files_extracted": 0,
+        "extraction_done": False,
+        "chunks": 0,
+        "batches_embedded": 0,
+        # chunks of batches that failed to embed
+        "chunks_dropped": 0,
+        "vectors_indexed": 0,
+        # language -> {files, bytes, seconds} spent in tree-sitter
+        "parse": {},
+    }
+
+
+def _prune_jobs(now):
+    expired = [
+        job_id for job_id, job in _jobs.items()
+        if job["finished_at"] and now - job["finished_at"] > JOB_TTL_SECONDS
+    ]
+    for job_id in expired:
+        del _jobs[job_id]
+
+
+def _run(job, fn):
+    job["status"] = "running"
+    job["started_at"] = time.time()
+    try:
+        job["result"] = fn(job["progress"])
+        job["status"] = "completed"
+        job["progress"]["stage"] = "done"
+    except Exception as e:
+        traceback.print_exc()
+        job["status"] = "failed"
+        job["error"] = str(e)
+    finally:
+        job["finished_at"] = time.time()
+        with _lock:
+            if _inflight.get(job["key"]) == job["job_id"]:
+                del _inflight[job["key"]]
+
+
+def submit_job(repo_name, fn, key=None):
+    """
+    Queue fn(progress) on the job executor. Returns the job record; its
+    result becomes fn's return value once status is 'completed'.
+
+    If a job with the same `key` (default: repo_name) is still queued or
+    running, that job is returned instead and fn is not run.
+    """
+    key = key or repo_name
+    now = time.time()
+    job = {
+        "job_id": uuid.uuid4().hex,
+        "key": key,
+        "repo_name": repo_name,
+        "status": "queued",
+        "progress": new_progress(),
+        "created_at": now,
+        "started_at": None,
+        "finished_at": None,
+        "result": None,
+        "error": None,
+    }
+    with _lock:
+        _prune_jobs(now)
+        inflight_id = _inflight.get(key)
+        if inflight_id is not None:
+            print(f"[*] Attaching to in-flight job {inflight_id} for '{key}'")
+            return _jobs[inflight_id]
+        _jobs[job["job_id"]] = job
+        _inflight[key] = job["job_id"]
+
+    _executor.submit(_run, job, fn)
+    return job
+
+
+def completed_job(repo_name, result):
+    """Record a job that finished without any work (e.g. already indexed)."""
+    now = time.time()
+    job = {
+        "job_id": uuid.uuid4().hex,
+        "key": repo_name,
+        "repo_name": repo_name,
+        "status": "completed",
+        "progress": dict(new_progress(), stage="done"),
+        "created_at": now,
+        "started_at": now,
+        "finished_at": now,
+        "result": result,
+        "error": None,
+    }
+    with _lock:
+        _jobs[job["job_id"]] = job
+    return job
+
+
+def estimate_eta(job, now):
+    """
+    Seconds left, or None while it cannot be estimated. Once extraction is
+    done the chunk total is known and embedding is the long pole, so the
+    remaining chunks are projected at the observed vector rate.
+    """
+    progress = job["progress"]
+    if job["status"] != "running" or not progress["extraction_done"]:
+        return None
+
+    elapsed = now - job["started_at"]
+    done, total = progress["vectors_indexed"], progress["chunks"]
+    if done == 0 or elapsed <= 0:
+        return None
+    rate = done / elapsed
+    return max(0.0, (total - done) / rate)
+
+
+def get_job(job_id):
+    """Snapshot of a job for the status API, or None if unknown."""
+    with _lock:
+        job = _jobs.get(job_id)
+    if job is None:
+        return None
+
+    now = time.time()
+    end = job["finished_at"] or now
+    progress = dict(job["progress"])
+    # The chunk stage is still adding to these while we copy
+    progress["parse"] = {lang: dict(entry) for lang, entry in dict(progress["parse"]).items()}
+    return dict(
+        job,
+        progress=progress,
+        elapsed_seconds=end - job["started_at"] if job["started_at"] else 0.0,
+        eta_seconds=estimate_eta(job, now),
+    )
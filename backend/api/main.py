@@ -34,8 +34,12 @@ async def root():
         "docs": "/docs",
         "endpoints": {
             "ingest": "POST /api/ingest",
+            "ingest_status": "GET /api/ingest/{job_id}",
             "query": "POST /api/query",
-            "repos": "GET /api/repos"
+            "query_batch": "POST /api/query/batch",
+            "repos": "GET /api/repos",
+            "cache_stats": "GET /api/cache/stats",
+            "index_stats": "GET /api/index/stats"
         }
     }
 
@@ -3,30 +3,90 @@ Ingest endpoint - processes GitHub repositories
 """
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
-import traceback
+from typing import Dict, List, Optional
 import shutil
 import stat
 import os
 
-from backend.ingestion.pipeline import ingest_repo
-from backend.chunking.chunk_resolver import resolve_chunks
-from backend.chunking.save_chunks import save_chunks
-from backend.embeddings.generate_embeddings_local import generate_embeddings_local
-from backend.vector_store.faiss_store import create_faiss_index
+from backend.ingestion.classify_files import record_skip
+from backend.ingestion.pipeline import ingest_repo, run_ingest_pipeline
+from backend.ingestion.incremental import (
+    build_ingest_state,
+    incremental_ingest,
+    load_ingest_state,
+    track_file_hashes,
+)
+from backend.embeddings.generate_embeddings_local import EMBEDDING_MODEL
+from backend.api.utils.code_fetcher import clear_cache
+from backend.api.jobs import completed_job, get_job, submit_job
+from backend.storage.bundles import open_bundle, resolve_repo_key, write_repo_bundle
+from backend.storage.locks import repo_lock
 
 router = APIRouter()
 
 
 class IngestRequest(BaseModel):
+    # Git URL, or (with LOCAL_SOURCES_ROOT set) a local repository path or
+    # .tar.gz/.zip archive
     url: str
+    # Re-ingest an already indexed repo, re-embedding only changed files
+    update: bool = False
+
+
+class SkipReport(BaseModel):
+    files_kept: int = 0
+    bytes_kept: int = 0
+    # reason -> number of files skipped for it
+    skipped: Dict[str, int] = {}
+    # first few skipped files with their reason
+    skipped_files: List[Dict[str, str]] = []
 
 
 class IngestResponse(BaseModel):
     success: bool
+    # "owner/name" key of the repository
     repo_name: str
     message: str
     chunk_count: int
     already_indexed: bool = False
+    changed_files: int = 0
+    removed_files: int = 0
+    skip_report: Optional[SkipReport] = None
+
+
+class ParseStats(BaseModel):
+    files: int = 0
+    bytes: int = 0
+    seconds: float = 0.0
+
+
+class IngestProgress(BaseModel):
+    stage: str
+    files_extracted: int = 0
+    extraction_done: bool = False
+    chunks: int = 0
+    batches_embedded: int = 0
+    # chunks of batches that failed to embed (too many fail the job)
+    chunks_dropped: int = 0
+    vectors_indexed: int = 0
+    # language -> {files, bytes, seconds} spent parsing
+    parse: Dict[str, ParseStats] = {}
+
+
+class IngestJobResponse(BaseModel):
+    job_id: str
+    # queued | running | completed | failed
+    status: str
+    repo_name: str
+    # Set once the job has completed
+    result: Optional[IngestResponse] = None
+
+
+class IngestJobStatus(IngestJobResponse):
+    progress: IngestProgress
+    elapsed_seconds: float = 0.0
+    eta_seconds: Optional[float] = None
+    error: Optional[str] = None
 
 
 def remove_readonly(func, path, excinfo):
@@ -37,7 +97,7 @@ def remove_readonly(func, path, excinfo):
 
 def cleanup_repo(repo_name: str, repos_path: str = "data/repos"):
     """Delete the cloned repository after processing to save disk space."""
-    repo_path = os.path.join(repos_path, repo_name)
+    repo_path = os.path.join(repos_path, *repo_name.split("/"))
     try:
         if os.path.exists(repo_path):
             shutil.rmtree(repo_path, onerror=remove_readonly)
@@ -47,12 +107,22 @@ def cleanup_repo(repo_name: str, repos_path: str = "data/repos"):
 
 
 def is_repo_indexed(repo_name: str) -> tuple[bool, int]:
-    """Check if a repository is already indexed."""
-    faiss_path = f"vector_store/{repo_name}_faiss.index"
+    """Check if a repository is already indexed (reads only its bundle manifest)."""
+    bundle = open_bundle(resolve_repo_key(repo_name))
+    if bundle is not None:
+        return True, bundle.manifest["chunk_count"]
+
+    # Repos indexed before bundles are known by their bare name only
+    if "/" in repo_name or not os.path.exists(f"vector_store/{repo_name}_faiss.index"):
+        return False, 0
+
+    from backend.chunking.chunk_store import chunk_count
+    count = chunk_count(repo_name)
+    if count is not None:
+        return True, count
+
     chunks_path = f"data/chunks/{repo_name}_chunks.json"
-    
-    if os.path.exists(faiss_path) and os.path.exists(chunks_path):
-        # Count chunks
+    if os.path.exists(chunks_path):
         import json
         try:
             with open(chunks_path, "r", encoding="utf-8") as f:
@@ -64,78 +134,179 @@ def is_repo_indexed(repo_name: str) -> tuple[bool, int]:
 
 
 def get_repo_name_from_url(github_url: str) -> str:
-    """Extract repo name from GitHub URL."""
-    from urllib.parse import urlparse
-    parsed = urlparse(github_url)
-    return os.path.splitext(os.path.basename(parsed.path))[0]
+    """"owner/name" key of a GitHub URL, local repository path or archive."""
+    from backend.ingestion.clone_repo import get_repo_key
+    return get_repo_key(github_url)
+
+
+def update_repository(request: IngestRequest, repo_name: str, state: dict, chunk_count: int,
+                      progress: dict) -> IngestResponse:
+    """Patch an indexed repository with only the files changed since it was indexed."""
+    progress["stage"] = "waiting"
+    with repo_lock(repo_name):
+        # Another worker process may have updated it while we waited
+        state = load_ingest_state(repo_name) or state
+        try:
+            print(f"[*] Updating repository '{repo_name}' incrementally")
+            summary = incremental_ingest(request.url, repo_name, state, progress)
+            clear_cache()
+        finally:
+            cleanup_repo(repo_name)
+
+    if summary["chunk_count"] is None:
+        message = f"Repository '{repo_name}' is already up to date."
+    else:
+        chunk_count = summary["chunk_count"]
+        message = (f"Updated repository '{repo_name}': "
+                   f"{summary['changed_files']} files re-indexed, "
+                   f"{summary['removed_files']} removed")
+
+    return IngestResponse(
+        success=True,
+        repo_name=repo_name,
+        message=message,
+        chunk_count=chunk_count,
+        already_indexed=True,
+        changed_files=summary["changed_files"],
+        removed_files=summary["removed_files"]
+    )
 
 
-@router.post("/ingest", response_model=IngestResponse)
-async def ingest_repository(request: IngestRequest):
+def process_repository(request: IngestRequest, repo_name: str, progress: dict) -> IngestResponse:
     """
-    Ingest a GitHub repository:
-    1. Check if already indexed (skip if yes)
-    2. Clone the repository
-    3. Extract and chunk files
-    4. Generate embeddings
-    5. Create FAISS index
-    6. Save chunks for later code retrieval
-    7. Delete cloned repo (chunks contain the code)
+    Full ingest, run on the job executor while holding the repo's
+    cross-process lock:
+    1. Clone the repository
+    2. Extract, chunk, embed and index files (overlapping pipeline stages)
+    3. Publish chunks, index and state as the repo's next bundle version
+    4. Delete cloned repo (chunks contain the code)
+
+    With update=True it also re-ingests a repo that is indexed but has no
+    ingest state to diff against (indexed before bundles).
+    """
+    progress["stage"] = "waiting"
+    with repo_lock(repo_name):
+        # Another worker process may have finished this repo while we waited
+        indexed, chunk_count = is_repo_indexed(repo_name)
+        if indexed and (not request.update or load_ingest_state(repo_name) is not None):
+            return IngestResponse(
+                success=True,
+                repo_name=repo_name,
+                message=f"Repository '{repo_name}' is already indexed. Ready for queries!",
+                chunk_count=chunk_count,
+                already_indexed=True
+            )
+
+        try:
+            # Step 1: Ingest repo (clone + extract files)
+            print(f"[*] Ingesting repository: {request.url}")
+            progress["stage"] = "cloning"
+            data = ingest_repo(request.url, stream=True)
+            repo_name = data["repo_name"]
+            commit_sha = data["commit_sha"]
+            file_hashes, file_sizes = {}, {}
+            files = track_file_hashes(data["files"], file_hashes, file_sizes)
+        
+            # Step 2: Chunk, embed and index while files stream in
+            print(f"[*] Chunking, embedding and indexing {repo_name}")
+            result = run_ingest_pipeline(repo_name, files, stats=progress)
+            chunks = result["chunks"]
+            vectors, metadata = result["vectors"], result["metadata"]
+        
+            if result["index"] is None:
+                raise RuntimeError("No embeddings were generated")
+            # No hash for files missing vectors, so the next update embeds them again
+            for path in sorted(result["dropped_files"]):
+                file_hashes[path] = None
+                record_skip(data["report"], path, "embedding_failed")
+        
+            # Step 3: Publish chunks, the FAISS index and the ingest state
+            # (commit + per-file hashes and sizes, so later updates can diff
+            # against them within the repo budget)
+            print(f"[*] Saving {len(chunks)} chunks and {len(vectors)} vectors")
+            progress["stage"] = "saving"
+            state = build_ingest_state(commit_sha, file_hashes, metadata, range(len(metadata)),
+                                       file_sizes)
+            write_repo_bundle(repo_name, chunks, result["index"],
+                              {i: chunk["chunk_id"] for i, chunk in enumerate(metadata)},
+                              state, EMBEDDING_MODEL, result["metric"],
+                              embeddings=(range(len(vectors)), vectors))
+            clear_cache()
+        
+            return IngestResponse(
+                success=True,
+                repo_name=repo_name,
+                message=f"Successfully processed repository '{repo_name}'",
+                chunk_count=len(chunks),
+                already_indexed=False,
+                skip_report=SkipReport(**data["report"])
+            )
+        finally:
+            # Step 4: Cleanup - delete cloned repo to save disk space (even on error)
+            print("[*] Cleaning up cloned repository")
+            cleanup_repo(repo_name)
+
+
+def job_response(job: dict) -> IngestJobResponse:
+    return IngestJobResponse(
+        job_id=job["job_id"],
+        status=job["status"],
+        repo_name=job["repo_name"],
+        result=job["result"]
+    )
+
+
+@router.post("/ingest", response_model=IngestJobResponse)
+def ingest_repository(request: IngestRequest):
+    """
+    Start ingesting a repository and return a job id immediately.
+
+    Already indexed repositories complete straight away (unless update=True,
+    which patches the index with only the changed files, or re-ingests it in
+    full if there is no ingest state to diff against). Everything else
+    runs on the background job executor; poll GET /api/ingest/{job_id}.
     """
-    # First, check if repo is already indexed
     repo_name = get_repo_name_from_url(request.url)
     indexed, chunk_count = is_repo_indexed(repo_name)
     
-    if indexed:
+    state = load_ingest_state(repo_name) if indexed and request.update else None
+    if state is not None:
+        job = submit_job(repo_name, lambda progress: update_repository(
+            request, repo_name, state, chunk_count, progress))
+        return job_response(job)
+
+    if indexed and request.update:
+        print(f"[*] Repository '{repo_name}' has no ingest state, re-ingesting in full")
+    elif indexed:
         print(f"[*] Repository '{repo_name}' is already indexed with {chunk_count} chunks")
-        return IngestResponse(
+        job = completed_job(repo_name, IngestResponse(
             success=True,
             repo_name=repo_name,
             message=f"Repository '{repo_name}' is already indexed. Ready for queries!",
             chunk_count=chunk_count,
             already_indexed=True
-        )
+        ))
+        return job_response(job)
     
-    # Not indexed, proceed with full processing
-    try:
-        
-        # Step 1: Ingest repo (clone + extract files)
-        print(f"[*] Ingesting repository: {request.url}")
-        data = ingest_repo(request.url)
-        repo_name = data["repo_name"]
-        files = data["files"]
-        
-        # Step 2: Resolve chunks (AST-based + fallback)
-        print(f"[*] Resolving chunks for {repo_name}")
-        chunks = resolve_chunks(repo_name, files)
-        
-        # Step 3: Save chunks for later code retrieval
-        print(f"[*] Saving {len(chunks)} chunks")
-        save_chunks(repo_name, chunks)
-        
-        # Step 4: Generate embeddings
-        print(f"[*] Generating embeddings")
-        vectors, metadata = generate_embeddings_local(chunks, repo_name)
-        
-        # Step 5: Create FAISS index
-        print(f"[*] Creating FAISS index")
-        create_faiss_index(repo_name, vectors, metadata)
-        
-        # Step 6: Cleanup - delete cloned repo to save disk space
-        print(f"[*] Cleaning up cloned repository")
-        cleanup_repo(repo_name)
-        
-        return IngestResponse(
-            success=True,
-            repo_name=repo_name,
-            message=f"Successfully processed repository '{repo_name}'",
-            chunk_count=len(chunks),
-            already_indexed=False
-        )
-        
-    except Exception as e:
-        traceback.print_exc()
-        # Try to cleanup even on error
-        if repo_name:
-            cleanup_repo(repo_name)
-        raise HTTPException(status_code=500, detail=str(e))
+    # Not indexed (or nothing to update from), full processing in the background
+    job = submit_job(repo_name, lambda progress: process_repository(request, repo_name, progress))
+    return job_response(job)
+
+
+@router.get("/ingest/{job_id}", response_model=IngestJobStatus)
+async def ingest_status(job_id: str):
+    """Report a background ingest's status, per-stage progress and ETA."""
+    job = get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown ingest job '{job_id}'")
+
+    return IngestJobStatus(
+        job_id=job["job_id"],
+        status=job["status"],
+        repo_name=job["repo_name"],
+        result=job["result"],
+        progress=IngestProgress(**job["progress"]),
+        elapsed_seconds=job["elapsed_seconds"],
+        eta_seconds=job["eta_seconds"],
+        error=job["error"]
+    )
@@ -3,23 +3,64 @@ Query endpoint - searches for similar code chunks
 """
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import Dict, List, Literal, Optional
 import traceback
 
 router = APIRouter()
 
 
+class SearchFilters(BaseModel):
+    # Applied before the vector search (see
+    # backend/vector_store/search_filters.py)
+    languages: Optional[List[str]] = None
+    path_prefix: Optional[str] = None
+    path_glob: Optional[str] = None
+    chunk_type: Optional[Literal["function", "fallback"]] = None
+    min_lines: Optional[int] = None
+    max_lines: Optional[int] = None
+
+
 class QueryRequest(BaseModel):
-    repo_name: str
+    # One repo, or several: a list of repos and/or a repo group (see
+    # backend/vector_store/federated_search.py)
+    repo_name: Optional[str] = None
+    repos: Optional[List[str]] = None
+    group: Optional[str] = None
     query: str
     top_k: Optional[int] = 8
+    filters: Optional[SearchFilters] = None
+    # vector (embedding), lexical (BM25, no embedding) or hybrid (both,
+    # fused by reciprocal rank); see backend/vector_store/hybrid_search.py
+    mode: Literal["vector", "lexical", "hybrid"] = "vector"
+
+
+class BatchQuery(BaseModel):
+    query: str
+    # Default to the batch's repos, top_k and filters
+    repo_name: Optional[str] = None
+    repos: Optional[List[str]] = None
+    group: Optional[str] = None
+    top_k: Optional[int] = None
+    filters: Optional[SearchFilters] = None
+
+
+class BatchQueryRequest(BaseModel):
+    queries: List[BatchQuery]
+    repo_name: Optional[str] = None
+    repos: Optional[List[str]] = None
+    group: Optional[str] = None
+    top_k: Optional[int] = 8
+    filters: Optional[SearchFilters] = None
 
 
 class CodeResult(BaseModel):
+    repo_name: str
     file_path: str
     start_line: int
     end_line: int
     distance: float
+    # Lexical and hybrid modes: BM25 / fused score, higher is better
+    score: Optional[float] = None
     code: str
     language: str
 
@@ -28,79 +69,106 @@ class QueryResponse(BaseModel):
     success: bool
     query: str
     results: List[CodeResult]
+    # Multi-repo queries: repos searched, and those that could not be
+    repos: Optional[List[str]] = None
+    errors: Optional[Dict[str, str]] = None
+
+
+class BatchQueryResult(BaseModel):
+    query: str
+    success: bool
+    results: List[CodeResult]
+    error: Optional[str] = None
+    # Multi-repo queries: repos that could not be searched
+    errors: Optional[Dict[str, str]] = None
+
+
+class BatchQueryResponse(BaseModel):
+    success: bool
+    results: List[BatchQueryResult]
 
 
 def detect_language(file_path: str) -> str:
     """Detect programming language from file extension"""
-    ext_map = {
-        ".py": "python",
-        ".js": "javascript",
-        ".jsx": "jsx",
-        ".ts": "typescript",
-        ".tsx": "tsx",
-        ".java": "java",
-        ".cpp": "cpp",
-        ".c": "c",
-        ".h": "c",
-        ".hpp": "cpp",
-        ".cs": "csharp",
-        ".go": "go",
-        ".rs": "rust",
-        ".rb": "ruby",
-        ".php": "php",
-        ".html": "html",
-        ".css": "css",
-        ".scss": "scss",
-        ".json": "json",
-        ".yaml": "yaml",
-        ".yml": "yaml",
-        ".md": "markdown",
-        ".sql": "sql",
-        ".sh": "bash",
-        ".bash": "bash",
-        ".xml": "xml",
-    }
-    import os
-    ext = os.path.splitext(file_path)[1].lower()
-    return ext_map.get(ext, "plaintext")
+    from backend.parsing.language_map import display_language
+    return display_language(file_path)
+
+
+def search_filters(request: QueryRequest) -> Optional[dict]:
+    return request.filters.model_dump(exclude_none=True) if request.filters else None
+
+
+def to_code_result(repo_name: str, r: dict) -> CodeResult:
+    """A search hit with its code"""
+    from backend.api.utils.code_fetcher import get_code_from_chunks
+
+    chunk = r["chunk"]
+    file_path = chunk["file_path"]
+    start_line = chunk["start_line"]
+    end_line = chunk["end_line"]
+
+    # Get code from saved chunks (or fallback to file)
+    code = get_code_from_chunks(repo_name, file_path, start_line, end_line)
+    language = detect_language(file_path)
+
+    return CodeResult(
+        repo_name=repo_name,
+        file_path=file_path,
+        start_line=start_line,
+        end_line=end_line,
+        distance=r["distance"],
+        score=r.get("score"),
+        code=code,
+        language=language
+    )
 
 
 @router.post("/query", response_model=QueryResponse)
-async def query_repository(request: QueryRequest):
+def query_repository(request: QueryRequest):
     """
-    Query a repository for similar code chunks:
+    Query a repository for similar code chunks (plain def: FastAPI runs it on
+    its threadpool, so embedding/FAISS work never blocks the event loop):
     1. Search FAISS index for similar chunks
     2. Retrieve actual source code from stored files
     3. Return results with code content
+
+    With `repos` and/or `group` instead of `repo_name`, every listed repo is
+    searched in parallel and the results are ranked together.
+
+    `mode` picks vector, lexical (keyword, no embedding call) or hybrid
+    retrieval for a single repo.
     """
+    if request.repos or request.group:
+        if request.mode != "vector":
+            raise HTTPException(status_code=400, detail=f"mode '{request.mode}' takes a single repo_name")
+        return query_repositories(request)
+    if not request.repo_name:
+        raise HTTPException(status_code=400, detail="Give repo_name, repos or group")
+
     try:
-        from backend.vector_store.faiss_store import search_similar
-        from backend.api.utils.code_fetcher import get_code_from_chunks
-        
+        from backend.storage.bundles import resolve_repo_key
+
+        # Bare repo names resolve to their "owner/name" key when unambiguous
+        repo_name = resolve_repo_key(request.repo_name)
+
         # Search for similar chunks
-        print(f"[*] Searching for: {request.query}")
-        results = search_similar(request.repo_name, request.query, top_k=request.top_k)
+        print(f"[*] Searching ({request.mode}) for: {request.query}")
+        if request.mode == "lexical":
+            # Keyword search only: nothing here loads the embedding client
+            from backend.vector_store.hybrid_search import lexical_search
+            results = lexical_search(repo_name, request.query, top_k=request.top_k,
+                                     filters=search_filters(request))
+        elif request.mode == "hybrid":
+            from backend.vector_store.hybrid_search import hybrid_search
+            results = hybrid_search(repo_name, request.query, top_k=request.top_k,
+                                    filters=search_filters(request))
+        else:
+            from backend.vector_store.faiss_store import search_similar
+            results = search_similar(repo_name, request.query, top_k=request.top_k,
+                                     filters=search_filters(request))
         
         # Build response with actual code
-        code_results = []
-        for r in results:
-            chunk = r["chunk"]
-            file_path = chunk["file_path"]
-            start_line = chunk["start_line"]
-            end_line = chunk["end_line"]
-            
-            # Get code from saved chunks (or fallback to file)
-            code = get_code_from_chunks(request.repo_name, file_path, start_line, end_line)
-            language = detect_language(file_path)
-            
-            code_results.append(CodeResult(
-                file_path=file_path,
-                start_line=start_line,
-                end_line=end_line,
-                distance=r["distance"],
-                code=code,
-                language=language
-            ))
+        code_results = [to_code_result(repo_name, r) for r in results]
         
         return QueryResponse(
             success=True,
@@ -108,28 +176,151 @@ async def query_repository(request: QueryRequest):
             results=code_results
         )
         
-    except FileNotFoundError:
+    except FileNotFoundError as e:
         raise HTTPException(
             status_code=404, 
             detail=f"Repository '{request.repo_name}' not found. Please ingest it first."
+            if request.mode == "vector" else str(e)
         )
     except Exception as e:
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=str(e))
 
 
+def query_repositories(request: QueryRequest) -> QueryResponse:
+    """Multi-repo query: one embedding, per-repo searches merged by cosine distance"""
+    from backend.vector_store.federated_search import federated_search, resolve_repos
+
+    try:
+        repos = resolve_repos(
+            ([request.repo_name] if request.repo_name else []) + (request.repos or []),
+            request.group
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not repos:
+        raise HTTPException(status_code=404, detail="No repositories matched")
+
+    try:
+        print(f"[*] Searching {len(repos)} repos for: {request.query}")
+        results, errors = federated_search(repos, request.query, top_k=request.top_k,
+                                           filters=search_filters(request))
+
+        return QueryResponse(
+            success=True,
+            query=request.query,
+            results=[to_code_result(r["repo_name"], r) for r in results],
+            repos=repos,
+            errors=errors
+        )
+
+    except Exception as e:
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+def target_repos(repo_name, repos, group) -> List[str]:
+    """Repo keys a query targets; ValueError if it names none or a bad group"""
+    from backend.storage.bundles import resolve_repo_key
+    from backend.vector_store.federated_search import resolve_repos
+
+    if repos or group:
+        return resolve_repos(([repo_name] if repo_name else []) + list(repos or ()), group)
+    if repo_name:
+        return [resolve_repo_key(repo_name)]
+    raise ValueError("Give repo_name, repos or group")
+
+
+@router.post("/query/batch", response_model=BatchQueryResponse)
+def query_batch(request: BatchQueryRequest):
+    """
+    Many queries at once, each for one or more repos (its own or the
+    batch's). Queries are embedded in batched requests and searched with one
+    index.search per repo and filter set; results come back in query order,
+    with a failed query reported on its own result.
+    """
+    from backend.vector_store.batch_search import batch_search
+
+    # Repos are resolved once per distinct target
+    resolved = {}
+    queries, failed = [], {}
+    for i, q in enumerate(request.queries):
+        if q.repo_name or q.repos or q.group:
+            target = (q.repo_name, tuple(q.repos or ()), q.group)
+        else:
+            target = (request.repo_name, tuple(request.repos or ()), request.group)
+        if target not in resolved:
+            try:
+                resolved[target] = target_repos(*target)
+            except ValueError as e:
+                resolved[target] = str(e)
+        repos = resolved[target]
+        if isinstance(repos, str):
+            failed[i], repos = repos, []
+        filters = q.filters or request.filters
+        queries.append({
+            "query": q.query,
+            "repos": repos,
+            "top_k": q.top_k or request.top_k,
+            "filters": filters.model_dump(exclude_none=True) if filters else None,
+        })
+
+    try:
+        print(f"[*] Batch of {len(queries)} queries")
+        answers = batch_search(queries)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=str(e))
+
+    results = []
+    for i, (q, answer) in enumerate(zip(queries, answers)):
+        error = failed.get(i) or answer["error"]
+        try:
+            code_results = [] if error else [to_code_result(r["repo_name"], r) for r in answer["hits"]]
+        except Exception as e:
+            traceback.print_exc()
+            error, code_results = str(e), []
+        results.append(BatchQueryResult(
+            query=q["query"],
+            success=error is None,
+            results=code_results,
+            error=error,
+            errors=answer["errors"] if len(q["repos"]) > 1 else None
+        ))
+
+    return BatchQueryResponse(success=True, results=results)
+
+
 @router.get("/repos")
 async def list_repositories():
     """List all available repositories that have been ingested"""
     import os
     import glob
+    from backend.storage.bundles import list_repo_keys
     
-    repos = []
+    # "owner/name" keys of published bundles
+    repos = list_repo_keys()
     
-    # Check vector_store for indexed repos
+    # Repos indexed before bundles
     index_files = glob.glob("vector_store/*_faiss.index")
     for f in index_files:
         repo_name = os.path.basename(f).replace("_faiss.index", "")
         repos.append(repo_name)
     
     return {"repos": repos}
+
+
+@router.get("/cache/stats")
+def chunk_cache_stats():
+    """Size and hit/miss/eviction counters of the code lookup cache"""
+    from backend.api.utils.code_fetcher import cache_stats
+    return cache_stats()
+
+
+@router.get("/index/stats")
+def index_registry_stats():
+    """Resident FAISS indexes: memory use, hit/miss/eviction and load counters"""
+    from backend.vector_store.index_registry import registry_stats
+    return registry_stats()
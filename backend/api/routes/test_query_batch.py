@@ -0,0 +1,85 @@
+"""
+Tests for batch queries: python -m pytest backend/api/routes/test_query_batch.py
+"""
+import os
+import hashlib
+
+import numpy as np
+
+from backend.api.routes.query import BatchQuery, BatchQueryRequest, query_batch
+from backend.storage.bundles import write_repo_bundle
+from backend.vector_store import faiss_store
+from backend.vector_store.index_factory import build_index
+
+REPO = "batch/api"
+
+
+def fake_vector(text):
+    seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+    return np.random.default_rng(seed).random(8).tolist()
+
+
+def index_repo():
+    repo_path = os.path.join("data/repos", *REPO.split("/"))
+    chunks = [{"chunk_id": f"{REPO}_{name}_0", "repo_name": REPO, "type": "function",
+               "file_path": os.path.join(repo_path, name), "start_line": 0, "end_line": 20,
+               "content": f"def {name[:-3]}():\n    return 1\n"}
+              for name in ("charge.py", "refund.py")]
+    vectors = np.array([fake_vector(c["content"]) for c in chunks], dtype="float32")
+    write_repo_bundle(REPO, chunks, build_index(vectors, np.arange(len(chunks)), "flat", metric="cosine"),
+                      {i: c["chunk_id"] for i, c in enumerate(chunks)}, {}, "test", "cosine")
+
+
+def test_failed_queries_do_not_fail_the_batch(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    index_repo()
+    monkeypatch.setattr(faiss_store, "get_gemini_embeddings", lambda texts, task_type="retrieval_query": [
+        None if text == "unembeddable" else fake_vector(text) for text in texts])
+
+    response = query_batch(BatchQueryRequest(repo_name=REPO, top_k=1, queries=[
+        BatchQuery(query="charge"),
+        BatchQuery(query="   "),
+        BatchQuery(query="unembeddable"),
+        BatchQuery(query="charge", repo_name="nobody/missing"),
+        BatchQuery(query="charge", group="no-such-group"),
+        BatchQuery(query="refund", repos=[REPO, "nobody/missing"], top_k=2),
+    ]))
+
+    assert response.success
+    ok, empty, unembeddable, missing, no_group, partial = response.results
+    assert ok.success and ok.error is None
+    assert len(ok.results) == 1 and ok.results[0].code.startswith("def ")
+
+    assert (empty.success, empty.error, empty.results) == (False, "empty query", [])
+    assert (unembeddable.success, unembeddable.error) == (False, "could not embed the query")
+    assert (missing.success, missing.error) == (False, "nobody/missing: not indexed")
+    assert not no_group.success and "no-such-group" in no_group.error
+
+    # A multi-repo query answers from the repos it could search
+    assert partial.success and partial.errors == {"nobody/missing": "not indexed"}
+    assert sorted(os.path.basename(r.file_path) for r in partial.results) == ["charge.py", "refund.py"]
+
+
+def test_code_lookup_errors_stay_on_their_query(tmp_path, monkeypatch):
+    from backend.api.utils import code_fetcher
+
+    monkeypatch.chdir(tmp_path)
+    index_repo()
+    monkeypatch.setattr(faiss_store, "get_gemini_embeddings",
+                        lambda texts, task_type="retrieval_query": [fake_vector(t) for t in texts])
+    fetch = code_fetcher.get_code_from_chunks
+
+    def get_code(repo_name, file_path, start_line, end_line):
+        if file_path.endswith("refund.py"):
+            raise OSError("chunk store unreadable")
+        return fetch(repo_name, file_path, start_line, end_line)
+
+    monkeypatch.setattr(code_fetcher, "get_code_from_chunks", get_code)
+    # Each query's nearest chunk is its own
+    charge, refund = query_batch(BatchQueryRequest(repo_name=REPO, top_k=1, queries=[
+        BatchQuery(query="def charge():\n    return 1\n"),
+        BatchQuery(query="def refund():\n    return 1\n"),
+    ])).results
+
+    assert charge.success and os.path.basename(charge.results[0].file_path) == "charge.py"
+    assert (refund.success, refund.error, refund.results) == (False, "chunk store unreadable", [])
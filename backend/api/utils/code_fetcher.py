@@ -4,35 +4,122 @@ Utility to fetch actual source code from saved chunks.
 import os
 import json
 
+from backend.chunking.chunk_store import ChunkStore, store_path
+from backend.parsing.function_extractor import expand_chunk_content
+from backend.storage.bundles import CHUNKS_FILE, current_version, resolve_repo_key, version_dir
+from backend.storage.content_store import hydrate_chunks
+from backend.storage.lru import ByteLRU
 
-# Cache for loaded chunks to avoid repeated file reads
-_chunks_cache = {}
+
+# One memory-bounded LRU for everything read from chunk artifacts. Keys
+# carry the artifact version, so a re-ingest (by any worker process) makes
+# the old entries unreachable; they are dropped as soon as it is noticed.
+#   ("store", repo, version)                      -> open ChunkStore
+#   ("json", repo, version)                       -> legacy {(file, start, end): content}
+#   ("code", repo, version, file, start, end)     -> code string
+CODE_CACHE_BYTES = int(os.getenv("CODE_CACHE_BYTES", 64 * 1024 * 1024))
+_cache = ByteLRU(CODE_CACHE_BYTES)
+
+# Last artifact version seen per repo
+_versions = {}
+
+
+def artifact_version(repo_name: str, chunks_path: str = "data/chunks"):
+    """
+    (kind, version, path) of the repo's chunk artifact, or None if it has
+    none. A bundle's version is its published version number; legacy files
+    are replaced atomically, so a new one has a new inode.
+    """
+    version = current_version(repo_name)
+    if version is not None:
+        return "store", ("bundle", version), os.path.join(version_dir(repo_name, version), CHUNKS_FILE)
+
+    # Repos indexed before bundles
+    for kind, path in (("store", store_path(repo_name, chunks_path)),
+                       ("json", os.path.join(chunks_path, f"{repo_name}_chunks.json"))):
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            continue
+        return kind, (st.st_ino, st.st_mtime_ns, st.st_size), path
+    return None
+
+
+def _current_version(repo_name, chunks_path):
+    found = artifact_version(repo_name, chunks_path)
+    if found is None:
+        return None, None, None
+    kind, version, path = found
+    if _versions.get(repo_name) != version:
+        _versions[repo_name] = version
+        # Entries of any older version of this repo are stale
+        _cache.invalidate(lambda key: key[1] == repo_name and key[2] != version)
+    return kind, version, path
+
+
+def _store_cost(store):
+    # The lookup tables are what a store keeps resident; content pages are
+    # mapped from the file and reclaimable by the OS
+    return store.records.nbytes + store.ids.nbytes + store.file_offsets.nbytes
+
+
+def get_chunk_store(repo_name: str, chunks_path: str = "data/chunks"):
+    """The repo's memory-mapped chunk store, or None for legacy JSON repos."""
+    repo_name = resolve_repo_key(repo_name)
+    kind, version, path = _current_version(repo_name, chunks_path)
+    if kind != "store":
+        return None
+    return _store_for(repo_name, version, path)
+
+
+def _store_for(repo_name, version, path):
+    key = ("store", repo_name, version)
+    store = _cache.get(key)
+    if store is None:
+        try:
+            store = ChunkStore(path)
+        except FileNotFoundError:
+            return None
+        _cache.put(key, store, _store_cost(store))
+    return store
 
 
 def load_chunks_for_repo(repo_name: str, chunks_path: str = "data/chunks") -> dict:
     """
-    Load saved chunks for a repository and index by file_path + line range.
-    
-    Returns a dict keyed by (file_path, start_line, end_line) -> chunk content
+    Load a legacy JSON chunk file and index it by file_path + line range.
+    Repos with a chunk store are read through get_chunk_store instead.
+
+    Returns a dict keyed by (file_path, start_line, end_line) -> chunk content.
+    Nested function chunks are stored with placeholders for their children;
+    the content here has them expanded back to the full source.
     """
-    global _chunks_cache
-    
-    if repo_name in _chunks_cache:
-        return _chunks_cache[repo_name]
-    
-    file_path = os.path.join(chunks_path, f"{repo_name}_chunks.json")
-    
+    kind, version, file_path = _current_version(repo_name, chunks_path)
+    if kind != "json":
+        return {}
+    key = ("json", repo_name, version)
+    cached = _cache.get(key)
+    if cached is not None:
+        return cached
+
     try:
         with open(file_path, "r", encoding="utf-8") as f:
             chunks = json.load(f)
-        
+        # Bodies are stored once in the shared content store
+        chunks = hydrate_chunks(chunks)
+
+        by_id = {chunk["chunk_id"]: chunk for chunk in chunks if chunk.get("children")
+                 or chunk.get("parent_id")}
+
         # Index chunks for quick lookup
         indexed = {}
         for chunk in chunks:
-            key = (chunk["file_path"], chunk["start_line"], chunk["end_line"])
-            indexed[key] = chunk.get("content", "")
+            key_range = (chunk["file_path"], chunk["start_line"], chunk["end_line"])
+            if chunk.get("children"):
+                indexed[key_range] = expand_chunk_content(chunk, by_id)
+            else:
+                indexed[key_range] = chunk.get("content", "")
         
-        _chunks_cache[repo_name] = indexed
+        _cache.put(key, indexed, sum(len(code) for code in indexed.values()))
         return indexed
     except FileNotFoundError:
         return {}
@@ -46,7 +133,7 @@ def get_code_from_chunks(repo_name: str, file_path: str, start_line: int, end_li
     Get code content from saved chunks.
     
     Args:
-        repo_name: Name of the repository
+        repo_name: "owner/name" key (or unambiguous bare name) of the repository
         file_path: Path to the file (as stored in chunk metadata)
         start_line: Starting line number
         end_line: Ending line number
@@ -54,6 +141,22 @@ def get_code_from_chunks(repo_name: str, file_path: str, start_line: int, end_li
     Returns:
         The code content from the saved chunk
     """
+    repo_name = resolve_repo_key(repo_name)
+    kind, version, path = _current_version(repo_name, "data/chunks")
+    if kind == "store":
+        key = ("code", repo_name, version, file_path, start_line, end_line)
+        code = _cache.get(key)
+        if code is not None:
+            return code
+
+        # Only this chunk (and its nested children) is read from the store
+        store = _store_for(repo_name, version, path)
+        chunk = store.find(file_path, start_line, end_line) if store is not None else None
+        if chunk is None:
+            return get_code_from_file(file_path, start_line, end_line)
+        code = expand_chunk_content(chunk, store) if chunk.get("children") else chunk["content"]
+        return _cache.put(key, code, len(code))
+
     chunks = load_chunks_for_repo(repo_name)
     
     # Try exact match first
@@ -101,6 +204,14 @@ def get_code_from_file(file_path: str, start_line: int, end_line: int, base_path
 
 
 def clear_cache():
-    """Clear the chunks cache."""
-    global _chunks_cache
-    _chunks_cache = {}
+    """
+    Clear the chunks cache. Stores are not closed here: a query may still be
+    reading one, and the mapping is released once the last reference goes.
+    """
+    _cache.clear()
+    _versions.clear()
+
+
+def cache_stats() -> dict:
+    """Hit/miss/eviction counters and byte usage of the chunks cache."""
+    return _cache.stats()
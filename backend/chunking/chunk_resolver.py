@@ -1,27 +1,200 @@
 
 
 import os
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
 from backend.parsing.language_map import LANGUAGE_BY_EXTENSION
 from backend.parsing.function_extractor import extract_functions
 from backend.parsing.fallback_chunker import compute_fallback_chunks
+from backend.ingestion.notebooks import cell_at
+from backend.parsing.parser_pool import merge_parse_stats, record_parse_stats
+
+# Parsing is CPU-bound and holds the GIL, so it runs on a persistent pool of
+# worker processes, each loading the grammars it needs on first use.
+def _available_cpus():
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+PARSE_WORKERS = int(os.getenv("PARSE_WORKERS", _available_cpus()))
+
+# Files are taken from the input stream a window at a time and packed into
+# batches of roughly BATCH_BYTES of source of a single language.
+WINDOW_FILES = 256
+BATCH_BYTES = 256 * 1024
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def file_language(f):
+    """Parser language for a file record (notebooks carry their own)."""
+    if "language" in f:
+        return f["language"]
+    return LANGUAGE_BY_EXTENSION.get(os.path.splitext(f["file_path"])[1])
+
+
+def resolve_file_chunks(repo_name, f):
+    file_path = f["file_path"]
+    content = f["content"]
+
+    language = file_language(f)
+    # Notebook cells are natural places to cut
+    cells = f.get("cells") or []
+    cell_starts = [cell["start_line"] for cell in cells]
+
+    if language:
+        funcs, ranges, boundaries = extract_functions(content, file_path, repo_name, language)
+        fallback = compute_fallback_chunks(content, file_path, repo_name, ranges,
+                                           boundaries + cell_starts)
+        chunks = funcs + fallback
+    else:
+        from backend.chunking.chunker import chunk_content
+        chunks = chunk_content(content, file_path, repo_name, boundaries=cell_starts)
+
+    if cells:
+        for chunk in chunks:
+            chunk["cell_index"] = cell_at(cells, chunk["start_line"])
+    return chunks
+
 
 def resolve_chunks(repo_name, files):
     all_chunks = []
 
     for f in files:
-        file_path = f["file_path"]
-        content = f["content"]
+        all_chunks.extend(resolve_file_chunks(repo_name, f))
 
-        ext = os.path.splitext(file_path)[1]
-        language = LANGUAGE_BY_EXTENSION.get(ext)
+    return all_chunks
 
-        if language:
-            funcs, ranges = extract_functions(content, file_path, repo_name, language)
-            fallback = compute_fallback_chunks(content, file_path, repo_name, ranges)
-            all_chunks.extend(funcs)
-            all_chunks.extend(fallback)
-        else:
-            from backend.chunking.chunker import chunk_content
-            all_chunks.extend(chunk_content(content, file_path, repo_name))
 
-    return all_chunks
+def _resolve_batch(repo_name, batch):
+    # Workers run one batch at a time, so the stats are this batch's alone
+    with record_parse_stats() as stats:
+        results = [(i, resolve_file_chunks(repo_name, f)) for i, f in batch]
+    return results, stats
+
+
+def get_parse_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn, not fork: the pool is created from ingest threads, and
+            # forking a multi-threaded process can deadlock the child
+            _pool = ProcessPoolExecutor(
+                max_workers=PARSE_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _pool
+
+
+def _reset_parse_pool(broken):
+    """
+    Drop a broken pool so the next caller starts a fresh one, and shut it
+    down so its manager thread and pipes don't linger.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is broken:
+            _pool = None
+    broken.shutdown(wait=False, cancel_futures=True)
+
+
+def plan_batches(window, workers=PARSE_WORKERS):
+    """
+    Group (index, file) pairs by language and pack them into batches of
+    similar byte size, largest files first, so no worker ends up with all
+    the big files. Batch size shrinks for small windows to keep every
+    worker busy.
+    """
+    total = sum(len(f["content"]) for _, f in window)
+    target = max(1, min(BATCH_BYTES, total // max(1, workers)))
+
+    by_language = {}
+    for i, f in window:
+        language = file_language(f)
+        by_language.setdefault(language, []).append((i, f))
+
+    batches = []
+    for items in by_language.values():
+        items.sort(key=lambda item: len(item[1]["content"]), reverse=True)
+        batch, size = [], 0
+        for item in items:
+            batch.append(item)
+            size += len(item[1]["content"])
+            if size >= target:
+                batches.append(batch)
+                batch, size = [], 0
+        if batch:
+            batches.append(batch)
+    return batches
+
+
+def _submit_window(pool, repo_name, window):
+    """Submit a window's batches; returns {file index: future of its batch}."""
+    futures = {}
+    for batch in plan_batches(window):
+        future = pool.submit(_resolve_batch, repo_name, batch)
+        for i, _ in batch:
+            futures[i] = future
+    return futures
+
+
+def iter_resolved_chunks(repo_name, files, window_files=WINDOW_FILES, parse_stats=None):
+    """
+    Resolve chunks for a stream of files on the parse pool, yielding
+    (file, chunks) in input order. The next window is submitted before the
+    current one is drained, so workers stay busy across window boundaries.
+
+    `parse_stats` (optional dict) accumulates per-language parse counters,
+    see record_parse_stats.
+    """
+    if parse_stats is None:
+        parse_stats = {}
+
+    if PARSE_WORKERS <= 1:
+        for f in files:
+            with record_parse_stats() as stats:
+                chunks = resolve_file_chunks(repo_name, f)
+            merge_parse_stats(parse_stats, stats)
+            yield f, chunks
+        return
+
+    pool = get_parse_pool()
+    files = iter(files)
+    index = 0
+
+    def next_window():
+        nonlocal index
+        window = []
+        for f in files:
+            window.append((index, f))
+            index += 1
+            if len(window) == window_files:
+                break
+        return window
+
+    try:
+        current = next_window()
+        current_futures = _submit_window(pool, repo_name, current)
+        while current:
+            upcoming = next_window()
+            upcoming_futures = _submit_window(pool, repo_name, upcoming) if upcoming else {}
+
+            # Yield each file as soon as its own batch is back
+            results = {}
+            for i, f in current:
+                if i not in results:
+                    batch_results, stats = current_futures[i].result()
+                    results.update(batch_results)
+                    merge_parse_stats(parse_stats, stats)
+                yield f, results.pop(i)
+
+            current, current_futures = upcoming, upcoming_futures
+    except BrokenProcessPool:
+        # A worker died (e.g. a grammar crashed); start fresh next time
+        _reset_parse_pool(pool)
+        raise
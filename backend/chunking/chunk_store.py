@@ -0,0 +1,384 @@
+"""
+Binary, memory-mapped chunk store: chunks.store in a repo's artifact bundle
+(see backend/storage/bundles.py); repos indexed before bundles have theirs
+at data/chunks/{repo}.chunks.
+
+Opening a store maps the file and reads a fixed header; nothing else is
+parsed until a chunk is asked for. Layout (little endian, sections 8-byte
+aligned, offsets in the header):
+
+  header    magic, version, counts and section offsets
+  records   fixed-width row per chunk, sorted by (file id, start, end):
+            file_id, start_line, end_line, flags (compression, chunk type),
+            content offset/length (+ uncompressed length), meta offset/length
+  ids       (hash of chunk_id, record index), sorted by hash
+  files     offsets into the path blob, paths sorted (file id = position)
+  paths     utf-8 file paths
+  meta      compact JSON per chunk for the remaining fields (chunk_id,
+            type, parent/children, parts, ...); ids of chunks in the same
+            file are stored without their "{repo}_{file}_" prefix
+  repo      the repo name
+  zdict     zlib preset dictionary sampled from the repo's own chunks
+  content   per distinct body, its sha256 (32 bytes): bodies live once in
+            the shared content store (backend/storage/content_store.py),
+            so forks and vendored code are not stored again per repo. With
+            CHUNK_STORE_SHARED_BODIES=0 (self-contained stores) it holds the
+            bodies themselves instead, zlib-compressed with the preset
+            dictionary when that is smaller.
+
+Version 1 stores (before shared bodies) are still read.
+"""
+import os
+import mmap
+import zlib
+import json
+import struct
+import hashlib
+
+import numpy as np
+
+from backend.storage.atomic import atomic_write
+from backend.storage.content_store import chunk_refs, get_bodies, hydrate_chunks
+
+MAGIC = b"RQCHUNK1"
+VERSION = 2
+READABLE_VERSIONS = (1, 2)
+
+SHARED_BODIES = os.getenv("CHUNK_STORE_SHARED_BODIES", "1") == "1"
+
+# magic, version, n_records, n_files, then offset+length of each section
+_SECTIONS = ("records", "ids", "files", "paths", "meta", "repo", "zdict", "content")
+_HEADER = struct.Struct("<8sIII" + "QQ" * len(_SECTIONS))
+
+RECORD_DTYPE = np.dtype([
+    ("file_id", "<u4"),
+    ("start_line", "<u4"),
+    ("end_line", "<u4"),
+    ("flags", "<u4"),
+    ("content_off", "<u8"),
+    ("content_len", "<u4"),
+    ("raw_len", "<u4"),
+    ("meta_off", "<u8"),
+    ("meta_len", "<u4"),
+    ("pad", "<u4"),
+])
+ID_DTYPE = np.dtype([("hash", "<u8"), ("record", "<u4"), ("pad", "<u4")])
+
+FLAG_COMPRESSED = 1
+# Chunk type, so search filters need not decode meta: function chunks, and
+# everything else (fallback and plain line-window chunks). Stores written
+# before these flags have neither bit set.
+FLAG_FUNCTION = 2
+FLAG_FALLBACK = 4
+# Content is the sha256 of the body, held in the shared content store
+FLAG_SHARED = 8
+
+# zlib preset dictionaries are limited to 32 KB
+ZDICT_BYTES = 32 * 1024
+COMPRESS_LEVEL = 6
+
+# Fields kept in the fixed-width records rather than in meta
+_RECORD_FIELDS = {"file_path", "start_line", "end_line", "content", "repo_name", "body_hash"}
+
+# Rows read per shared-body lookup when iterating a store
+ITER_BLOCK = 500
+
+# Marks a chunk id stored relative to its file's "{repo}_{file}_" prefix
+_RELATIVE_ID = "~"
+
+
+def store_path(repo_name, base_path="data/chunks"):
+    return os.path.join(base_path, f"{repo_name}.chunks")
+
+
+def id_hash(chunk_id):
+    return int.from_bytes(hashlib.blake2b(chunk_id.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+def build_zdict(bodies, size=ZDICT_BYTES):
+    """
+    Preset dictionary from the repo's own bodies: zlib matches against its
+    tail first, so the most common bodies (imports, boilerplate) go last.
+    """
+    counts = {}
+    for body in bodies:
+        counts[body] = counts.get(body, 0) + 1
+    picked, total = [], 0
+    for body in sorted(counts, key=counts.get, reverse=True):
+        if total >= size:
+            break
+        data = body.encode("utf-8")[:4096]
+        picked.append(data)
+        total += len(data)
+    return b"".join(reversed(picked))[-size:]
+
+
+def _map_ids(meta, fn):
+    """Apply fn to every chunk id held in a chunk's meta fields."""
+    for key in ("chunk_id", "parent_id"):
+        if meta.get(key):
+            meta[key] = fn(meta[key])
+    if meta.get("children"):
+        meta["children"] = [dict(child, chunk_id=fn(child["chunk_id"])) for child in meta["children"]]
+    if meta.get("parts"):
+        meta["parts"] = [fn(part) for part in meta["parts"]]
+    return meta
+
+
+def _align(buf):
+    buf.extend(b"\0" * (-len(buf) % 8))
+
+
+def write_chunk_store(path, repo_name, chunks, compress=True, shared=None):
+    """
+    Write `chunks` (with content, or `body_hash` references) as a chunk
+    store at `path`. With shared bodies (the default, SHARED_BODIES) the
+    content goes to the shared content store and the store keeps the
+    hashes. Returns the record row of each chunk, in input order.
+    """
+    if shared is None:
+        shared = SHARED_BODIES
+    chunks = chunk_refs(chunks) if shared else hydrate_chunks(chunks)
+
+    paths = sorted({c["file_path"] for c in chunks})
+    file_ids = {p: i for i, p in enumerate(paths)}
+    order = sorted(range(len(chunks)), key=lambda i: (
+        file_ids[chunks[i]["file_path"]], chunks[i]["start_line"], chunks[i]["end_line"]))
+
+    if shared:
+        bodies = [chunks[i]["body_hash"] for i in order]
+        zdict = b""
+    else:
+        bodies = [chunks[i].get("content") or "" for i in order]
+        zdict = build_zdict(bodies) if compress else b""
+
+    rows = [0] * len(chunks)
+    records = np.zeros(len(chunks), dtype=RECORD_DTYPE)
+    ids = np.zeros(len(chunks), dtype=ID_DTYPE)
+    meta, content = bytearray(), bytearray()
+    # Identical bodies are stored once
+    stored = {}
+
+    for row, (i, body) in enumerate(zip(order, bodies)):
+        chunk = chunks[i]
+        rows[i] = row
+        raw = bytes.fromhex(body) if shared else body.encode("utf-8")
+        if raw not in stored:
+            data, flags = raw, FLAG_SHARED if shared else 0
+            if compress and raw and not shared:
+                comp = zlib.compressobj(COMPRESS_LEVEL, zdict=zdict) if zdict else zlib.compressobj(COMPRESS_LEVEL)
+                packed = comp.compress(raw) + comp.flush()
+                if len(packed) < len(raw):
+                    data, flags = packed, FLAG_COMPRESSED
+            stored[raw] = (len(content), len(data), flags)
+            content.extend(data)
+        content_off, content_len, flags = stored[raw]
+
+        extra = {k: v for k, v in chunk.items() if k not in _RECORD_FIELDS}
+        if chunk.get("repo_name", repo_name) != repo_name:
+            extra["repo_name"] = chunk["repo_name"]
+        prefix = f"{repo_name}_{chunk['file_path']}_"
+        _map_ids(extra, lambda cid: _RELATIVE_ID + cid[len(prefix):] if cid.startswith(prefix) else cid)
+        meta_bytes = json.dumps(extra, separators=(",", ":")).encode("utf-8")
+
+        type_flag = FLAG_FUNCTION if chunk.get("type") == "function" else FLAG_FALLBACK
+        records[row] = (file_ids[chunk["file_path"]], chunk["start_line"], chunk["end_line"], flags | type_flag,
+                        content_off, content_len, 0 if shared else len(raw), len(meta), len(meta_bytes), 0)
+        ids[row] = (id_hash(chunk["chunk_id"]), row, 0)
+        meta.extend(meta_bytes)
+
+    ids.sort(order="hash")
+
+    encoded_paths = [p.encode("utf-8") for p in paths]
+    file_offsets = np.zeros(len(paths) + 1, dtype="<u8")
+    file_offsets[1:] = np.cumsum([len(p) for p in encoded_paths])
+
+    sections = {
+        "records": records.tobytes(),
+        "ids": ids.tobytes(),
+        "files": file_offsets.tobytes(),
+        "paths": b"".join(encoded_paths),
+        "meta": bytes(meta),
+        "repo": repo_name.encode("utf-8"),
+        "zdict": zdict,
+        "content": bytes(content),
+    }
+
+    body = bytearray()
+    layout = []
+    for name in _SECTIONS:
+        _align(body)
+        layout.append((_HEADER.size + len(body), len(sections[name])))
+        body.extend(sections[name])
+
+    header = _HEADER.pack(MAGIC, VERSION, len(chunks), len(paths),
+                          *[v for pair in layout for v in pair])
+    with atomic_write(path, "wb") as f:
+        f.write(header)
+        f.write(body)
+    return rows
+
+
+def read_header(path):
+    """(n_records, n_files, {section: (offset, length)}) from the header alone."""
+    with open(path, "rb") as f:
+        raw = f.read(_HEADER.size)
+    if len(raw) < _HEADER.size:
+        raise ValueError(f"Truncated chunk store: {path}")
+    magic, version, n_records, n_files, *layout = _HEADER.unpack(raw)
+    if magic != MAGIC or version not in READABLE_VERSIONS:
+        raise ValueError(f"Not a chunk store (or unsupported version): {path}")
+    sections = {name: (layout[2 * i], layout[2 * i + 1]) for i, name in enumerate(_SECTIONS)}
+    return n_records, n_files, sections
+
+
+def chunk_count(repo_name, base_path="data/chunks"):
+    """Number of chunks in a repo's legacy store, or None if it has none."""
+    try:
+        return read_header(store_path(repo_name, base_path))[0]
+    except (OSError, ValueError):
+        return None
+
+
+class ChunkStore:
+    """
+    Read-only view of a chunk store. Opening it is O(1): the file is mapped
+    and the tables are numpy views over the mapping.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.n_records, self.n_files, self._sections = read_header(path)
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.size = len(self._mm)
+        self.records = self._array("records", RECORD_DTYPE)
+        self.ids = self._array("ids", ID_DTYPE)
+        self.file_offsets = self._array("files", np.dtype("<u8"))
+        self._zdict = self._bytes("zdict")
+        self.repo_name = self._bytes("repo").decode("utf-8")
+
+    def _array(self, name, dtype):
+        offset, length = self._sections[name]
+        return np.frombuffer(self._mm, dtype=dtype, count=length // dtype.itemsize, offset=offset)
+
+    def _bytes(self, name, start=0, length=None):
+        offset, total = self._sections[name]
+        if length is None:
+            length = total - start
+        return self._mm[offset + start:offset + start + length]
+
+    def __len__(self):
+        return self.n_records
+
+    def close(self):
+        # Drop the numpy views first: mmap refuses to close while exported
+        self.records = self.ids = self.file_offsets = None
+        try:
+            self._mm.close()
+        except BufferError:
+            pass
+
+    def file_path(self, file_id):
+        start, end = self.file_offsets[file_id], self.file_offsets[file_id + 1]
+        return self._bytes("paths", int(start), int(end - start)).decode("utf-8")
+
+    def file_id(self, file_path):
+        """Binary search of the sorted path table; None if absent."""
+        lo, hi = 0, self.n_files
+        while lo < hi:
+            mid = (lo + hi) // 2
+            candidate = self.file_path(mid)
+            if candidate == file_path:
+                return mid
+            if candidate < file_path:
+                lo = mid + 1
+            else:
+                hi = mid
+        return None
+
+    def body_hash(self, row):
+        """sha256 of the body of a row kept in the shared content store, else None."""
+        record = self.records[row]
+        if not record["flags"] & FLAG_SHARED:
+            return None
+        return self._bytes("content", int(record["content_off"]), int(record["content_len"])).hex()
+
+    def content(self, row):
+        record = self.records[row]
+        if record["flags"] & FLAG_SHARED:
+            h = self.body_hash(row)
+            return get_bodies([h]).get(h, "")
+        data = self._bytes("content", int(record["content_off"]), int(record["content_len"]))
+        if record["flags"] & FLAG_COMPRESSED:
+            decomp = zlib.decompressobj(zdict=self._zdict) if self._zdict else zlib.decompressobj()
+            data = decomp.decompress(data) + decomp.flush()
+        return data.decode("utf-8")
+
+    def chunk(self, row, with_content=True):
+        """The chunk dict stored at record `row`."""
+        record = self.records[row]
+        chunk = json.loads(self._bytes("meta", int(record["meta_off"]), int(record["meta_len"])))
+        file_path = self.file_path(int(record["file_id"]))
+        prefix = f"{self.repo_name}_{file_path}_"
+        _map_ids(chunk, lambda cid: prefix + cid[1:] if cid.startswith(_RELATIVE_ID) else cid)
+        chunk.setdefault("repo_name", self.repo_name)
+        chunk["file_path"] = file_path
+        chunk["start_line"] = int(record["start_line"])
+        chunk["end_line"] = int(record["end_line"])
+        h = self.body_hash(row)
+        if h is not None:
+            chunk["body_hash"] = h
+        if with_content:
+            chunk["content"] = self.content(row)
+        return chunk
+
+    def row_for_id(self, chunk_id):
+        h = np.uint64(id_hash(chunk_id))
+        i = int(np.searchsorted(self.ids["hash"], h))
+        # Walk the (rare) run of equal hashes
+        while i < len(self.ids) and self.ids["hash"][i] == h:
+            row = int(self.ids["record"][i])
+            if self.chunk(row, with_content=False)["chunk_id"] == chunk_id:
+                return row
+            i += 1
+        return None
+
+    def get(self, chunk_id, default=None):
+        """Chunk by id, without reading any other chunk."""
+        row = self.row_for_id(chunk_id)
+        return default if row is None else self.chunk(row)
+
+    def find(self, file_path, start_line, end_line):
+        """Chunk covering exactly file_path[start_line:end_line], or None."""
+        file_id = self.file_id(file_path)
+        if file_id is None:
+            return None
+        lo = int(np.searchsorted(self.records["file_id"], file_id, side="left"))
+        hi = int(np.searchsorted(self.records["file_id"], file_id, side="right"))
+        starts = self.records["start_line"][lo:hi]
+        row = lo + int(np.searchsorted(starts, start_line, side="left"))
+        while row < hi and self.records["start_line"][row] == start_line:
+            if self.records["end_line"][row] == end_line:
+                return self.chunk(row)
+            row += 1
+        return None
+
+    def __iter__(self):
+        # Shared bodies are fetched a block of rows at a time
+        for start in range(0, self.n_records, ITER_BLOCK):
+            chunks = [self.chunk(row, with_content=False)
+                      for row in range(start, min(start + ITER_BLOCK, self.n_records))]
+            bodies = get_bodies(c["body_hash"] for c in chunks if "body_hash" in c)
+            for row, chunk in enumerate(chunks, start):
+                h = chunk.get("body_hash")
+                chunk["content"] = bodies.get(h, "") if h is not None else self.content(row)
+                yield chunk
+
+
+def open_chunk_store(repo_name, base_path="data/chunks"):
+    """Open a repo's legacy chunk store, or return None if it has none."""
+    path = store_path(repo_name, base_path)
+    if not os.path.exists(path):
+        return None
+    return ChunkStore(path)
@@ -1,42 +1,164 @@
-import math
+import os
+import re
 
+# gemini-embedding-001 accepts 2048 input tokens per text. Chunks are kept
+# well under that so the approximate count never pushes one over the limit.
+MAX_CHUNK_TOKENS = int(os.getenv("CHUNK_MAX_TOKENS", 1024))
+OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", 48))
 
-def chunk_content(content, file_path, repo_name, chunk_size=800, overlap=100):
+# A boundary is only used for a cut if the chunk is at least this full;
+# otherwise the chunk is cut at the budget line instead.
+MIN_BOUNDARY_FILL = 0.5
+
+# Words, numbers and single punctuation marks: close to what BPE tokenizers
+# produce on source code, and cheap enough to run on every line.
+_TOKEN_RE = re.compile(r"[A-Za-z_]+|\d+|[^\sA-Za-z_\d]")
+
+
+def approx_token_count(text):
+    return len(_TOKEN_RE.findall(text))
+
+
+def load_hf_tokenizer(name):
     """
-    Splits content into overlapping chunks with line number tracking.
+    Exact token counts from a Hugging Face tokenizer (optional dependency).
+    Returns a callable usable as `tokenizer=`; its `token_starts` gives the
+    character offset of each token, for splitting long lines.
     """
-    lines = content.split('\n')
-    total_lines = len(lines)
+    from tokenizers import Tokenizer
 
-    chunks = []
+    tokenizer = Tokenizer.from_pretrained(name)
+
+    def count(text):
+        return len(tokenizer.encode(text, add_special_tokens=False).ids)
+
+    def starts(text):
+        return [start for start, _ in tokenizer.encode(text, add_special_tokens=False).offsets]
+
+    count.token_starts = starts
+    return count
+
+
+def token_starts(text, tokenizer):
+    """Character offset of each token of `text`, approximate unless the tokenizer provides them."""
+    starts = getattr(tokenizer, "token_starts", None)
+    if starts is not None:
+        return starts(text)
+    return [m.start() for m in _TOKEN_RE.finditer(text)]
+
+
+def split_long_line(line, max_tokens, tokenizer):
+    """
+    Hard-split a single line that alone exceeds the budget: the line is
+    tokenized once and cut every max_tokens tokens. Tokenizers without token
+    offsets are cut at approximate token starts, each piece checked with the
+    tokenizer and halved until it fits.
+    """
+    exact = tokenizer is approx_token_count or hasattr(tokenizer, "token_starts")
+    starts = token_starts(line, tokenizer)
+    pieces = []
+    begin, first = 0, 0
+    while begin < len(line):
+        take = max_tokens
+        while True:
+            end_token = first + take
+            # Tokens can share an offset (several bytes of one character)
+            while end_token < len(starts) and starts[end_token] <= begin:
+                end_token += 1
+            end = starts[end_token] if end_token < len(starts) else len(line)
+            if exact or take == 1 or tokenizer(line[begin:end]) <= max_tokens:
+                break
+            take //= 2
+        pieces.append(line[begin:end])
+        begin, first = end, end_token
+    return pieces
+
+
+def plan_token_windows(line_tokens, max_tokens, overlap_tokens, boundaries=()):
+    """
+    Split lines (given their token counts) into [start, end) windows of at
+    most max_tokens, preferring to cut at `boundaries` (line indices where a
+    syntactic unit starts). Consecutive windows share up to overlap_tokens
+    worth of trailing lines.
+    """
+    total = len(line_tokens)
+    boundaries = sorted(set(boundaries))
+    windows = []
     start = 0
-    chunk_index = 0
 
-    while start < total_lines:
-        end = min(start + chunk_size, total_lines)
-        chunk_lines = lines[start:end]
+    while start < total:
+        end, used = start, 0
+        while end < total and (end == start or used + line_tokens[end] <= max_tokens):
+            used += line_tokens[end]
+            end += 1
+
+        if end < total and boundaries:
+            # Pull the cut back to the last boundary if the chunk stays full enough
+            fill = 0
+            cut = None
+            for b in boundaries:
+                if b <= start:
+                    continue
+                if b >= end:
+                    break
+                fill = sum(line_tokens[start:b])
+                if fill >= MIN_BOUNDARY_FILL * max_tokens:
+                    cut = b
+            if cut is not None:
+                end = cut
+
+        windows.append((start, end))
+        if end >= total:
+            break
+
+        # Step back over the last lines to build the overlap, leaving room
+        # for the next window to get past `end`
+        next_start, carried = end, 0
+        limit = min(overlap_tokens, max_tokens - line_tokens[end])
+        while next_start - 1 > start and carried + line_tokens[next_start - 1] <= limit:
+            next_start -= 1
+            carried += line_tokens[next_start]
+        start = next_start
+
+    return windows
 
-        chunk_text = "\n".join(chunk_lines)
 
-        chunk_id = f"{repo_name}_{chunk_index}"
+def chunk_content(content, file_path, repo_name, max_tokens=MAX_CHUNK_TOKENS,
+                  overlap_tokens=OVERLAP_TOKENS, tokenizer=None, boundaries=()):
+    """
+    Splits content into chunks of at most `max_tokens` tokens (counted with
+    `tokenizer`, approx_token_count by default) with line number tracking.
+    Cuts prefer the line indices in `boundaries`; a single line longer than
+    the budget is split mid-line.
+    """
+    tokenizer = tokenizer or approx_token_count
+    lines = content.split('\n')
+
+    # Break up any line that is on its own over budget, remembering which
+    # original line each piece came from
+    pieces, origin, line_tokens = [], [], []
+    for i, line in enumerate(lines):
+        count = tokenizer(line)
+        parts = [line] if count <= max_tokens else split_long_line(line, max_tokens, tokenizer)
+        for part in parts:
+            pieces.append(part)
+            origin.append(i)
+            line_tokens.append(count if len(parts) == 1 else tokenizer(part))
 
+    boundaries = set(boundaries)
+    piece_boundaries = [j for j, i in enumerate(origin) if i in boundaries
+                        and (j == 0 or origin[j - 1] != i)]
+
+    chunks = []
+    windows = plan_token_windows(line_tokens, max_tokens, overlap_tokens, piece_boundaries)
+    for chunk_index, (start, end) in enumerate(windows):
         chunks.append({
-            "chunk_id": chunk_id,
+            "chunk_id": f"{repo_name}_{file_path}_{chunk_index}",
             "repo_name": repo_name,
             "file_path": file_path,
-            "content": chunk_text,
-            "start_line": start,
-            "end_line": end
+            "content": "\n".join(pieces[start:end]),
+            "start_line": origin[start],
+            "end_line": origin[end - 1] + 1
         })
 
-        chunk_index += 1
-        
-        # Calculate next start position with overlap
-        # Ensure we always advance by at least 1 line to prevent infinite loop
-        next_start = end - overlap
-        if next_start <= start:
-            # If overlap would cause no progress, just move to end
-            next_start = end
-        start = next_start
-
     return chunks
@@ -42,10 +42,12 @@ def extract_code_units(code, parser, file_path, repo_name):
     units = []
     idx = 0
 
-    def traverse(node):
-        nonlocal idx
-
+    # Iterative TreeCursor walk: no recursion limit on deeply nested code
+    cursor = root.walk()
+    while True:
+        node = cursor.node
         node_type = node.type
+        descend = True
 
         if node_type in FUNCTION_NODES:
             start = node.start_point[0]
@@ -63,10 +65,12 @@ def extract_code_units(code, parser, file_path, repo_name):
             })
             idx += 1
             # Don't traverse into children of functions (avoid nested function duplication)
-            return
-
-        for child in node.children:
-            traverse(child)
+            descend = False
 
-    traverse(root)
-    return units
+        if (descend and cursor.goto_first_child()) or cursor.goto_next_sibling():
+            continue
+        while True:
+            if not cursor.goto_parent():
+                return units
+            if cursor.goto_next_sibling():
+                break
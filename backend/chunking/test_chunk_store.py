@@ -0,0 +1,87 @@
+"""
+Tests for the chunk store: python -m pytest backend/chunking/test_chunk_store.py
+"""
+import sqlite3
+
+import pytest
+
+from backend.chunking.chunk_store import FLAG_SHARED, ChunkStore, read_header, write_chunk_store
+from backend.storage import content_store
+from backend.storage.content_store import body_hash
+
+SHARED_BODY = "def helper():\n    return 42\n"
+
+
+def repo_chunks(repo):
+    prefix = f"{repo}_src/app.py_"
+    return [
+        {"chunk_id": prefix + "0:0", "repo_name": repo, "file_path": "src/app.py", "type": "function",
+         "start_line": 0, "end_line": 5, "content": "def outer():\n    def inner(): ...\n    return inner\n",
+         "parent_id": None, "children": [{"chunk_id": prefix + "1:4", "start_line": 1, "end_line": 2,
+                                          "offset": 14, "length": 16}]},
+        {"chunk_id": prefix + "1:4", "repo_name": repo, "file_path": "src/app.py", "type": "function",
+         "start_line": 1, "end_line": 2, "content": "def inner():\n    return 1\n",
+         "parent_id": prefix + "0:0", "children": []},
+        {"chunk_id": f"{repo}_lib/util.py_0", "repo_name": repo, "file_path": "lib/util.py",
+         "start_line": 0, "end_line": 2, "content": SHARED_BODY},
+        # Same body twice in one repo (e.g. a vendored copy)
+        {"chunk_id": f"{repo}_lib/copy.py_0", "repo_name": repo, "file_path": "lib/copy.py",
+         "start_line": 0, "end_line": 2, "content": SHARED_BODY},
+    ]
+
+
+@pytest.fixture
+def shared_store(tmp_path, monkeypatch):
+    path = str(tmp_path / "content_store.db")
+    monkeypatch.setattr(content_store, "STORE_PATH", path)
+    return path
+
+
+def stored_bodies(path):
+    with sqlite3.connect(path) as conn:
+        return conn.execute("SELECT COUNT(*) FROM bodies").fetchone()[0]
+
+
+def test_round_trip_with_shared_bodies(tmp_path, shared_store):
+    chunks = repo_chunks("acme/api")
+    rows = write_chunk_store(str(tmp_path / "api.store"), "acme/api", chunks, shared=True)
+    store = ChunkStore(str(tmp_path / "api.store"))
+
+    # Rows are sorted by (file, start, end) and returned in input order
+    assert sorted(rows) == list(range(len(chunks)))
+    assert [store.chunk(row)["chunk_id"] for row in rows] == [c["chunk_id"] for c in chunks]
+    for chunk in chunks:
+        got = store.get(chunk["chunk_id"])
+        assert got == dict(chunk, body_hash=body_hash(chunk["content"]))
+        assert store.find(chunk["file_path"], chunk["start_line"], chunk["end_line"]) == got
+    assert sorted(c["chunk_id"] for c in store) == sorted(c["chunk_id"] for c in chunks)
+
+    # The store holds 32-byte hashes, each distinct body once
+    _, _, sections = read_header(str(tmp_path / "api.store"))
+    assert sections["content"][1] == 32 * 3
+    assert all(store.records["flags"] & FLAG_SHARED)
+    assert stored_bodies(shared_store) == 3
+    store.close()
+
+
+def test_forks_share_bodies(tmp_path, shared_store):
+    write_chunk_store(str(tmp_path / "api.store"), "acme/api", repo_chunks("acme/api"), shared=True)
+    write_chunk_store(str(tmp_path / "fork.store"), "fork/api", repo_chunks("fork/api"), shared=True)
+    assert stored_bodies(shared_store) == 3
+
+    fork = ChunkStore(str(tmp_path / "fork.store"))
+    assert fork.get("fork/api_lib/util.py_0")["content"] == SHARED_BODY
+    assert fork.get("fork/api_src/app.py_1:4")["parent_id"] == "fork/api_src/app.py_0:0"
+    fork.close()
+
+
+def test_self_contained_store(tmp_path, shared_store):
+    chunks = repo_chunks("acme/api")
+    write_chunk_store(str(tmp_path / "api.store"), "acme/api", chunks, shared=False)
+    store = ChunkStore(str(tmp_path / "api.store"))
+
+    assert stored_bodies(shared_store) == 0
+    assert not any(store.records["flags"] & FLAG_SHARED)
+    for chunk in chunks:
+        assert store.get(chunk["chunk_id"]) == chunk
+    store.close()
@@ -0,0 +1,56 @@
+"""
+Tests for the token-window chunker: python -m pytest backend/chunking/test_chunker.py
+"""
+from backend.chunking.chunker import (
+    approx_token_count,
+    chunk_content,
+    plan_token_windows,
+    split_long_line,
+)
+
+
+def test_windows_stay_in_budget_and_overlap():
+    windows = plan_token_windows([3] * 10, max_tokens=10, overlap_tokens=3)
+    # Each window carries the previous one's last line (3 tokens of overlap)
+    assert windows == [(0, 3), (2, 5), (4, 7), (6, 9), (8, 10)]
+
+
+def test_windows_prefer_boundaries_once_full_enough():
+    # Cut pulled back from line 5 to the boundary at 3 (6 of 10 tokens)
+    assert plan_token_windows([2] * 10, 10, 0, boundaries=[3]) == [(0, 3), (3, 8), (8, 10)]
+    # A boundary at 1 would leave the chunk under MIN_BOUNDARY_FILL
+    assert plan_token_windows([2] * 10, 10, 0, boundaries=[1]) == [(0, 5), (5, 10)]
+
+
+def test_over_budget_line_gets_a_window_of_its_own():
+    assert plan_token_windows([20, 1], 10, 3) == [(0, 1), (1, 2)]
+
+
+def test_split_long_line_with_token_offsets():
+    line = "a b c d e f g h i j k"
+    pieces = split_long_line(line, 4, approx_token_count)
+    assert pieces == ["a b c d ", "e f g h ", "i j k"]
+
+
+def test_split_long_line_checks_pieces_without_token_offsets():
+    def chars(text):
+        return len(text)
+
+    line = "alpha beta gamma delta epsilon"
+    pieces = split_long_line(line, 8, chars)
+    assert "".join(pieces) == line
+    assert all(0 < len(piece) <= 8 for piece in pieces)
+
+
+def test_chunk_lines_are_start_inclusive_end_exclusive():
+    content = "def a():\n    return 1\n\ndef b():\n    return 2"
+    (chunk,) = chunk_content(content, "m.py", "o/r")
+    assert (chunk["start_line"], chunk["end_line"]) == (0, 5)
+    assert chunk["content"] == content
+
+    # Pieces of a split line keep the line they came from
+    content = "x = 1\n" + " ".join(["y"] * 30) + "\nz = 2"
+    chunks = chunk_content(content, "m.py", "o/r", max_tokens=10, overlap_tokens=0)
+    assert [(c["start_line"], c["end_line"]) for c in chunks] == [(0, 1), (1, 2), (1, 2), (1, 2), (2, 3)]
+    assert "".join(c["content"] for c in chunks[1:4]) == " ".join(["y"] * 30)
+    assert chunks[-1]["content"] == "z = 2"
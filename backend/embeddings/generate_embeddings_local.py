@@ -1,13 +1,13 @@
 import os
-import pickle
 from sentence_transformers import SentenceTransformer
 import os
-import pickle
 import time
 import numpy as np
 # import google.generativeai as genai
 from dotenv import load_dotenv
 
+from backend.storage.content_store import get_vectors, put_vectors, vector_hash
+
 # Load env variables (ensures GEMINI_API_KEY is loaded)
 load_dotenv()
 
@@ -56,7 +56,6 @@ load_dotenv()
 
 
 import os
-import pickle
 import time
 import google.generativeai as genai
 from dotenv import load_dotenv
@@ -88,72 +87,135 @@ def get_gemini_embedding(text, task_type="retrieval_document"):
         print(f"[-] Error embedding chunk with model '{model_name}': {e}")
         return None
     
-def generate_embeddings_local(chunks, repo_name, save_path="data/embeddings"):
-    os.makedirs(save_path, exist_ok=True)
-    
+
+EMBEDDING_MODEL = "models/gemini-embedding-001"
+BATCH_SIZE = 50
+# Fraction of embeddable chunks that may fail to embed (failed batches)
+# before an ingest fails instead of publishing a partial index
+EMBED_MAX_DROPPED = float(os.getenv("EMBED_MAX_DROPPED", 0.01))
+
+
+def is_embeddable(chunk):
+    # Empty strings make the API fail the whole batch; functions split into
+    # parts are embedded through their parts
+    return bool(chunk["content"] and chunk["content"].strip()) and not chunk.get("parts")
+
+
+def dropped_files(chunks, embedded):
+    """Paths of files with an embeddable chunk in `chunks` missing from `embedded`."""
+    ids = {c["chunk_id"] for c in embedded}
+    return {c["file_path"] for c in chunks if is_embeddable(c) and c["chunk_id"] not in ids}
+
+
+def check_dropped(dropped, total):
+    """Raise RuntimeError if more than EMBED_MAX_DROPPED of `total` chunks were dropped."""
+    if dropped and dropped > EMBED_MAX_DROPPED * total:
+        raise RuntimeError(f"{dropped} of {total} chunks could not be embedded "
+                           f"(more than EMBED_MAX_DROPPED={EMBED_MAX_DROPPED:g})")
+
+
+def embed_batch(batch_texts, label="", retries=3):
+    """
+    Embed one batch of document texts. Returns the list of vectors, or None
+    if the batch could not be embedded.
+    """
+    for attempt in range(retries):
+        try:
+            result = genai.embed_content(
+                model=EMBEDDING_MODEL,
+                content=batch_texts,
+                task_type="retrieval_document"
+            )
+            time.sleep(1.5) # Modest sleep to stay safe
+            return result['embedding']
+
+        except Exception as e:
+            if "429" in str(e):
+                wait_time = (attempt + 1) * 5
+                print(f"[-] Quota hit. Waiting {wait_time}s...")
+                time.sleep(wait_time)
+            else:
+                # If a different error happens, we print it but don't crash the whole script
+                print(f"[-] Error on batch {label}: {e}")
+                return None
+    return None
+
+
+def embed_chunks(chunks, label=""):
+    """
+    Embed a batch of chunks through the shared content store: chunks whose
+    normalized content was embedded before (by any repo) reuse the stored
+    vector, and repeated content in the batch is embedded once.
+
+    Returns (vectors, embedded_chunks); chunks whose text could not be
+    embedded are left out.
+    """
+    hashes = [vector_hash(c["content"]) for c in chunks]
+    known = get_vectors(hashes, EMBEDDING_MODEL)
+
+    missing = {}
+    for h, c in zip(hashes, chunks):
+        if h not in known and h not in missing:
+            missing[h] = c["content"]
+
+    if missing:
+        new_vectors = embed_batch(list(missing.values()), label=label)
+        if new_vectors is not None:
+            fresh = dict(zip(missing, new_vectors))
+            put_vectors(fresh, EMBEDDING_MODEL)
+            known.update(fresh)
+
+    vectors, embedded = [], []
+    for h, c in zip(hashes, chunks):
+        if h in known:
+            vectors.append(known[h])
+            embedded.append(c)
+
+    reused = len(chunks) - len(missing)
+    if reused:
+        print(f"   Reused {reused}/{len(chunks)} stored embeddings in batch {label}")
+    return vectors, embedded
+
+
+def generate_embeddings_local(chunks, repo_name, stats=None):
+    """
+    Embed every embeddable chunk. Returns (vectors, metadata) with
+    metadata[i] the chunk embedded as vectors[i]; persisting them is up to
+    the caller (see backend/storage/bundles.py). Chunks of failed batches
+    are counted in stats["chunks_dropped"]; too many raise (check_dropped).
+    """
+    if stats is None:
+        stats = {}
+    stats.setdefault("chunks_dropped", 0)
     print("[+] Generating embeddings using Gemini API (Batch Mode)...")
 
-    # --- FIX START: Filter empty chunks first ---
-    # We must remove empty strings before batching, or the API fails the whole batch.
-    valid_chunks = []
-    skipped_count = 0
-    
-    for c in chunks:
-        if c["content"] and c["content"].strip():
-            valid_chunks.append(c)
-        else:
-            skipped_count += 1
+    valid_chunks = [c for c in chunks if is_embeddable(c)]
+    skipped_count = len(chunks) - len(valid_chunks)
             
     print(f"[*] Filtered out {skipped_count} empty chunks. Processing {len(valid_chunks)} valid chunks.")
-    # --- FIX END ---
 
     vectors = []
     metadata = []
     
-    BATCH_SIZE = 50 
-    
-    # Iterate over 'valid_chunks' now, not 'chunks'
     for i in range(0, len(valid_chunks), BATCH_SIZE):
         batch = valid_chunks[i : i + BATCH_SIZE]
-        batch_texts = [c["content"] for c in batch]
-        
-        retries = 3
-        for attempt in range(retries):
-            try:
-                result = genai.embed_content(
-                    model="models/gemini-embedding-001",
-                    content=batch_texts,
-                    task_type="retrieval_document"
-                )
-                
-                batch_embeddings = result['embedding']
-                
-                vectors.extend(batch_embeddings)
-                metadata.extend(batch) 
-                
-                print(f"   Processed batch {i} to {i + len(batch)}")
-                time.sleep(1.5) # Modest sleep to stay safe
-                break 
-
-            except Exception as e:
-                if "429" in str(e):
-                    wait_time = (attempt + 1) * 5
-                    print(f"[-] Quota hit. Waiting {wait_time}s...")
-                    time.sleep(wait_time)
-                else:
-                    # If a different error happens, we print it but don't crash the whole script
-                    print(f"[-] Error on batch {i}: {e}")
-                    break
+        batch_embeddings, embedded = embed_chunks(batch, label=i)
+        stats["chunks_dropped"] += len(batch) - len(embedded)
+        batch = embedded
+        if not batch_embeddings:
+            continue
+
+        vectors.extend(batch_embeddings)
+        metadata.extend(batch)
+        print(f"   Processed batch {i} to {i + len(batch)}")
+
+    if stats["chunks_dropped"]:
+        print(f"[!] {stats['chunks_dropped']} chunks could not be embedded")
+    check_dropped(stats["chunks_dropped"], len(valid_chunks))
 
     if not vectors:
         print("[-] Error: No embeddings were generated.")
         return [], []
 
-    with open(f"{save_path}/{repo_name}_vectors.pkl", "wb") as f:
-        pickle.dump(vectors, f)
-
-    with open(f"{save_path}/{repo_name}_metadata.pkl", "wb") as f:
-        pickle.dump(metadata, f)
-
-    print(f"[+] Success! Saved {len(vectors)} embeddings.")
-    return vectors, metadata
\ No newline at end of file
+    print(f"[+] Success! Generated {len(vectors)} embeddings.")
+    return vectors, metadata
@@ -0,0 +1,216 @@
+"""
+File classification stage that runs between extraction and chunking.
+
+Drops files that are not worth embedding - binary blobs, minified bundles,
+generated code, lockfiles and vendored trees - and enforces per-file and
+per-repo byte budgets. Everything skipped is recorded in a report so the
+ingest response can say what was left out and why.
+"""
+import os
+import re
+
+# Budgets (bytes). Override with env vars for large tenants.
+MAX_FILE_BYTES = int(os.getenv("INGEST_MAX_FILE_BYTES", 512 * 1024))
+MAX_REPO_BYTES = int(os.getenv("INGEST_MAX_REPO_BYTES", 64 * 1024 * 1024))
+
+# How much of each file is sniffed for binary / generated markers
+HEADER_BYTES = 4096
+
+# Minification heuristics, applied to the sniffed header
+MINIFIED_AVG_LINE = 300
+MINIFIED_MAX_LINE = 2000
+
+LOCKFILES = {
+    "package-lock.json", "npm-shrinkwrap.json", "yarn.lock", "pnpm-lock.yaml",
+    "composer.lock", "poetry.lock", "Pipfile.lock", "Gemfile.lock",
+    "Cargo.lock", "go.sum", "bun.lock",
+}
+
+VENDORED_DIRS = {"vendor", "vendors", "third_party", "third-party", "thirdparty",
+                 "bower_components", "jspm_packages"}
+
+MINIFIED_SUFFIXES = (".min.js", ".min.css", ".bundle.js", ".chunk.js")
+
+GENERATED_MARKERS = (
+    "@generated",
+    "do not edit",
+    "code generated by",
+    "auto-generated",
+    "autogenerated",
+    "automatically generated",
+    "generated by the protocol buffer compiler",
+)
+
+# Cap on how many individual skipped files are listed in the report
+REPORT_FILE_LIMIT = 200
+
+
+def new_report():
+    return {
+        "files_kept": 0,
+        "bytes_kept": 0,
+        "skipped": {},
+        "skipped_files": [],
+    }
+
+
+def record_skip(report, file_path, reason):
+    report["skipped"][reason] = report["skipped"].get(reason, 0) + 1
+    if len(report["skipped_files"]) < REPORT_FILE_LIMIT:
+        report["skipped_files"].append({"file_path": file_path, "reason": reason})
+
+
+def parse_gitattributes(text):
+    """
+    Parse .gitattributes into a list of (regex, {attr: bool}) for the
+    linguist attributes we care about. Later entries win, as in git.
+    """
+    rules = []
+    for line in (text or "").splitlines():
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        parts = line.split()
+        pattern, attrs = parts[0], {}
+        for attr in parts[1:]:
+            value = True
+            if attr.startswith("-"):
+                attr, value = attr[1:], False
+            elif "=" in attr:
+                attr, raw = attr.split("=", 1)
+                value = raw.lower() not in ("false", "0", "no")
+            if attr in ("linguist-generated", "linguist-vendored"):
+                attrs[attr] = value
+        if attrs:
+            rules.append((gitattributes_regex(pattern), attrs))
+    return rules
+
+
+def gitattributes_regex(pattern):
+    """
+    Translate a .gitattributes path pattern into a compiled regex over
+    repo-relative paths ("*" stays within a directory, "**" spans them).
+    """
+    if pattern.endswith("/"):
+        # Be lenient with directory patterns: match everything below them
+        pattern += "**"
+    anchored = "/" in pattern.rstrip("/")
+    pattern = pattern.lstrip("/")
+
+    out, i = [], 0
+    while i < len(pattern):
+        if pattern.startswith("**/", i):
+            out.append("(?:.*/)?")
+            i += 3
+        elif pattern.startswith("**", i):
+            out.append(".*")
+            i += 2
+        elif pattern[i] == "*":
+            out.append("[^/]*")
+            i += 1
+        elif pattern[i] == "?":
+            out.append("[^/]")
+            i += 1
+        else:
+            out.append(re.escape(pattern[i]))
+            i += 1
+
+    prefix = "" if anchored else "(?:.*/)?"
+    return re.compile(prefix + "".join(out) + r"\Z")
+
+
+def linguist_attributes(rules, rel_path):
+    result = {}
+    for regex, attrs in rules:
+        if regex.match(rel_path):
+            result.update(attrs)
+    return result
+
+
+def looks_minified(header):
+    lines = header.split("\n")
+    # A trailing partial line is fine, but one huge line is the giveaway
+    longest = max(len(line) for line in lines)
+    if longest > MINIFIED_MAX_LINE:
+        return True
+    if len(lines) > 1:
+        avg = sum(len(line) for line in lines) / len(lines)
+        return avg > MINIFIED_AVG_LINE
+    return False
+
+
+def looks_generated(header):
+    # Markers only count near the top of the file, where tools put them
+    head = header[:1024].lower()
+    return any(marker in head for marker in GENERATED_MARKERS)
+
+
+def classify_file(rel_path, content, size, rules=()):
+    """
+    Return the skip reason for a file, or None if it should be indexed.
+    Only the first HEADER_BYTES of `content` are sniffed, and only once
+    `size` is known to be within MAX_FILE_BYTES.
+    """
+    name = os.path.basename(rel_path)
+    parts = rel_path.split("/")
+
+    attrs = linguist_attributes(rules, rel_path)
+    if attrs.get("linguist-vendored"):
+        return "vendored"
+    if attrs.get("linguist-generated"):
+        return "generated"
+
+    if name in LOCKFILES:
+        return "lockfile"
+    if any(part in VENDORED_DIRS for part in parts[:-1]):
+        return "vendored"
+    if size > MAX_FILE_BYTES:
+        return "too_large"
+
+    header = content[:HEADER_BYTES]
+    if "\x00" in header:
+        return "binary"
+    if name.lower().endswith(MINIFIED_SUFFIXES) or looks_minified(header):
+        return "minified"
+    if looks_generated(header):
+        return "generated"
+    return None
+
+
+def content_bytes(content):
+    """Size of a file as counted against the repo budget."""
+    return len(content.encode("utf-8", errors="ignore"))
+
+
+def classify_files(files, repo_path, report, gitattributes=None,
+                   max_repo_bytes=MAX_REPO_BYTES):
+    """
+    Filter a stream of file records, yielding the ones worth indexing and
+    recording every skip in `report`. Stops admitting files once the
+    repo-wide byte budget is spent; report["bytes_kept"] may start with
+    bytes already spent on files indexed earlier.
+
+    Files are admitted in the order they arrive. The extractors yield them
+    in a fixed order (path order for git and directory sources), so the
+    same tree always keeps the same files.
+    """
+    rules = parse_gitattributes(gitattributes)
+
+    for f in files:
+        file_path = f["file_path"]
+        rel_path = os.path.relpath(file_path, repo_path).replace("\\", "/")
+        # Oversized files arrive with their size and no content (see
+        # extract_files.oversized_record)
+        size = f["size"] if "size" in f else content_bytes(f["content"])
+
+        reason = classify_file(rel_path, f["content"], size, rules)
+        if reason is None and max_repo_bytes and report["bytes_kept"] + size > max_repo_bytes:
+            reason = "repo_budget"
+
+        if reason is not None:
+            record_skip(report, file_path, reason)
+            continue
+
+        report["files_kept"] += 1
+        report["bytes_kept"] += size
+        yield f
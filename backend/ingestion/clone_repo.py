@@ -1,29 +1,176 @@
 import os
+import re
 import shutil
 import stat
 from git import Repo
 from urllib.parse import urlparse
 
 
+ARCHIVE_EXTS = (".tar.gz", ".tgz", ".tar", ".zip")
+
+# Remote clones skip blobs above this size; they are never worth embedding
+# and are the bulk of most repositories' transfer size.
+CLONE_BLOB_LIMIT = "1m"
+
+# Local paths and archives are only accepted below this directory, so the
+# API cannot be pointed at arbitrary files on the server.
+LOCAL_SOURCES_ROOT = os.getenv("LOCAL_SOURCES_ROOT")
+
+
 def remove_readonly(func, path, excinfo):
     """Handle read-only files on Windows (especially .git folder)"""
     os.chmod(path, stat.S_IWRITE)
     func(path)
 
 
-def clone_repository(github_url, base_path="data/repos"):
-    # Extract repo name from URL
-    parsed = urlparse(github_url)
-    repo_name = os.path.splitext(os.path.basename(parsed.path))[0]
-    
-    repo_path = os.path.join(base_path, repo_name)
+def get_repo_name(source):
+    """Derive the repo name from a URL, local repository path or archive."""
+    path = urlparse(source).path if "://" in source else source
+    path = path.rstrip("/\\")
+    name = os.path.basename(path)
+    if name == ".git":
+        # Path to a working tree's .git directory
+        name = os.path.basename(os.path.dirname(path))
+    for ext in ARCHIVE_EXTS + (".git",):
+        if name.lower().endswith(ext):
+            return name[:-len(ext)]
+    return name
+
+
+def get_repo_owner(source):
+    """
+    Owner (user/org) of a remote repository: the path component before the
+    name in "https://host/owner/name" or "git@host:owner/name.git". Local
+    repositories and archives are owned by "local".
+    """
+    if detect_source_kind(source) != "remote":
+        return "local"
+    if "://" in source:
+        path = urlparse(source).path
+    else:
+        # scp-like syntax: git@host:owner/name.git
+        path = source.split(":", 1)[-1]
+    parts = [p for p in path.strip("/").split("/") if p]
+    owner = parts[-2] if len(parts) >= 2 else "unknown"
+    return re.sub(r"[^A-Za-z0-9._-]", "_", owner).strip(".") or "unknown"
+
+
+def get_repo_key(source):
+    """
+    "owner/name" key identifying a repository's artifacts, so same-named
+    repositories of different owners do not overwrite each other.
+    """
+    return f"{get_repo_owner(source)}/{get_repo_name(source)}"
+
+
+def detect_source_kind(source):
+    """Return 'archive', 'local' or 'remote' for an ingest source string."""
+    is_url = "://" in source or source.startswith("git@")
+    if source.lower().endswith(ARCHIVE_EXTS) and not is_url:
+        return "archive"
+    if not is_url and os.path.exists(source):
+        return "local"
+    return "remote"
+
+
+def check_local_source(path):
+    if not LOCAL_SOURCES_ROOT:
+        raise ValueError("Local sources are disabled (set LOCAL_SOURCES_ROOT to enable them)")
+    root = os.path.realpath(LOCAL_SOURCES_ROOT)
+    if os.path.commonpath([root, os.path.realpath(path)]) != root:
+        raise ValueError(f"Local source must be inside {LOCAL_SOURCES_ROOT}")
 
-    # If already exists, remove it to re-ingest fresh
-    # Use onerror handler for Windows permission issues with .git folder
+
+def list_missing_blobs(repo):
+    """
+    Blobs filtered out of a partial clone. Listed with --missing=print so git
+    does not lazily fetch them while we look.
+    """
+    output = repo.git.rev_list("--objects", "--missing=print", "HEAD")
+    return {line[1:] for line in output.splitlines() if line.startswith("?")}
+
+
+def shallow_clone(github_url, repo_path, blob_limit=CLONE_BLOB_LIMIT):
+    """
+    Depth-1, single-branch clone without a checkout. Files are read straight
+    from the object database, so no working tree is ever written.
+    """
     if os.path.exists(repo_path):
         shutil.rmtree(repo_path, onerror=remove_readonly)
 
-    print(f"Cloning repo into: {repo_path}")
-    Repo.clone_from(github_url, repo_path)
+    options = {"depth": 1, "single_branch": True, "no_checkout": True}
+    if blob_limit:
+        options["filter"] = f"blob:limit={blob_limit}"
+
+    print(f"Shallow cloning repo into: {repo_path}")
+    try:
+        return Repo.clone_from(github_url, repo_path, **options)
+    except Exception as e:
+        if "filter" not in options:
+            raise
+        # Old git clients reject --filter outright; retry without it
+        print(f"[!] Partial clone failed ({e}), retrying without blob filter")
+        if os.path.exists(repo_path):
+            shutil.rmtree(repo_path, onerror=remove_readonly)
+        options.pop("filter")
+        return Repo.clone_from(github_url, repo_path, **options)
+
+
+def open_source(source, base_path="data/repos", blob_limit=CLONE_BLOB_LIMIT):
+    """
+    Prepare an ingest source without writing a working tree.
+
+    Returns a dict with:
+      kind        - 'remote', 'local' or 'archive'
+      repo_name   - "owner/name" key derived from the source
+      repo_path   - where file paths are rooted (base_path/owner/name)
+      repo        - git.Repo to read blobs from (None for archives and
+                    plain directories)
+      commit_sha  - commit the files are read from, when known
+      local_path  - on-disk path for local repositories/archives
+      missing     - blob shas left out of a partial clone
+    """
+    kind = detect_source_kind(source)
+    repo_name = get_repo_key(source)
+    repo_path = os.path.join(base_path, *repo_name.split("/"))
+
+    info = {
+        "kind": kind,
+        "repo_name": repo_name,
+        "repo_path": repo_path,
+        "repo": None,
+        "commit_sha": None,
+        "local_path": None,
+        "missing": set(),
+    }
+
+    if kind == "archive":
+        check_local_source(source)
+        info["local_path"] = source
+        return info
+
+    if kind == "local":
+        check_local_source(source)
+        info["local_path"] = source
+        try:
+            repo = Repo(source)
+        except Exception:
+            # Plain directory: walked as-is
+            return info
+    else:
+        repo = shallow_clone(source, repo_path, blob_limit)
+        info["local_path"] = repo_path
+
+    info["repo"] = repo
+    try:
+        info["commit_sha"] = repo.head.commit.hexsha
+    except Exception:
+        return info
+
+    if kind == "remote" and blob_limit:
+        try:
+            info["missing"] = list_missing_blobs(repo)
+        except Exception as e:
+            print(f"[!] Could not list missing blobs: {e}")
 
-    return repo_name, repo_path
+    return info
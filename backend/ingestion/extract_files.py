@@ -1,11 +1,42 @@
 import os
+import tarfile
+import threading
+import zipfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from git import Repo
+
+from backend.ingestion.classify_files import MAX_FILE_BYTES
+from backend.ingestion.notebooks import convert_notebook
 
 IGNORED_DIRS = {'.git', 'node_modules', 'dist', 'build', '.next', '__pycache__', 'venv', '.cache','.vscode'}
 ALLOWED_EXT = {'.md', '.py', '.js', '.ts', '.go', '.java', '.cpp', '.c', '.html', '.css', '.json', '.yaml','.jsx','.tsx','.ipynb'}
 
-def extract_repo_files(repo_path):
-    extracted_files = []
+SYMLINK_MODE = 0o120000
+
+# Reader threads and the maximum number of files being read at once.
+# The window keeps memory bounded: at most MAX_IN_FLIGHT file contents are
+# held by the extractor before the consumer picks them up.
+MAX_WORKERS = 8
+MAX_IN_FLIGHT = 32
+
+
+def is_allowed_path(rel_path):
+    """
+    Apply the same directory/extension filter as the walk to a single
+    repo-relative path (e.g. one reported by `git diff`).
+    """
+    parts = rel_path.replace("\\", "/").split("/")
+    if any(part in IGNORED_DIRS for part in parts[:-1]):
+        return False
+    return os.path.splitext(parts[-1])[1].lower() in ALLOWED_EXT
 
+
+def walk_repo_files(repo_path):
+    """
+    Lazily yield (full_path, ext) for every allowed file under repo_path.
+    """
     for root, dirs, files in os.walk(repo_path):
         # Skip ignored directories
         dirs[:] = [d for d in dirs if d not in IGNORED_DIRS]
@@ -13,17 +44,248 @@ def extract_repo_files(repo_path):
         for file in files:
             _, ext = os.path.splitext(file)
             if ext.lower() in ALLOWED_EXT:
-                full_path = os.path.join(root, file)
-                try:
-                    with open(full_path, 'r', encoding='utf-8', errors='ignore') as f:
-                        content = f.read()
-
-                    extracted_files.append({
-                        "file_path": full_path,
-                        "extension": ext.lower(),
-                        "content": content
-                    })
-                except Exception as e:
-                    print(f"Error reading {full_path}: {e}")
-
-    return extracted_files
+                yield os.path.join(root, file), ext.lower()
+
+
+def make_record(file_path, ext, content):
+    """
+    Build a file record. Notebooks are reduced to their cells (see
+    notebooks.convert_notebook) and carry "language" and "cells" as well.
+    """
+    record = {
+        "file_path": file_path,
+        "extension": ext,
+        "content": content
+    }
+    if ext == ".ipynb":
+        notebook = convert_notebook(content)
+        if notebook is None:
+            print(f"[!] Skipping unreadable notebook {file_path}")
+            return None
+        record.update(notebook)
+    return record
+
+
+def oversized_record(file_path, ext, size):
+    """
+    Stand-in for a file over MAX_FILE_BYTES. The classifier rejects it on
+    `size` before looking at any content, so none is read.
+    """
+    return {
+        "file_path": file_path,
+        "extension": ext,
+        "content": "",
+        "size": size
+    }
+
+
+def read_file_record(full_path, ext, file_path=None):
+    try:
+        size = os.stat(full_path).st_size
+        if size > MAX_FILE_BYTES:
+            return oversized_record(file_path or full_path, ext, size)
+        with open(full_path, 'r', encoding='utf-8', errors='ignore') as f:
+            content = f.read()
+    except Exception as e:
+        print(f"Error reading {full_path}: {e}")
+        return None
+
+    return make_record(file_path or full_path, ext, content)
+
+
+def iter_bounded(tasks, read_fn, max_workers=MAX_WORKERS, max_in_flight=MAX_IN_FLIGHT):
+    """
+    Run read_fn(*task) for each task on a thread pool and yield the non-None
+    results in task order, with at most `max_in_flight` reads pending.
+    `tasks` is consumed lazily, only as fast as results are drained.
+
+    Task order (not completion order) keeps what comes out deterministic, so
+    the repo budget in classify_files always admits the same files.
+    """
+    max_in_flight = max(1, max_in_flight)
+
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="extract") as pool:
+        pending = deque()
+
+        for task in tasks:
+            if len(pending) >= max_in_flight:
+                record = pending.popleft().result()
+                if record is not None:
+                    yield record
+            pending.append(pool.submit(read_fn, *task))
+
+        while pending:
+            record = pending.popleft().result()
+            if record is not None:
+                yield record
+
+
+def iter_repo_files(repo_path, max_workers=MAX_WORKERS, max_in_flight=MAX_IN_FLIGHT, root_as=None):
+    """
+    Read allowed files concurrently and yield {file_path, extension, content}
+    records in path order.
+
+    At most `max_in_flight` reads are pending at any time, so reading only
+    advances as fast as the consumer drains results. With `root_as`, file
+    paths are reported relative to that root instead.
+    """
+    def tasks():
+        # The walk lists paths only; sorting it fixes the order records
+        # come out in
+        for full_path, ext in sorted(walk_repo_files(repo_path)):
+            file_path = None
+            if root_as:
+                file_path = os.path.join(root_as, os.path.relpath(full_path, repo_path))
+            yield full_path, ext, file_path
+
+    return iter_bounded(tasks(), read_file_record, max_workers, max_in_flight)
+
+
+def iter_git_files(repo, repo_path, rev="HEAD", missing=(), paths=None,
+                   max_workers=MAX_WORKERS, max_in_flight=MAX_IN_FLIGHT):
+    """
+    Read allowed files of `rev` straight from the git object database, with
+    no checkout. Blobs listed in `missing` (filtered out of a partial clone)
+    are skipped rather than fetched. `paths` optionally restricts the walk to
+    a set of file paths (as reported, i.e. rooted at repo_path). Records
+    come out in path order.
+    """
+    git_dir = repo.git_dir
+    local = threading.local()
+
+    def read_blob(rel_path, binsha, ext):
+        # GitPython's persistent cat-file process is not thread-safe, so each
+        # reader thread gets its own Repo handle.
+        if not hasattr(local, "repo"):
+            local.repo = Repo(git_dir)
+        file_path = os.path.join(repo_path, rel_path)
+        try:
+            size = local.repo.odb.info(binsha).size
+            if size > MAX_FILE_BYTES:
+                return oversized_record(file_path, ext, size)
+            data = local.repo.odb.stream(binsha).read()
+        except Exception as e:
+            print(f"Error reading blob {rel_path}: {e}")
+            return None
+        return make_record(file_path, ext, data.decode("utf-8", errors="ignore"))
+
+    def tasks():
+        for item in repo.commit(rev).tree.traverse():
+            # Only regular files: skip trees, submodules and symlinks
+            if item.type != "blob" or item.mode == SYMLINK_MODE:
+                continue
+            if not is_allowed_path(item.path) or item.hexsha in missing:
+                continue
+            if paths is not None and os.path.join(repo_path, item.path) not in paths:
+                continue
+            yield item.path, item.binsha, os.path.splitext(item.path)[1].lower()
+
+    return iter_bounded(sorted(tasks()), read_blob, max_workers, max_in_flight)
+
+
+def open_archive(archive_path):
+    """
+    Open a .tar(.gz)/.zip archive and return (handle, members) where members
+    is a list of (name, read_fn, size) for its regular files. The member
+    table is read once; contents are only decompressed when read_fn is called.
+    """
+    if archive_path.lower().endswith(".zip"):
+        zf = zipfile.ZipFile(archive_path)
+        members = [(info.filename, lambda info=info: zf.read(info), info.file_size)
+                   for info in zf.infolist() if not info.is_dir()]
+        return zf, members
+
+    tf = tarfile.open(archive_path, "r:*")
+    members = [(m.name, lambda m=m: tf.extractfile(m).read(), m.size)
+               for m in tf.getmembers() if m.isfile()]
+    return tf, members
+
+
+def archive_rel_paths(members):
+    """
+    Repo-relative paths for archive members. A single top-level directory
+    (as in GitHub/GitLab downloads) is stripped.
+    """
+    names = [name.replace("\\", "/") for name, _, _ in members]
+    tops = {name.split("/", 1)[0] for name in names}
+    if len(tops) == 1 and all("/" in name for name in names):
+        return [name.split("/", 1)[1] for name in names]
+    return names
+
+
+def iter_archive_files(archive_path, repo_path, paths=None):
+    """
+    Stream allowed files out of an archive without unpacking it to disk.
+    Members are read one at a time in archive order (compressed tarballs
+    can't be read out of order cheaply), which is fixed for a given archive.
+    """
+    handle, members = open_archive(archive_path)
+    with handle:
+        for rel_path, (name, read, size) in zip(archive_rel_paths(members), members):
+            if not rel_path or not is_allowed_path(rel_path):
+                continue
+            file_path = os.path.join(repo_path, rel_path)
+            if paths is not None and file_path not in paths:
+                continue
+            ext = os.path.splitext(rel_path)[1].lower()
+            if size > MAX_FILE_BYTES:
+                yield oversized_record(file_path, ext, size)
+                continue
+            try:
+                content = read().decode("utf-8", errors="ignore")
+            except Exception as e:
+                print(f"Error reading {name} from archive: {e}")
+                continue
+            record = make_record(file_path, ext, content)
+            if record is not None:
+                yield record
+
+
+def iter_source_files(source, paths=None):
+    """
+    Yield file records for a source prepared by clone_repo.open_source,
+    picking the cheapest reader for its kind.
+    """
+    if source["kind"] == "archive":
+        return iter_archive_files(source["local_path"], source["repo_path"], paths)
+
+    if source["repo"] is not None and source["commit_sha"]:
+        return iter_git_files(source["repo"], source["repo_path"], source["commit_sha"],
+                              source["missing"], paths)
+
+    # Plain directory (or a repo with no commits): walk the filesystem
+    files = iter_repo_files(source["local_path"], root_as=source["repo_path"])
+    if paths is None:
+        return files
+    return (f for f in files if f["file_path"] in paths)
+
+
+def read_source_file(source, rel_path):
+    """
+    Read a single repo-relative file (e.g. .gitattributes) from a source,
+    bypassing the extension filter. Returns None if it does not exist.
+    """
+    try:
+        if source["kind"] == "archive":
+            handle, members = open_archive(source["local_path"])
+            with handle:
+                for member_path, (_, read, _) in zip(archive_rel_paths(members), members):
+                    if member_path == rel_path:
+                        return read().decode("utf-8", errors="ignore")
+            return None
+
+        if source["repo"] is not None and source["commit_sha"]:
+            blob = source["repo"].commit(source["commit_sha"]).tree / rel_path
+            return blob.data_stream.read().decode("utf-8", errors="ignore")
+
+        with open(os.path.join(source["local_path"], rel_path), "r", encoding="utf-8", errors="ignore") as f:
+            return f.read()
+    except (KeyError, OSError):
+        return None
+
+
+def extract_repo_files(repo_path):
+    """
+    Eager variant kept for callers that need the full list.
+    """
+    return list(iter_repo_files(repo_path))
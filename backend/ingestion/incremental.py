@@ -0,0 +1,295 @@
+"""
+Incremental re-ingestion.
+
+Each full ingest records the indexed commit SHA, a content hash and size
+per file and the vector ids produced for that file in the state.json of
+the repo's bundle. A re-ingest in update mode diffs the new HEAD against
+that record and only re-parses / re-embeds the files that were added,
+modified or deleted; the FAISS index is patched through its id map and
+published as the bundle's next version.
+
+Files with chunks that could not be embedded are recorded without a hash,
+so the next update processes them again whether they changed or not.
+
+The repo byte budget (INGEST_MAX_REPO_BYTES) holds across updates: changed
+files are admitted against what the untouched indexed files already use,
+so files the full ingest skipped for the budget stay out.
+"""
+import os
+import json
+import hashlib
+
+import numpy as np
+
+from backend.storage.bundles import open_bundle, resolve_repo_key
+from .clone_repo import open_source
+from .extract_files import is_allowed_path, iter_source_files, read_source_file
+from .classify_files import MAX_REPO_BYTES, classify_files, content_bytes, new_report
+
+
+def load_ingest_state(repo_name):
+    """
+    Return the state recorded in the repo's published bundle, or None if
+    the repo has none (not indexed, or indexed before bundles).
+    """
+    bundle = open_bundle(resolve_repo_key(repo_name))
+    if bundle is None:
+        return None
+    try:
+        return bundle.read_state()
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+def content_hash(content):
+    return hashlib.sha1(content.encode("utf-8", errors="ignore")).hexdigest()
+
+
+def track_file_hashes(files, hashes, sizes=None):
+    """
+    Pass file records through unchanged while recording their content hash
+    in `hashes` (file_path -> sha1), and their size against the repo budget
+    in `sizes` if given. Works on streamed file iterators.
+    """
+    for f in files:
+        hashes[f["file_path"]] = content_hash(f["content"])
+        if sizes is not None:
+            sizes[f["file_path"]] = content_bytes(f["content"])
+        yield f
+
+
+def build_ingest_state(commit_sha, hashes, metadata, ids, sizes=None):
+    """Assemble the state record for a freshly built index."""
+    files = {path: {"hash": h, "ids": []} for path, h in hashes.items()}
+    for path, size in (sizes or {}).items():
+        files[path]["bytes"] = size
+    for vector_id, chunk in zip(ids, metadata):
+        entry = files.setdefault(chunk["file_path"], {"hash": None, "ids": []})
+        entry["ids"].append(int(vector_id))
+
+    return {
+        "commit_sha": commit_sha,
+        "next_id": int(max(ids)) + 1 if len(ids) else 0,
+        "files": files,
+    }
+
+
+def diff_changed_paths(repo, repo_path, old_sha, new_sha):
+    """
+    Return the set of file paths (rooted at repo_path) touched between two
+    commits, or None if the old commit is not available in this clone
+    (e.g. a depth-1 clone, or a rewritten history) or the diff can't tell
+    which files changed classification (.gitattributes was modified).
+    """
+    if repo is None or not old_sha or not new_sha:
+        return None
+    try:
+        repo.commit(old_sha)
+    except Exception:
+        # Shallow clone: fetch just the old commit's trees (no blobs), which
+        # is all a --name-only diff needs
+        try:
+            repo.git.fetch("--depth=1", "--filter=blob:none", "origin", old_sha)
+        except Exception:
+            return None
+    try:
+        output = repo.git.diff("--name-only", "--no-renames", old_sha, new_sha)
+    except Exception:
+        return None
+
+    rel_paths = output.splitlines()
+    if ".gitattributes" in rel_paths:
+        # Linguist attributes may now include or exclude untouched files
+        print("[*] .gitattributes changed")
+        return None
+
+    return {
+        os.path.join(repo_path, rel_path)
+        for rel_path in rel_paths
+        if rel_path and is_allowed_path(rel_path)
+    }
+
+
+def plan_update(source, state, max_repo_bytes=MAX_REPO_BYTES):
+    """
+    Work out which files need re-processing.
+
+    Files the classifier now rejects count as removed. So do changed files
+    that don't fit in the repo budget: unchanged indexed files keep their
+    share of it and changed ones are admitted in path order with what is
+    left. States recorded without file sizes, and updates that change
+    .gitattributes, compare the whole tree.
+
+    Returns (changed_files, stale_paths, new_hashes):
+      changed_files - file records to re-chunk and re-embed
+      stale_paths   - file paths whose previously indexed vectors must go
+      new_hashes    - file_path -> hash for every changed file still present
+    """
+    old_files = state.get("files", {})
+    sized = all("bytes" in entry for entry in old_files.values())
+    candidates = None
+    if sized:
+        candidates = diff_changed_paths(source["repo"], source["repo_path"],
+                                        state.get("commit_sha"), source["commit_sha"])
+    if candidates is not None:
+        # Files left incomplete last time (see generate_embeddings_local)
+        candidates |= {path for path, entry in old_files.items() if entry.get("hash") is None}
+
+    if candidates is None:
+        # No usable history: compare content hashes of the whole tree
+        print("[*] No usable diff against the previous commit, comparing file hashes" if sized
+              else "[*] No file sizes recorded, comparing file hashes")
+        files = iter_source_files(source)
+    else:
+        # Only the touched paths are read; deleted ones simply don't show up
+        files = iter_source_files(source, paths=candidates)
+
+    # Per-file rules here; the repo budget is applied below, independent of
+    # the order files are read in
+    files = classify_files(files, source["repo_path"], new_report(),
+                           gitattributes=read_source_file(source, ".gitattributes"),
+                           max_repo_bytes=None)
+    records = {f["file_path"]: f for f in files}
+    if candidates is None:
+        candidates = set(records) | set(old_files)
+
+    # Bytes of the indexed files that stay as they are
+    used = sum(entry["bytes"] for path, entry in old_files.items() if path not in candidates)
+    changed = []
+    stale_paths = set()
+
+    for path in sorted(candidates):
+        record = records.get(path)
+        old_hash = old_files.get(path, {}).get("hash")
+
+        if record is None:
+            if path in old_files:
+                stale_paths.add(path)
+            continue
+
+        h = content_hash(record["content"])
+        if h == old_hash:
+            used += content_bytes(record["content"])
+            continue
+        changed.append((path, record, h))
+
+    changed_files = []
+    new_hashes = {}
+    over_budget = 0
+
+    for path, record, h in changed:
+        if path in old_files:
+            stale_paths.add(path)
+        size = content_bytes(record["content"])
+        if max_repo_bytes and used + size > max_repo_bytes:
+            over_budget += 1
+            continue
+        used += size
+        changed_files.append(record)
+        new_hashes[path] = h
+
+    if over_budget:
+        print(f"[!] {over_budget} changed files skipped: repo budget ({max_repo_bytes} bytes) spent")
+    return changed_files, stale_paths, new_hashes
+
+
+def incremental_ingest(github_url, repo_name, state, progress=None):
+    """
+    Bring an existing index up to date with the repository's new HEAD.
+
+    Returns a summary dict; `changed_files` is 0 when nothing moved.
+    `progress` (optional dict) is updated with the same counters as a full
+    ingest.
+    """
+    from backend.chunking.chunk_resolver import resolve_chunks
+    from backend.embeddings.generate_embeddings_local import (
+        EMBEDDING_MODEL,
+        dropped_files,
+        generate_embeddings_local,
+    )
+    from backend.storage.bundles import write_repo_bundle
+    from backend.vector_store.faiss_store import update_faiss_index
+    from backend.vector_store.index_factory import index_metric
+
+    if progress is None:
+        progress = {}
+    progress["stage"] = "diffing"
+
+    source = open_source(github_url)
+    repo_name = source["repo_name"]
+    new_sha = source["commit_sha"]
+
+    if new_sha and new_sha == state.get("commit_sha"):
+        print(f"[*] '{repo_name}' is already at {new_sha[:10]}, nothing to update")
+        return {"repo_name": repo_name, "changed_files": 0, "removed_files": 0,
+                "chunk_count": None}
+
+    changed_files, stale_paths, new_hashes = plan_update(source, state)
+    print(f"[*] {len(changed_files)} files to re-index, {len(stale_paths)} with stale vectors")
+
+    progress["files_extracted"] = len(changed_files)
+    progress["extraction_done"] = True
+    progress["stage"] = "processing"
+
+    files = state.setdefault("files", {})
+    remove_ids = [i for path in stale_paths for i in files.get(path, {}).get("ids", [])]
+
+    # Re-chunk and re-embed only the changed files
+    new_chunks = resolve_chunks(repo_name, changed_files) if changed_files else []
+    progress["chunks"] = len(new_chunks)
+    vectors, metadata = [], []
+    if new_chunks:
+        vectors, metadata = generate_embeddings_local(new_chunks, repo_name, progress)
+    progress["vectors_indexed"] = len(vectors)
+    progress["stage"] = "saving"
+
+    # The next version starts from the published one
+    bundle = open_bundle(repo_name)
+    if bundle is None:
+        raise ValueError(f"'{repo_name}' has no artifact bundle; re-ingest it from scratch")
+    try:
+        index = bundle.read_index()
+        stored = bundle.read_embeddings()
+        metric = index_metric(index, bundle.manifest.get("metric"))
+        vector_chunk_ids = bundle.vector_chunk_ids()
+        touched = stale_paths | set(new_hashes)
+        kept = [c for c in bundle.store if c["file_path"] not in touched]
+    finally:
+        bundle.close()
+
+    next_id = state.get("next_id", 0)
+    ids = list(range(next_id, next_id + len(vectors)))
+    embeddings = None
+    if stored is not None:
+        # Full-precision copies follow the index, for the next rebuild
+        keep = ~np.isin(stored[0], remove_ids)
+        embeddings = (np.concatenate([stored[0][keep], np.asarray(ids, dtype="int64")]),
+                      np.vstack([stored[1][keep], np.asarray(vectors, dtype="float32").reshape(-1, index.d)]))
+    index = update_faiss_index(index, remove_ids, vectors, ids, metric, stored)
+    for i in remove_ids:
+        vector_chunk_ids.pop(int(i), None)
+    for vector_id, chunk in zip(ids, metadata):
+        vector_chunk_ids[vector_id] = chunk["chunk_id"]
+    all_chunks = kept + new_chunks
+
+    # Update the recorded state
+    for path in stale_paths:
+        files.pop(path, None)
+    sizes = {f["file_path"]: content_bytes(f["content"]) for f in changed_files}
+    # No hash for files missing vectors, so the next update embeds them again
+    incomplete = dropped_files(new_chunks, metadata)
+    for path, h in new_hashes.items():
+        files[path] = {"hash": None if path in incomplete else h, "ids": [], "bytes": sizes[path]}
+    for vector_id, chunk in zip(ids, metadata):
+        files[chunk["file_path"]]["ids"].append(vector_id)
+    state["commit_sha"] = new_sha
+    state["next_id"] = next_id + len(ids)
+    write_repo_bundle(repo_name, all_chunks, index, vector_chunk_ids, state, EMBEDDING_MODEL, metric,
+                      embeddings=embeddings)
+
+    return {
+        "repo_name": repo_name,
+        "changed_files": len(new_hashes),
+        "removed_files": len(stale_paths - set(new_hashes)),
+        "chunk_count": len(all_chunks),
+    }
@@ -0,0 +1,130 @@
+"""
+Jupyter notebook extraction.
+
+A notebook is indexed as the script its cells make up (jupytext "percent"
+format): each cell starts with a `# %%` marker line, markdown cells are
+commented out and code cells are kept as is, so Python notebooks parse with
+tree-sitter and get function-level chunks. Outputs (images, HTML, long logs)
+are dropped; text outputs are kept as comments, capped per cell at
+NOTEBOOK_OUTPUT_CHARS characters and NOTEBOOK_OUTPUT_LINES lines (0 drops
+them all).
+"""
+import os
+import json
+
+NOTEBOOK_OUTPUT_CHARS = int(os.getenv("NOTEBOOK_OUTPUT_CHARS", 300))
+NOTEBOOK_OUTPUT_LINES = 8
+
+# Kernel languages that go through the tree-sitter parser of the same name
+NOTEBOOK_LANGUAGES = {"python": "python", "python3": "python"}
+
+
+def cell_source(cell):
+    source = cell.get("source", "")
+    if isinstance(source, list):
+        source = "".join(source)
+    return source.rstrip("\n")
+
+
+def text_outputs(cell, limit=NOTEBOOK_OUTPUT_CHARS, max_lines=NOTEBOOK_OUTPUT_LINES):
+    """Plain-text outputs of a code cell, truncated to `limit` characters and `max_lines` lines."""
+    if limit <= 0:
+        return ""
+    texts = []
+    for output in cell.get("outputs") or []:
+        if output.get("output_type") == "stream":
+            text = output.get("text", "")
+        else:
+            text = (output.get("data") or {}).get("text/plain", "")
+        if isinstance(text, list):
+            text = "".join(text)
+        texts.append(text)
+
+    text = "".join(texts).strip("\n")
+    lines = text.split("\n")
+    truncated = text[:limit]
+    if len(lines) > max_lines:
+        truncated = "\n".join(lines[:max_lines])[:limit]
+    if truncated != text:
+        truncated = truncated.rstrip() + " ..."
+    return truncated
+
+
+def comment_lines(text, prefix="# "):
+    return "\n".join((prefix + line).rstrip() for line in text.split("\n"))
+
+
+def code_lines(source):
+    # IPython magics and shell escapes are not valid Python: comment them out
+    lines = []
+    for line in source.split("\n"):
+        stripped = line.lstrip()
+        if stripped.startswith(("%", "!")):
+            line = "# " + line
+        lines.append(line)
+    return "\n".join(lines)
+
+
+def notebook_language(nb):
+    metadata = nb.get("metadata") or {}
+    name = ((metadata.get("kernelspec") or {}).get("language")
+            or (metadata.get("language_info") or {}).get("name")
+            or "python")
+    return NOTEBOOK_LANGUAGES.get(name.lower())
+
+
+def convert_notebook(raw):
+    """
+    Turn notebook JSON into {"content", "language", "cells"}, where cells is
+    [{index, cell_type, start_line, end_line}] locating each cell (marker
+    line included) in content. Returns None if raw is not a notebook.
+    """
+    try:
+        nb = json.loads(raw)
+    except ValueError:
+        return None
+    if not isinstance(nb, dict) or not isinstance(nb.get("cells"), list):
+        return None
+
+    blocks, cells, line = [], [], 0
+    for index, cell in enumerate(nb["cells"]):
+        cell_type = cell.get("cell_type", "code")
+        source = cell_source(cell)
+        if not source.strip():
+            continue
+
+        if cell_type == "code":
+            body = code_lines(source)
+            output = text_outputs(cell)
+            if output:
+                body += "\n# Output:\n" + comment_lines(output)
+            marker = f"# %% [{index}]"
+        else:
+            body = comment_lines(source)
+            marker = f"# %% [{index}] [{cell_type}]"
+
+        block = marker + "\n" + body
+        n_lines = block.count("\n") + 1
+        cells.append({
+            "index": index,
+            "cell_type": cell_type,
+            "start_line": line,
+            "end_line": line + n_lines - 1,
+        })
+        blocks.append(block)
+        # Blank line between cells
+        line += n_lines + 1
+
+    return {
+        "content": "\n\n".join(blocks) + "\n",
+        "language": notebook_language(nb),
+        "cells": cells,
+    }
+
+
+def cell_at(cells, line):
+    """Index of the notebook cell containing `line`, or None."""
+    for cell in cells:
+        if cell["start_line"] <= line <= cell["end_line"]:
+            return cell["index"]
+    return None
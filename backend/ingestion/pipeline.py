@@ -1,15 +1,226 @@
-from .clone_repo import clone_repository
-from .extract_files import extract_repo_files
-from backend.chunking.pipeline import create_chunks
+"""
+Ingest pipeline.
 
-def ingest_repo(github_url):
-    repo_name, repo_path = clone_repository(github_url)
-    extracted_files = extract_repo_files(repo_path)
-    
-    chunks = create_chunks(repo_name, extracted_files)
+`ingest_repo` prepares the source and the (classified) file stream.
+`run_ingest_pipeline` then runs each remaining stage exactly once, on its own
+thread, linked by bounded queues:
+
+    files ──▶ chunk ──▶ embed batches ──▶ index
+
+so parsing, embedding and index building overlap and wall-clock time tends
+towards the slowest stage instead of the sum of all of them.
+"""
+import queue
+import threading
+
+from .clone_repo import open_source
+from .extract_files import iter_source_files, read_source_file
+from .classify_files import classify_files, new_report
+
+# Bounded hand-off between stages (items are per-file chunk lists and
+# embedded batches respectively)
+CHUNK_QUEUE_SIZE = 64
+VECTOR_QUEUE_SIZE = 8
+
+_DONE = object()
+
+
+def ingest_repo(github_url, stream=False):
+    # Shallow/partial clone, local repository or archive; files are read
+    # from the object database (or archive) without a checkout and handed
+    # over in path order as they are read, so the caller can start
+    # chunking early and the repo budget always keeps the same files.
+    # Vendored/generated/minified/oversized files are dropped on the way
+    # and listed in `report`, which fills up as `files` is consumed.
+    source = open_source(github_url)
+    report = new_report()
+    files = classify_files(
+        iter_source_files(source),
+        source["repo_path"],
+        report,
+        gitattributes=read_source_file(source, ".gitattributes"),
+    )
+
+    return {
+        "repo_name": source["repo_name"],
+        "commit_sha": source["commit_sha"],
+        "files": files if stream else list(files),
+        "report": report,
+    }
+
+
+class StageFailed(Exception):
+    pass
+
+
+def _put(q, item, stop):
+    # Blocking put that gives up once another stage has failed
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=0.2)
+            return
+        except queue.Full:
+            continue
+    raise StageFailed()
+
+
+def _get(q, stop):
+    while True:
+        try:
+            return q.get(timeout=0.2)
+        except queue.Empty:
+            if stop.is_set():
+                raise StageFailed()
+
+
+def run_ingest_pipeline(repo_name, files, stats=None):
+    """
+    Chunk, embed and index a stream of file records.
+
+    Returns {"chunks", "vectors", "metadata", "index", "metric",
+    "dropped_files"} where metadata[i] is the chunk embedded as vector id i
+    and dropped_files the paths of files with chunks that could not be
+    embedded. `stats` (optional dict, e.g. a job's progress) is updated live
+    with per-stage counters.
+    """
+    from backend.chunking.chunk_resolver import iter_resolved_chunks
+    from backend.embeddings.generate_embeddings_local import (
+        BATCH_SIZE,
+        check_dropped,
+        dropped_files,
+        embed_chunks,
+        is_embeddable,
+    )
+    from backend.vector_store.faiss_store import create_faiss_index, new_faiss_index
+    from backend.vector_store.index_factory import INDEX_METRIC, is_final, prepare_vectors
+    import numpy as np
+
+    if stats is None:
+        stats = {}
+    for key in ("files_extracted", "chunks", "batches_embedded", "chunks_dropped", "vectors_indexed"):
+        stats.setdefault(key, 0)
+    stats.setdefault("parse", {})
+    stats["extraction_done"] = False
+    stats["stage"] = "processing"
+
+    chunk_q = queue.Queue(maxsize=CHUNK_QUEUE_SIZE)
+    vector_q = queue.Queue(maxsize=VECTOR_QUEUE_SIZE)
+    stop = threading.Event()
+    errors = []
+    all_chunks = []
+    dropped = set()
+    embeddable = 0
+
+    def chunk_stage():
+        try:
+            # Parsed on the multi-process parse pool, in file order
+            for f, file_chunks in iter_resolved_chunks(repo_name, files, parse_stats=stats["parse"]):
+                stats["files_extracted"] += 1
+                stats["chunks"] += len(file_chunks)
+                all_chunks.extend(file_chunks)
+                _put(chunk_q, file_chunks, stop)
+            stats["extraction_done"] = True
+            for language, entry in sorted(stats["parse"].items()):
+                print(f"   Parsed {entry['files']} {language} files "
+                      f"({entry['bytes'] / 1024:.0f} KB) in {entry['seconds']:.2f}s")
+            _put(chunk_q, _DONE, stop)
+        except StageFailed:
+            pass
+        except Exception as e:
+            errors.append(e)
+            stop.set()
+
+    def embed_stage():
+        try:
+            batch, offset = [], 0
+
+            def flush():
+                nonlocal batch, offset
+                vectors, embedded = embed_chunks(batch, label=offset)
+                stats["chunks_dropped"] += len(batch) - len(embedded)
+                dropped.update(dropped_files(batch, embedded))
+                if vectors:
+                    stats["batches_embedded"] += 1
+                    print(f"   Processed batch {offset} to {offset + len(batch)}")
+                    _put(vector_q, (vectors, embedded), stop)
+                offset += len(batch)
+                batch = []
+
+            nonlocal embeddable
+            while True:
+                file_chunks = _get(chunk_q, stop)
+                if file_chunks is _DONE:
+                    break
+                for c in file_chunks:
+                    if is_embeddable(c):
+                        embeddable += 1
+                        batch.append(c)
+                        if len(batch) == BATCH_SIZE:
+                            flush()
+            if batch:
+                flush()
+            _put(vector_q, _DONE, stop)
+        except StageFailed:
+            pass
+        except Exception as e:
+            errors.append(e)
+            stop.set()
+
+    workers = [
+        threading.Thread(target=chunk_stage, name=f"chunk-{repo_name}", daemon=True),
+        threading.Thread(target=embed_stage, name=f"embed-{repo_name}", daemon=True),
+    ]
+    for w in workers:
+        w.start()
+
+    # Index stage runs on the calling thread
+    index = None
+    vectors, metadata = [], []
+    try:
+        while True:
+            item = _get(vector_q, stop)
+            if item is _DONE:
+                break
+            batch_vectors, batch_chunks = item
+            # Normalized as the index's metric requires
+            vec_array = prepare_vectors(batch_vectors, INDEX_METRIC)
+            if index is None:
+                index = new_faiss_index(vec_array.shape[1])
+            ids = np.arange(len(metadata), len(metadata) + len(vec_array), dtype="int64")
+            index.add_with_ids(vec_array, ids)
+            vectors.extend(batch_vectors)
+            metadata.extend(batch_chunks)
+            stats["vectors_indexed"] = len(metadata)
+    except StageFailed:
+        pass
+    except Exception as e:
+        errors.append(e)
+    finally:
+        if errors:
+            stop.set()
+        for w in workers:
+            w.join()
+
+    if errors:
+        raise errors[0]
+    # Failed embedding batches: a few leave files to the next update (see
+    # incremental.py), more fail the ingest rather than publish a partial index
+    if stats["chunks_dropped"]:
+        print(f"[!] {stats['chunks_dropped']} chunks of {len(dropped)} files could not be embedded")
+    check_dropped(stats["chunks_dropped"], embeddable)
+
+    # Vectors are indexed flat as they stream in; large corpora are then
+    # rebuilt as an approximate and/or quantized index trained on a sample
+    # of them
+    if index is not None and not is_final(index):
+        stats["stage"] = "indexing"
+        index = create_faiss_index(vectors)
 
     return {
-        "repo_name": repo_name,
-        "files": extracted_files,
-        "chunks": chunks
+        "chunks": all_chunks,
+        "vectors": vectors,
+        "metadata": metadata,
+        "index": index,
+        "metric": INDEX_METRIC,
+        "dropped_files": dropped,
     }
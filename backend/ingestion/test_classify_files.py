@@ -0,0 +1,69 @@
+"""
+Tests for file classification: python -m pytest backend/ingestion/test_classify_files.py
+"""
+from backend.ingestion.classify_files import (
+    MAX_FILE_BYTES,
+    classify_file,
+    classify_files,
+    linguist_attributes,
+    new_report,
+    parse_gitattributes,
+)
+
+SOURCE = "def main():\n    return 0\n"
+
+
+def reason(rel_path, content=SOURCE, rules=()):
+    return classify_file(rel_path, content, len(content), rules)
+
+
+def test_classifier_reasons():
+    assert reason("src/app.py") is None
+    assert reason("package-lock.json", "{}") == "lockfile"
+    assert reason("vendor/lib/util.py") == "vendored"
+    assert reason("web/third_party/x.js") == "vendored"
+    assert classify_file("big.py", SOURCE, MAX_FILE_BYTES + 1) == "too_large"
+    assert reason("blob.py", "abc\x00def") == "binary"
+    assert reason("app.min.js", "var a=1;") == "minified"
+    assert reason("one_line.js", "var a=1;" * 500) == "minified"
+    assert reason("api_pb2.py", "# Generated by the protocol buffer compiler.  DO NOT EDIT!\n") == "generated"
+    # Markers only count near the top
+    assert reason("late.py", SOURCE * 100 + "# @generated\n") is None
+
+
+def test_gitattributes_rules():
+    rules = parse_gitattributes("""
+# comment
+*.pb.go          linguist-generated
+docs/**          linguist-vendored=true
+/gen/            linguist-generated
+gen/keep.py      -linguist-generated
+*.py             text eol=lf
+""")
+    # Lines without linguist attributes are dropped
+    assert len(rules) == 4
+
+    assert linguist_attributes(rules, "api/v1/service.pb.go") == {"linguist-generated": True}
+    assert linguist_attributes(rules, "docs/a/b.md") == {"linguist-vendored": True}
+    assert linguist_attributes(rules, "src/docs/a.md") == {}
+    assert linguist_attributes(rules, "gen/models.py") == {"linguist-generated": True}
+    assert linguist_attributes(rules, "pkg/gen/models.py") == {}
+    # Later entries win
+    assert linguist_attributes(rules, "gen/keep.py") == {"linguist-generated": False}
+
+    assert reason("api/v1/service.pb.go", rules=rules) == "generated"
+    assert reason("docs/guide.md", rules=rules) == "vendored"
+    assert reason("gen/keep.py", rules=rules) is None
+
+
+def test_classify_files_reports_skips():
+    files = [{"file_path": f"data/repos/o/r/{name}", "content": content}
+             for name, content in [("a.py", SOURCE), ("yarn.lock", "x"), ("b.py", "\x00"),
+                                   ("gen/c.py", SOURCE)]]
+    report = new_report()
+    kept = list(classify_files(files, "data/repos/o/r", report, gitattributes="gen/** linguist-generated"))
+
+    assert [f["file_path"] for f in kept] == ["data/repos/o/r/a.py"]
+    assert report["files_kept"] == 1 and report["bytes_kept"] == len(SOURCE)
+    assert report["skipped"] == {"lockfile": 1, "binary": 1, "generated": 1}
+    assert {s["reason"] for s in report["skipped_files"]} == {"lockfile", "binary", "generated"}
@@ -0,0 +1,76 @@
+"""
+Tests for file extraction: python -m pytest backend/ingestion/test_extract_files.py
+"""
+import os
+import random
+import time
+import zipfile
+
+from git import Repo
+
+from backend.ingestion import classify_files as classify
+from backend.ingestion import extract_files as extract
+from backend.ingestion.classify_files import classify_files, new_report
+from backend.ingestion.extract_files import (
+    iter_archive_files,
+    iter_bounded,
+    iter_git_files,
+    iter_repo_files,
+)
+
+
+def test_bounded_reads_come_out_in_task_order():
+    def read(i):
+        time.sleep(random.random() / 100)
+        return None if i % 7 == 0 else i
+
+    got = list(iter_bounded(((i,) for i in range(200)), read, max_workers=8, max_in_flight=16))
+    assert got == [i for i in range(200) if i % 7]
+
+
+def test_repo_budget_keeps_the_same_files_every_time(tmp_path):
+    repo = Repo.init(tmp_path / "r")
+    names = [f"pkg{i % 3}/m{i:02d}.py" for i in range(30)]
+    for name in names:
+        os.makedirs(tmp_path / "r" / os.path.dirname(name), exist_ok=True)
+        (tmp_path / "r" / name).write_text(f"def f():\n    return {name!r}\n" * 10)
+    repo.index.add(names)
+    repo.index.commit("files")
+    size = len((tmp_path / "r" / names[0]).read_bytes())
+
+    def kept(files):
+        return [f["file_path"] for f in classify_files(files, "data/repos/o/r", new_report(),
+                                                       max_repo_bytes=10 * size)]
+
+    # The first ten paths in order, whichever reads finish first
+    expected = [os.path.join("data/repos/o/r", name) for name in sorted(names)[:10]]
+    for _ in range(3):
+        assert kept(iter_git_files(repo, "data/repos/o/r", max_workers=8, max_in_flight=8)) == expected
+        assert kept(iter_repo_files(str(tmp_path / "r"), root_as="data/repos/o/r")) == expected
+
+
+def test_oversized_files_are_skipped_without_being_read(tmp_path, monkeypatch):
+    monkeypatch.setattr(classify, "MAX_FILE_BYTES", 1000)
+    monkeypatch.setattr(extract, "MAX_FILE_BYTES", 1000)
+    files = {"big.py": "x = 1\n" * 1000, "small.py": "y = 2\n"}
+    repo = Repo.init(tmp_path / "r")
+    for name, content in files.items():
+        (tmp_path / "r" / name).write_text(content)
+    repo.index.add(list(files))
+    repo.index.commit("files")
+    with zipfile.ZipFile(tmp_path / "r.zip", "w") as zf:
+        for name, content in files.items():
+            zf.writestr(f"r-main/{name}", content)
+
+    for records in (iter_git_files(repo, "data/repos/o/r"),
+                    iter_repo_files(str(tmp_path / "r"), root_as="data/repos/o/r"),
+                    iter_archive_files(str(tmp_path / "r.zip"), "data/repos/o/r")):
+        records = {os.path.basename(f["file_path"]): f for f in records}
+        assert records["big.py"]["content"] == ""
+        assert records["big.py"]["size"] == 6000
+        assert records["small.py"]["content"] == files["small.py"]
+
+        report = new_report()
+        kept = list(classify_files(records.values(), "data/repos/o/r", report))
+        assert [os.path.basename(f["file_path"]) for f in kept] == ["small.py"]
+        assert report["skipped"] == {"too_large": 1}
@@ -0,0 +1,192 @@
+"""
+Tests for incremental re-ingestion: python -m pytest backend/ingestion/test_incremental.py
+"""
+import os
+import hashlib
+
+import numpy as np
+from git import Repo
+
+import backend.embeddings.generate_embeddings_local as embeddings
+from backend.ingestion import clone_repo
+from backend.ingestion.classify_files import content_bytes
+from backend.ingestion.incremental import content_hash, load_ingest_state, plan_update
+
+
+def fake_vector(text):
+    seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+    return np.random.default_rng(seed).random(8).tolist()
+
+
+def commit_files(repo, files, message):
+    for name, content in files.items():
+        with open(os.path.join(repo.working_tree_dir, name), "w", encoding="utf-8") as f:
+            f.write(content)
+    repo.index.add(list(files))
+    return repo.index.commit(message).hexsha
+
+
+def indexed_files(repo_name):
+    from backend.storage.bundles import open_bundle
+
+    bundle = open_bundle(repo_name)
+    try:
+        return {os.path.basename(bundle.store.get(chunk_id)["file_path"])
+                for chunk_id in bundle.vector_chunk_ids().values()}
+    finally:
+        bundle.close()
+
+
+def test_update_re_embeds_files_whose_embedding_failed(tmp_path, monkeypatch):
+    from backend.api.routes.ingest import IngestRequest, process_repository, update_repository
+
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(clone_repo, "LOCAL_SOURCES_ROOT", str(tmp_path))
+    # One chunk per batch, so a failed batch drops just that chunk, which
+    # the threshold lets through
+    monkeypatch.setattr(embeddings, "BATCH_SIZE", 1)
+    monkeypatch.setattr(embeddings, "EMBED_MAX_DROPPED", 0.5)
+    failures = []
+
+    def embed_batch(texts, label="", retries=3):
+        if not failures and any("def beta" in text for text in texts):
+            failures.append(label)
+            return None
+        return [fake_vector(text) for text in texts]
+
+    monkeypatch.setattr(embeddings, "embed_batch", embed_batch)
+
+    repo = Repo.init(tmp_path / "r")
+    commit_files(repo, {"a.py": "def alpha():\n    return 1\n",
+                        "b.py": "def beta():\n    return 2\n"}, "one")
+    request = IngestRequest(url=str(tmp_path / "r"))
+    repo_name = clone_repo.get_repo_key(request.url)
+
+    process_repository(request, repo_name, {})
+    assert failures
+    state = load_ingest_state(repo_name)
+    assert state["files"]["data/repos/local/r/b.py"]["hash"] is None
+    assert indexed_files(repo_name) == {"a.py"}
+
+    # b.py is unchanged: only its missing hash brings it back
+    commit_files(repo, {"a.py": "def alpha():\n    return 3\n"}, "two")
+    update_repository(IngestRequest(url=request.url, update=True), repo_name, state, 1, {})
+
+    state = load_ingest_state(repo_name)
+    assert state["files"]["data/repos/local/r/b.py"]["hash"] is not None
+    assert indexed_files(repo_name) == {"a.py", "b.py"}
+
+
+def test_update_reclassifies_untouched_files_when_gitattributes_changes(tmp_path, monkeypatch):
+    from backend.api.routes.ingest import IngestRequest, process_repository, update_repository
+
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(clone_repo, "LOCAL_SOURCES_ROOT", str(tmp_path))
+    monkeypatch.setattr(embeddings, "embed_batch",
+                        lambda texts, label="", retries=3: [fake_vector(t) for t in texts])
+
+    repo = Repo.init(tmp_path / "r")
+    commit_files(repo, {"a.py": "def alpha():\n    return 1\n",
+                        "b.py": "def beta():\n    return 2\n"}, "one")
+    request = IngestRequest(url=str(tmp_path / "r"))
+    repo_name = clone_repo.get_repo_key(request.url)
+    process_repository(request, repo_name, {})
+    assert indexed_files(repo_name) == {"a.py", "b.py"}
+
+    # Only .gitattributes changes, yet b.py is now generated and must go
+    commit_files(repo, {".gitattributes": "b.py linguist-generated\n"}, "two")
+    summary = update_repository(IngestRequest(url=request.url, update=True), repo_name,
+                                load_ingest_state(repo_name), 2, {})
+
+    assert summary.removed_files == 1
+    assert indexed_files(repo_name) == {"a.py"}
+    assert "data/repos/local/r/b.py" not in load_ingest_state(repo_name)["files"]
+
+
+def test_update_without_ingest_state_re_ingests_in_full(tmp_path, monkeypatch):
+    from backend.api.routes.ingest import IngestRequest, process_repository
+    from backend.storage.bundles import STATE_FILE, open_bundle
+
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(clone_repo, "LOCAL_SOURCES_ROOT", str(tmp_path))
+    monkeypatch.setattr(embeddings, "embed_batch",
+                        lambda texts, label="", retries=3: [fake_vector(t) for t in texts])
+
+    repo = Repo.init(tmp_path / "r")
+    commit_files(repo, {"a.py": "def alpha():\n    return 1\n"}, "one")
+    request = IngestRequest(url=str(tmp_path / "r"))
+    repo_name = clone_repo.get_repo_key(request.url)
+    process_repository(request, repo_name, {})
+
+    # As if indexed before ingest state was recorded
+    bundle = open_bundle(repo_name)
+    os.remove(bundle.file(STATE_FILE))
+    bundle.close()
+    assert load_ingest_state(repo_name) is None
+
+    commit_files(repo, {"b.py": "def beta():\n    return 2\n"}, "two")
+    response = process_repository(IngestRequest(url=request.url, update=True), repo_name, {})
+
+    assert not response.already_indexed
+    assert indexed_files(repo_name) == {"a.py", "b.py"}
+    assert set(load_ingest_state(repo_name)["files"]) == {"data/repos/local/r/a.py",
+                                                          "data/repos/local/r/b.py"}
+
+
+def planned_repo(tmp_path, monkeypatch):
+    """
+    A local repo indexed at its first commit (state recorded by hand), then
+    moved on: a.py modified, b.py deleted, d.py added, c.py untouched.
+    """
+    monkeypatch.setattr(clone_repo, "LOCAL_SOURCES_ROOT", str(tmp_path))
+    repo = Repo.init(tmp_path / "r")
+    first = {"a.py": "a = 1\n", "b.py": "b = 1\n", "c.py": "c = 1\n"}
+    old_sha = commit_files(repo, first, "one")
+    state = {"commit_sha": old_sha, "next_id": 3, "files": {
+        f"data/repos/local/r/{name}": {"hash": content_hash(content), "ids": [i],
+                                       "bytes": content_bytes(content)}
+        for i, (name, content) in enumerate(first.items())}}
+
+    commit_files(repo, {"a.py": "a = 2\n", "d.py": "d = 1\n"}, "two")
+    repo.index.remove(["b.py"], working_tree=True)
+    repo.index.commit("three")
+    return clone_repo.open_source(str(tmp_path / "r")), state
+
+
+def planned(source, state, **kwargs):
+    changed_files, stale_paths, new_hashes = plan_update(source, state, **kwargs)
+    name = os.path.basename
+    return ([name(f["file_path"]) for f in changed_files], sorted(map(name, stale_paths)),
+            sorted(map(name, new_hashes)))
+
+
+def test_plan_update_reads_only_the_diff(tmp_path, monkeypatch):
+    source, state = planned_repo(tmp_path, monkeypatch)
+    # A wrong hash for untouched c.py goes unnoticed: only the diff is read
+    state["files"]["data/repos/local/r/c.py"]["hash"] = "stale"
+
+    assert planned(source, state) == (["a.py", "d.py"], ["a.py", "b.py"], ["a.py", "d.py"])
+
+
+def test_plan_update_compares_hashes_without_usable_history(tmp_path, monkeypatch):
+    source, state = planned_repo(tmp_path, monkeypatch)
+    state["files"]["data/repos/local/r/c.py"]["hash"] = "stale"
+    expected = (["a.py", "c.py", "d.py"], ["a.py", "b.py", "c.py"], ["a.py", "c.py", "d.py"])
+
+    # Previous commit unknown to the repo
+    unreachable = dict(state, commit_sha="0" * 40)
+    assert planned(source, unreachable) == expected
+
+    # State recorded without file sizes
+    for entry in state["files"].values():
+        del entry["bytes"]
+    assert planned(source, state) == expected
+
+
+def test_plan_update_admits_changed_files_within_the_budget(tmp_path, monkeypatch):
+    source, state = planned_repo(tmp_path, monkeypatch)
+    # c.py keeps its 6 bytes, then a.py fits and d.py does not
+    changed, stale, new_hashes = planned(source, state, max_repo_bytes=12)
+
+    assert changed == new_hashes == ["a.py"]
+    assert stale == ["a.py", "b.py"]
@@ -0,0 +1,70 @@
+"""
+Tests for notebook extraction: python -m pytest backend/ingestion/test_notebooks.py
+"""
+import json
+
+from backend.ingestion.extract_files import make_record
+from backend.ingestion.notebooks import cell_at, convert_notebook, text_outputs
+
+NOTEBOOK = {
+    "metadata": {"kernelspec": {"language": "python"}},
+    "cells": [
+        {"cell_type": "markdown", "source": ["# Title\n", "Some text"]},
+        {"cell_type": "code", "source": ["%matplotlib inline\n", "def f(x):\n", "    return x * 2\n"],
+         "outputs": [{"output_type": "stream", "text": ["hello\n"]}]},
+        {"cell_type": "code", "source": "   \n", "outputs": []},
+        {"cell_type": "code", "source": "f(2)",
+         "outputs": [{"output_type": "execute_result",
+                      "data": {"text/plain": "4", "image/png": "iVBORw0KGgo="}}]},
+    ],
+}
+
+
+def test_percent_format_conversion():
+    converted = convert_notebook(json.dumps(NOTEBOOK))
+
+    assert converted["content"] == (
+        "# %% [0] [markdown]\n"
+        "# # Title\n"
+        "# Some text\n"
+        "\n"
+        "# %% [1]\n"
+        "# %matplotlib inline\n"
+        "def f(x):\n"
+        "    return x * 2\n"
+        "# Output:\n"
+        "# hello\n"
+        "\n"
+        "# %% [3]\n"
+        "f(2)\n"
+        "# Output:\n"
+        "# 4\n"
+    )
+    assert converted["language"] == "python"
+    # Blank cells are skipped but keep their numbering; lines are inclusive
+    assert converted["cells"] == [
+        {"index": 0, "cell_type": "markdown", "start_line": 0, "end_line": 2},
+        {"index": 1, "cell_type": "code", "start_line": 4, "end_line": 9},
+        {"index": 3, "cell_type": "code", "start_line": 11, "end_line": 14},
+    ]
+    assert [cell_at(converted["cells"], line) for line in (0, 3, 6, 14, 15)] == [0, None, 1, 3, None]
+
+
+def test_text_outputs_are_capped():
+    cell = {"outputs": [{"output_type": "stream", "text": "\n".join(f"line {i}" for i in range(20))}]}
+    assert text_outputs(cell, limit=300, max_lines=3) == "line 0\nline 1\nline 2 ..."
+    assert text_outputs(cell, limit=10, max_lines=3) == "line 0\nlin ..."
+    assert text_outputs(cell, limit=0) == ""
+
+
+def test_notebook_records():
+    record = make_record("nb/analysis.ipynb", ".ipynb", json.dumps(NOTEBOOK))
+    assert record["language"] == "python" and record["content"].startswith("# %% [0]")
+    assert len(record["cells"]) == 3
+
+    # Other kernels are kept as text, without a parser
+    r_notebook = dict(NOTEBOOK, metadata={"kernelspec": {"language": "R"}})
+    assert convert_notebook(json.dumps(r_notebook))["language"] is None
+
+    assert convert_notebook("not json") is None
+    assert make_record("nb/broken.ipynb", ".ipynb", '{"cells": 3}') is None
@@ -0,0 +1,51 @@
+"""
+Tests for the ingest pipeline: python -m pytest backend/ingestion/test_pipeline.py
+"""
+import hashlib
+
+import numpy as np
+import pytest
+
+import backend.embeddings.generate_embeddings_local as embeddings
+from backend.ingestion.pipeline import run_ingest_pipeline
+
+FILES = [
+    {"file_path": f"data/repos/o/r/m{i}.py", "ext": ".py",
+     "content": f"def f{i}():\n    return {i}\n"}
+    for i in range(10)
+]
+
+
+def fake_vector(text):
+    seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+    return np.random.default_rng(seed).random(8).tolist()
+
+
+@pytest.fixture
+def failing_embeddings(tmp_path, monkeypatch):
+    """Embedding batches that fail whenever they hold f3's text."""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(embeddings, "BATCH_SIZE", 1)
+
+    def embed_batch(texts, label="", retries=3):
+        if any("def f3" in text for text in texts):
+            return None
+        return [fake_vector(text) for text in texts]
+
+    monkeypatch.setattr(embeddings, "embed_batch", embed_batch)
+
+
+def test_dropped_chunks_are_counted_and_reported(failing_embeddings, monkeypatch):
+    monkeypatch.setattr(embeddings, "EMBED_MAX_DROPPED", 0.2)
+    stats = {}
+    result = run_ingest_pipeline("o/r", iter(FILES), stats=stats)
+
+    assert stats["chunks_dropped"] == 1
+    assert result["dropped_files"] == {"data/repos/o/r/m3.py"}
+    assert len(result["metadata"]) == result["index"].ntotal == 9
+
+
+def test_too_many_dropped_chunks_fail_the_ingest(failing_embeddings):
+    # 1 of 10 chunks is over the default EMBED_MAX_DROPPED
+    with pytest.raises(RuntimeError, match="could not be embedded"):
+        run_ingest_pipeline("o/r", iter(FILES), stats={})
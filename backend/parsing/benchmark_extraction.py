@@ -0,0 +1,101 @@
+"""
+Micro-benchmark for function extraction, per language.
+
+Times three ways of finding function nodes on the same parsed tree:
+  recursive - the old recursive visit over node.children
+  cursor    - walk_tree (iterative TreeCursor)
+  query     - the compiled per-language query used by extract_functions
+and the full extract_functions call, on generated sources of the given
+size. Also checks that a deeply nested file extracts without hitting the
+recursion limit.
+
+    python -m backend.parsing.benchmark_extraction [--functions 2000] [--repeat 5]
+"""
+import sys
+import time
+import argparse
+
+from .function_extractor import extract_functions, find_function_nodes, walk_tree
+from .node_types import FUNCTION_NODE_TYPES
+from .parser_pool import parse
+
+# One function per language, with a nested function where the language has them
+TEMPLATES = {
+    "python": "def f{i}(a, b):\n    def g{i}(x):\n        return x + {i}\n    return g{i}(a) * b\n\n",
+    "javascript": "function f{i}(a, b) {{\n  const g = (x) => x + {i};\n  return g(a) * b;\n}}\n\n",
+    "typescript": "function f{i}(a: number, b: number): number {{\n  const g = (x: number) => x + {i};\n  return g(a) * b;\n}}\n\n",
+    "go": "func f{i}(a int, b int) int {{\n\tg := func(x int) int {{ return x + {i} }}\n\treturn g(a) * b\n}}\n\n",
+    "java": "class C{i} {{\n  int f(int a, int b) {{\n    return a * b + {i};\n  }}\n}}\n\n",
+    "c": "int f{i}(int a, int b) {{\n  return a * b + {i};\n}}\n\n",
+    "rust": "fn f{i}(a: i32, b: i32) -> i32 {{\n    fn g(x: i32) -> i32 {{ x + {i} }}\n    g(a) * b\n}}\n\n",
+}
+
+
+def generate_source(language, n_functions):
+    template = TEMPLATES[language]
+    return "".join(template.format(i=i) for i in range(n_functions))
+
+
+def recursive_find(node, types, out):
+    if node.type in types and node.child_count > 0:
+        out.append(node)
+    for child in node.children:
+        recursive_find(child, types, out)
+    return out
+
+
+def best_of(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def bench_language(language, n_functions, repeat):
+    content = generate_source(language, n_functions)
+    src = content.encode("utf8")
+    root = parse(language, src).root_node
+    types = set(FUNCTION_NODE_TYPES[language])
+
+    found = len(find_function_nodes(root, language))
+    return {
+        "kb": len(src) / 1024,
+        "functions": found,
+        "parse": best_of(lambda: parse(language, src), repeat),
+        "recursive": best_of(lambda: recursive_find(root, types, []), repeat),
+        "cursor": best_of(lambda: [n for n in walk_tree(root) if n.type in types], repeat),
+        "query": best_of(lambda: find_function_nodes(root, language), repeat),
+        "extract": best_of(lambda: extract_functions(content, "bench", "bench", language), repeat),
+    }
+
+
+def check_deep_nesting(depth=5000):
+    """A deeply nested expression used to overflow the recursive visit."""
+    content = "x = " + "(" * depth + "1" + ")" * depth + "\ndef f():\n    return 1\n"
+    functions, _, _ = extract_functions(content, "deep", "bench", "python")
+    return len(functions)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--functions", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--languages", nargs="*", default=sorted(TEMPLATES))
+    args = parser.parse_args(argv)
+
+    print(f"{'language':<12}{'KB':>8}{'funcs':>8}{'parse':>10}{'recursive':>11}"
+          f"{'cursor':>10}{'query':>10}{'extract':>10}   (ms, best of {args.repeat})")
+    for language in args.languages:
+        r = bench_language(language, args.functions, args.repeat)
+        print(f"{language:<12}{r['kb']:>8.0f}{r['functions']:>8}"
+              + "".join(f"{r[k] * 1000:>{w}.1f}" for k, w in
+                        (("parse", 10), ("recursive", 11), ("cursor", 10), ("query", 10), ("extract", 10))))
+
+    limit = sys.getrecursionlimit()
+    print(f"[+] Deeply nested file: {check_deep_nesting()} function(s) extracted (recursion limit {limit})")
+
+
+if __name__ == "__main__":
+    main()
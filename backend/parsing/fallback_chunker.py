@@ -1,43 +1,60 @@
-from backend.chunking.chunker import chunk_content
-
-def compute_fallback_chunks(content, file_path, repo_name, used_ranges, chunk_size=800, overlap=100):
+from backend.chunking.chunker import chunk_content, MAX_CHUNK_TOKENS, OVERLAP_TOKENS
+
+
+def merge_ranges(ranges):
+    """Merge inclusive (start, end) line ranges into sorted disjoint intervals."""
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return merged
+
+
+def uncovered_blocks(total, used_ranges):
+    """Yield (start, end_exclusive) line blocks not covered by any range."""
+    pos = 0
+    for start, end in merge_ranges(used_ranges):
+        if start > pos:
+            yield pos, min(start, total)
+        pos = max(pos, end + 1)
+    if pos < total:
+        yield pos, total
+
+
+def compute_fallback_chunks(content, file_path, repo_name, used_ranges, boundaries=(),
+                            max_tokens=MAX_CHUNK_TOKENS, overlap_tokens=OVERLAP_TOKENS):
+    """
+    Token-budgeted chunks for the lines no function chunk covers.
+    `boundaries` are file line numbers where a top-level statement starts;
+    chunks are preferably cut there.
+    """
     lines = content.split("\n")
     total = len(lines)
-    covered = [False] * total
-
-    for start, end in used_ranges:
-        for i in range(start, min(end+1, total)):
-            covered[i] = True
-
-    fallback_blocks = []
-    start_line = None
-    current = []
-
-    for i, line in enumerate(lines):
-        if covered[i]:
-            if current:
-                fallback_blocks.append((current, start_line))
-                current = []
-                start_line = None
-            continue
-
-        if start_line is None:
-            start_line = i
-        current.append(line)
-
-    if current:
-        fallback_blocks.append((current, start_line))
 
     fallback_chunks = []
-    for block, block_start in fallback_blocks:
-        block_text = "\n".join(block)
+    seen_ids = set()
+    for block_start, block_end in uncovered_blocks(total, used_ranges):
+        block_text = "\n".join(lines[block_start:block_end])
         chunks = chunk_content(
             content=block_text,
             file_path=file_path,
             repo_name=repo_name,
-            chunk_size=chunk_size,
-            overlap=overlap
+            max_tokens=max_tokens,
+            overlap_tokens=overlap_tokens,
+            boundaries=[b - block_start for b in boundaries if block_start <= b < block_end]
         )
+        # chunk_content numbers lines from the start of the block
+        for c in chunks:
+            c["start_line"] += block_start
+            c["end_line"] += block_start
+            c["chunk_id"] = f"{repo_name}_{file_path}_fallback_{c['start_line']}"
+            # A line split mid-way starts more than one chunk
+            if c["chunk_id"] in seen_ids:
+                c["chunk_id"] += f".{len(seen_ids)}"
+            seen_ids.add(c["chunk_id"])
+            c["type"] = "fallback"
         fallback_chunks.extend(chunks)
 
     return fallback_chunks
@@ -1,42 +1,246 @@
 # parsing/function_extractor.py
 
-from .parser_pool import get_parser
+from .parser_pool import get_node_query, parse
 from .node_types import FUNCTION_NODE_TYPES
+from backend.chunking.chunker import MAX_CHUNK_TOKENS, approx_token_count, chunk_content
 
-def extract_functions(content, file_path, repo_name, language):
-    parser = get_parser(language)
+
+def placeholder_for(text):
+    """
+    Stand-in for a nested function inside its parent's content: the child's
+    first line (its signature) followed by an ellipsis.
+    """
+    first_line = text.split("\n", 1)[0].rstrip()
+    return f"{first_line} ..."
+
+
+def walk_tree(node):
+    """
+    Yield node and all its descendants in document order, iteratively with
+    a TreeCursor (no recursion, no per-node children lists).
+    """
+    cursor = node.walk()
+    while True:
+        yield cursor.node
+        if cursor.goto_first_child() or cursor.goto_next_sibling():
+            continue
+        # Climb until some ancestor has a next sibling; the cursor cannot
+        # leave the node it was created on
+        while True:
+            if not cursor.goto_parent():
+                return
+            if cursor.goto_next_sibling():
+                break
+
+
+def find_function_nodes(root, language):
+    """
+    Function nodes under root in document order, outer before inner. Uses
+    the language's compiled query, or a cursor walk if it has none.
+    """
+    valid_types = FUNCTION_NODE_TYPES.get(language, [])
+    if not valid_types:
+        return []
+
+    query = get_node_query(language, valid_types, capture="function")
+    if query is not None:
+        nodes = [node for node, _ in query.captures(root)]
+    else:
+        types = set(valid_types)
+        nodes = [node for node in walk_tree(root) if node.type in types]
+
+    # Nodes sharing a start byte: the enclosing (longer) one first
+    nodes.sort(key=lambda n: (n.start_byte, -n.end_byte))
+    return [node for node in nodes if node.child_count > 0]
+
+
+def statement_rows(node):
+    """Start rows of the statements directly inside node's body."""
+    body = node.child_by_field_name("body") or node
+    return [child.start_point[0] for child in body.named_children]
+
+
+def content_line_starts(chunk):
+    """
+    File line on which each line of a function chunk's (elided) content
+    starts: a line holding a child placeholder continues where the child ends.
+    """
+    starts = [chunk["start_line"]]
+    offset = 0
+    lines = chunk["content"].split("\n")
+    for line in lines[:-1]:
+        end = offset + len(line) + 1
+        last = starts[-1]
+        for child in chunk["children"]:
+            if offset <= child["offset"] < end:
+                last = max(last, child["end_line"])
+        starts.append(last + 1)
+        offset = end
+    return starts
+
+
+def split_function_chunk(chunk, rows, max_tokens=MAX_CHUNK_TOKENS, tokenizer=None):
+    """
+    Split a function chunk whose content is over the token budget into
+    parts cut at statement boundaries (`rows`, file line numbers). The
+    original chunk stays as the parts' parent, listing them in "parts", and
+    is no longer embedded itself. Returns the list of parts.
+    """
+    starts = content_line_starts(chunk)
+    rows = set(rows)
+    boundaries = [i for i, row in enumerate(starts) if row in rows]
+    windows = chunk_content(chunk["content"], chunk["file_path"], chunk["repo_name"],
+                            max_tokens=max_tokens, overlap_tokens=0,
+                            tokenizer=tokenizer, boundaries=boundaries)
+
+    lines = chunk["content"].split("\n")
+    line_offsets = [0]
+    for line in lines:
+        line_offsets.append(line_offsets[-1] + len(line) + 1)
+
+    parts = []
+    for k, window in enumerate(windows):
+        first, last = window["start_line"], window["end_line"]
+        lo = line_offsets[first]
+        hi = line_offsets[last]
+        end_line = starts[last] - 1 if last < len(starts) else chunk["end_line"]
+        parts.append({
+            "chunk_id": f"{chunk['chunk_id']}#{k}",
+            "repo_name": chunk["repo_name"],
+            "file_path": chunk["file_path"],
+            "content": window["content"],
+            "start_line": starts[first],
+            "end_line": end_line,
+            "language": chunk["language"],
+            "type": "function",
+            "parent_id": chunk["chunk_id"],
+            "part": k,
+            "children": [
+                dict(child, offset=child["offset"] - lo)
+                for child in chunk["children"] if lo <= child["offset"] < hi
+            ],
+        })
+
+    chunk["parts"] = [p["chunk_id"] for p in parts]
+    return parts
+
+
+def extract_functions(content, file_path, repo_name, language,
+                      max_tokens=MAX_CHUNK_TOKENS, tokenizer=None):
+    """
+    Extract one chunk per function node, hierarchically.
+
+    Nested functions (methods, closures) are chunks of their own; their
+    parent's content has each direct child replaced by a one-line
+    placeholder, so every line of code is embedded once. Each chunk records:
+      parent_id - chunk_id of the enclosing function chunk (or None)
+      children  - [{chunk_id, start_line, end_line, offset, length}] where
+                  offset/length locate the child's placeholder in content
+
+    Functions whose content is over max_tokens are split into parts at
+    statement boundaries (see split_function_chunk).
+
+    Returns (functions, used_line_ranges, boundaries); the ranges are those
+    of the top-level functions, which cover all nested ones, and boundaries
+    are the start rows of top-level statements, for the fallback chunker.
+    """
     src = content.encode("utf8")
-    tree = parser.parse(src)
+    tree = parse(language, src)
     root = tree.root_node
 
     functions = []
     used_line_ranges = []
-    valid_types = FUNCTION_NODE_TYPES.get(language, [])
 
-    def extract_text(node):
-        return src[node.start_byte:node.end_byte].decode("utf8")
-
-    def visit(node):
-        if node.type in valid_types and node.child_count > 0:
-            code = extract_text(node)
-            start_line = node.start_point[0]
-            end_line = node.end_point[0]
-
-            functions.append({
-                "chunk_id": f"{repo_name}_{file_path}_{start_line}",
-                "repo_name": repo_name,
-                "file_path": file_path,
-                "content": code,
-                "start_line": start_line,
-                "end_line": end_line,
-                "language": language,
-                "type": "function"
-            })
+    # Node positions are read once: every property access on a tree-sitter
+    # node builds new Python objects.
+    # chunk_id -> (node, span, [child spans]); span is
+    # (start_byte, end_byte, start_line, end_line, chunk_id)
+    nested = {}
+    # Enclosing functions of the current node, innermost last
+    stack = []
+
+    for node in find_function_nodes(root, language):
+        start_byte, end_byte = node.start_byte, node.end_byte
+        (start_line, start_col), end_line = node.start_point, node.end_point[0]
+        chunk_id = f"{repo_name}_{file_path}_{start_line}:{start_col}"
+        span = (start_byte, end_byte, start_line, end_line, chunk_id)
+
+        while stack and stack[-1][0][1] <= start_byte:
+            stack.pop()
+        parent = stack[-1][1] if stack else None
 
+        chunk = {
+            "chunk_id": chunk_id,
+            "repo_name": repo_name,
+            "file_path": file_path,
+            "content": None,
+            "start_line": start_line,
+            "end_line": end_line,
+            "language": language,
+            "type": "function",
+            "parent_id": parent["chunk_id"] if parent else None,
+            "children": [],
+        }
+        functions.append(chunk)
+        nested[chunk_id] = (node, span, [])
+
+        if parent is None:
             used_line_ranges.append((start_line, end_line))
+        else:
+            nested[parent["chunk_id"]][2].append(span)
+        stack.append((span, chunk))
+
+    for chunk in functions:
+        node, span, child_spans = nested[chunk["chunk_id"]]
+        pieces, length, pos = [], 0, span[0]
+
+        # Direct children are disjoint and in source order
+        for child_start, child_end, child_start_line, child_end_line, child_id in child_spans:
+            before = src[pos:child_start].decode("utf8", errors="ignore")
+            # Only the child's first line is needed for its placeholder
+            first_line_end = src.find(b"\n", child_start, child_end)
+            child_text = src[child_start:child_end if first_line_end < 0 else first_line_end]
+            placeholder = placeholder_for(child_text.decode("utf8", errors="ignore"))
+
+            pieces.append(before)
+            length += len(before)
+            chunk["children"].append({
+                "chunk_id": child_id,
+                "start_line": child_start_line,
+                "end_line": child_end_line,
+                "offset": length,
+                "length": len(placeholder),
+            })
+            pieces.append(placeholder)
+            length += len(placeholder)
+            pos = child_end
+
+        pieces.append(src[pos:span[1]].decode("utf8", errors="ignore"))
+        chunk["content"] = "".join(pieces)
+
+    tokenizer = tokenizer or approx_token_count
+    parts = []
+    for chunk in functions:
+        # Every token is at least one character, so short chunks fit as is
+        if len(chunk["content"]) > max_tokens and tokenizer(chunk["content"]) > max_tokens:
+            node = nested[chunk["chunk_id"]][0]
+            parts.extend(split_function_chunk(chunk, statement_rows(node), max_tokens, tokenizer))
+
+    return functions + parts, used_line_ranges, statement_rows(root)
 
-        for child in node.children:
-            visit(child)
 
-    visit(root)
-    return functions, used_line_ranges
+def expand_chunk_content(chunk, chunks_by_id):
+    """
+    Rebuild a function chunk's full source by splicing its children's
+    (recursively expanded) content back over their placeholders.
+    """
+    content = chunk.get("content") or ""
+    # Splice from the end so earlier offsets stay valid
+    for child in sorted(chunk.get("children") or [], key=lambda c: c["offset"], reverse=True):
+        child_chunk = chunks_by_id.get(child["chunk_id"])
+        if child_chunk is None:
+            continue
+        child_content = expand_chunk_content(child_chunk, chunks_by_id)
+        start = child["offset"]
+        content = content[:start] + child_content + content[start + child["length"]:]
+    return content
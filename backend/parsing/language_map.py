@@ -1,10 +1,11 @@
 # parsing/language_map.py
+import os
 
 LANGUAGE_BY_EXTENSION = {
     ".js": "javascript",
     ".jsx": "javascript",
     ".ts": "typescript",
-    ".tsx": "typescript",
+    ".tsx": "tsx",
     ".py": "python",
     ".java": "java",
     ".kt": "kotlin",
@@ -17,5 +18,43 @@ LANGUAGE_BY_EXTENSION = {
     ".c": "c",
     ".h": "c",
     ".cpp": "cpp",
+    ".cc": "cpp",
     ".hpp": "cpp",
+    ".rs": "rust",
 }
+
+# Names shown with query results (and matched by the language search
+# filter), by extension
+DISPLAY_LANGUAGE_BY_EXTENSION = {
+    ".py": "python",
+    ".js": "javascript",
+    ".jsx": "jsx",
+    ".ts": "typescript",
+    ".tsx": "tsx",
+    ".java": "java",
+    ".cpp": "cpp",
+    ".c": "c",
+    ".h": "c",
+    ".hpp": "cpp",
+    ".cs": "csharp",
+    ".go": "go",
+    ".rs": "rust",
+    ".rb": "ruby",
+    ".php": "php",
+    ".html": "html",
+    ".css": "css",
+    ".scss": "scss",
+    ".json": "json",
+    ".yaml": "yaml",
+    ".yml": "yaml",
+    ".md": "markdown",
+    ".sql": "sql",
+    ".sh": "bash",
+    ".bash": "bash",
+    ".xml": "xml",
+}
+
+
+def display_language(file_path):
+    ext = os.path.splitext(file_path)[1].lower()
+    return DISPLAY_LANGUAGE_BY_EXTENSION.get(ext, "plaintext")
@@ -4,6 +4,7 @@ FUNCTION_NODE_TYPES = {
     "python": ["function_definition"],
     "javascript": ["function_declaration", "function", "arrow_function", "method_definition"],
     "typescript": ["function_declaration", "function", "arrow_function", "method_definition"],
+    "tsx": ["function_declaration", "function", "arrow_function", "method_definition"],
     "java": ["method_declaration", "constructor_declaration"],
     "kotlin": ["function_declaration"],
     "swift": ["function_declaration"],
@@ -12,5 +13,6 @@ FUNCTION_NODE_TYPES = {
     "php": ["function_definition", "method_declaration"],
     "ruby": ["method", "singleton_method"],
     "c": ["function_definition"],
-    "cpp": ["function_definition"]
+    "cpp": ["function_definition"],
+    "rust": ["function_item"]
 }
@@ -1,12 +1,129 @@
+"""
+Single registry for tree-sitter grammars and parsers.
+
+Grammars are loaded on first use, once per process. A tree-sitter Parser
+must not be shared by concurrent threads, so every thread (and every
+parse-pool worker process) gets its own parser per language.
+
+parse() also records per-language parse counts, bytes and time into the
+dict installed by record_parse_stats() on the calling thread, if any.
+"""
+import time
+import threading
+from contextlib import contextmanager
+
 from tree_sitter import Parser
-from tree_sitter_languages import get_language
 
-PARSERS = {}
+from .language_map import LANGUAGE_BY_EXTENSION
+
+_languages = {}
+_languages_lock = threading.Lock()
+
+# (language, capture name, node types) -> compiled Query, or None if the
+# grammar has none of the node types. Queries are immutable, so one
+# compiled copy per process is shared by all threads.
+_queries = {}
+
+# Per-thread state: parsers by language, and the active stats dict
+_local = threading.local()
+
+
+def get_language(language_name):
+    language = _languages.get(language_name)
+    if language is None:
+        with _languages_lock:
+            language = _languages.get(language_name)
+            if language is None:
+                # Deferred so importing this module loads no grammar at all
+                from tree_sitter_languages import get_language as load_language
+                language = load_language(language_name)
+                _languages[language_name] = language
+    return language
+
+
+def get_node_query(language_name, node_types, capture="node"):
+    """
+    Compiled query capturing every node of `node_types` as @capture. Types
+    the grammar does not define are left out.
+    """
+    key = (language_name, capture, tuple(node_types))
+    if key not in _queries:
+        language = get_language(language_name)
+        valid = []
+        for node_type in node_types:
+            try:
+                language.query(f"({node_type}) @{capture}")
+                valid.append(node_type)
+            except NameError:
+                pass
+        query = None
+        if valid:
+            query = language.query("[" + " ".join(f"({t})" for t in valid) + f"] @{capture}")
+        with _languages_lock:
+            _queries[key] = query
+    return _queries[key]
+
 
 def get_parser(language_name):
-    if language_name not in PARSERS:
-        lang = get_language(language_name)
+    """The calling thread's parser for `language_name`."""
+    parsers = getattr(_local, "parsers", None)
+    if parsers is None:
+        parsers = _local.parsers = {}
+
+    parser = parsers.get(language_name)
+    if parser is None:
         parser = Parser()
-        parser.set_language(lang)
-        PARSERS[language_name] = parser
-    return PARSERS[language_name]
+        parser.set_language(get_language(language_name))
+        parsers[language_name] = parser
+    return parser
+
+
+def get_parser_for_ext(ext):
+    """Parser for a file extension, or None if the extension isn't parsed."""
+    language_name = LANGUAGE_BY_EXTENSION.get(ext.lower())
+    if not language_name:
+        return None
+    try:
+        return get_parser(language_name)
+    except Exception as e:
+        print(f"[!] Failed to load parser for {language_name}: {e}")
+        return None
+
+
+def parse(language_name, src):
+    """Parse `src` (bytes) with the thread's parser, recording parse stats."""
+    parser = get_parser(language_name)
+    start = time.perf_counter()
+    tree = parser.parse(src)
+    elapsed = time.perf_counter() - start
+
+    stats = getattr(_local, "stats", None)
+    if stats is not None:
+        entry = stats.setdefault(language_name, {"files": 0, "bytes": 0, "seconds": 0.0})
+        entry["files"] += 1
+        entry["bytes"] += len(src)
+        entry["seconds"] += elapsed
+    return tree
+
+
+@contextmanager
+def record_parse_stats(stats=None):
+    """
+    Collect {language: {files, bytes, seconds}} for parses made by this
+    thread inside the block.
+    """
+    stats = {} if stats is None else stats
+    previous = getattr(_local, "stats", None)
+    _local.stats = stats
+    try:
+        yield stats
+    finally:
+        _local.stats = previous
+
+
+def merge_parse_stats(into, stats):
+    for language_name, entry in stats.items():
+        total = into.setdefault(language_name, {"files": 0, "bytes": 0, "seconds": 0.0})
+        for key, value in entry.items():
+            total[key] += value
+    return into
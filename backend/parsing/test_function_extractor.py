@@ -0,0 +1,61 @@
+"""
+Tests for hierarchical function chunks: python -m pytest backend/parsing/test_function_extractor.py
+"""
+from backend.parsing.function_extractor import expand_chunk_content, extract_functions
+
+SOURCE = '''class Greeter:
+    def greet(self, name):
+        def shout(text):
+            return text.upper()
+        return shout(name)
+
+
+def main():
+    return Greeter().greet("x")
+'''
+
+
+def test_nested_functions_are_replaced_by_placeholders():
+    functions, used_line_ranges, boundaries = extract_functions(SOURCE, "m.py", "o/r", "python")
+    by_line = {f["start_line"]: f for f in functions}
+    greet, shout, main = by_line[1], by_line[2], by_line[7]
+
+    assert greet["content"] == ("def greet(self, name):\n"
+                                "        def shout(text): ...\n"
+                                "        return shout(name)")
+    (child,) = greet["children"]
+    assert child["chunk_id"] == shout["chunk_id"] and shout["parent_id"] == greet["chunk_id"]
+    assert greet["content"][child["offset"]:child["offset"] + child["length"]] == "def shout(text): ..."
+    assert (child["start_line"], child["end_line"]) == (2, 3)
+    assert main["parent_id"] is None and main["children"] == []
+    # Top-level ranges cover the nested functions
+    assert used_line_ranges == [(1, 4), (7, 8)]
+    assert boundaries == [0, 7]
+
+
+def test_expand_chunk_content_restores_the_source():
+    functions, _, _ = extract_functions(SOURCE, "m.py", "o/r", "python")
+    by_id = {f["chunk_id"]: f for f in functions}
+    greet = next(f for f in functions if f["start_line"] == 1)
+
+    lines = SOURCE.split("\n")
+    assert expand_chunk_content(greet, by_id) == "\n".join(lines[1:5]).lstrip()
+    # Children that can't be found keep their placeholder
+    assert expand_chunk_content(greet, {}) == greet["content"]
+
+
+def test_long_functions_split_into_parts_at_statements():
+    body = "".join(f"    value_{i} = compute({i}, {i + 1}, {i + 2})\n" for i in range(40))
+    source = f"def big():\n{body}    def inner():\n        return 1\n    return inner\n"
+    functions, _, _ = extract_functions(source, "m.py", "o/r", "python", max_tokens=100)
+    big = next(f for f in functions if f["chunk_id"].endswith("_0:0"))
+    parts = [f for f in functions if f.get("parent_id") == big["chunk_id"] and "part" in f]
+
+    assert big["parts"] == [p["chunk_id"] for p in parts] and len(parts) > 1
+    assert "\n".join(p["content"] for p in parts) == big["content"]
+    assert parts[0]["start_line"] == 0 and parts[-1]["end_line"] == big["end_line"]
+    for before, after in zip(parts, parts[1:]):
+        assert after["start_line"] == before["end_line"] + 1
+    # The nested function's placeholder moved into the last part, offset rebased
+    (child,) = parts[-1]["children"]
+    assert parts[-1]["content"][child["offset"]:].startswith("def inner(): ...")
@@ -0,0 +1,37 @@
+"""
+Atomic file writes: data is written to a temp file in the target directory
+and moved into place with os.replace, so readers see either the old file or
+the complete new one - never a half-written artifact.
+"""
+import os
+import tempfile
+from contextlib import contextmanager
+
+
+@contextmanager
+def atomic_path(path):
+    """
+    Yield a temp path next to `path`; once the block succeeds the temp file
+    replaces `path`. For writers that want a filename (e.g. faiss.write_index).
+    """
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f".{os.path.basename(path)}.", suffix=".tmp")
+    os.close(fd)
+    try:
+        yield tmp_path
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+@contextmanager
+def atomic_write(path, mode="w", **kwargs):
+    """open()-like context manager that publishes the file atomically on close."""
+    with atomic_path(path) as tmp_path:
+        with open(tmp_path, mode, **kwargs) as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
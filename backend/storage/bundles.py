@@ -0,0 +1,315 @@
+"""
+Versioned per-repo artifact bundles: data/bundles/{owner}/{name}/
+
+    CURRENT              name of the published version, e.g. "v3"
+    v3/manifest.json     embedding model, dimension, metric, index type and
+                         search parameters, commit SHA, chunk/vector
+                         counts and a sha256 per file
+    v3/chunks.store      chunk store: locations and metadata, bodies by
+                         reference into the shared content store
+    v3/index.faiss       FAISS index over vector ids
+    v3/vectors.npy       (vector id, chunk store row) pairs, by vector id
+    v3/embeddings.npy    (vector id, float32 vector) pairs, by vector id;
+                         kept only when the index quantizes them (rebuilds)
+    v3/state.json        per-file hashes and vector ids (incremental updates)
+    v3/lexical.idx       BM25 inverted index over chunk store rows
+
+A version is written into a staging directory, renamed to v{N} and then
+published by atomically replacing CURRENT, so readers only ever see
+complete versions. The newest KEEP_VERSIONS versions are kept on disk for
+readers that still hold an older one open.
+
+Writers must hold the repo's lock (backend/storage/locks.py).
+"""
+import os
+import re
+import glob
+import json
+import time
+import shutil
+import hashlib
+import tempfile
+
+import numpy as np
+
+from backend.storage.atomic import atomic_write
+
+BUNDLES_PATH = os.getenv("BUNDLES_PATH", "data/bundles")
+KEEP_VERSIONS = 2
+
+CURRENT_FILE = "CURRENT"
+MANIFEST_FILE = "manifest.json"
+CHUNKS_FILE = "chunks.store"
+INDEX_FILE = "index.faiss"
+VECTORS_FILE = "vectors.npy"
+EMBEDDINGS_FILE = "embeddings.npy"
+STATE_FILE = "state.json"
+LEXICAL_FILE = "lexical.idx"
+
+VECTOR_ROW_DTYPE = np.dtype([("vector_id", "<i8"), ("row", "<u4"), ("pad", "<u4")])
+
+_VERSION_RE = re.compile(r"^v(\d+)$")
+
+
+def repo_dir(repo_key, base_path=BUNDLES_PATH):
+    return os.path.join(base_path, *repo_key.split("/"))
+
+
+def list_versions(repo_key, base_path=BUNDLES_PATH):
+    """Version numbers present on disk, oldest first."""
+    try:
+        names = os.listdir(repo_dir(repo_key, base_path))
+    except FileNotFoundError:
+        return []
+    return sorted(int(m.group(1)) for m in map(_VERSION_RE.match, names) if m)
+
+
+def current_version(repo_key, base_path=BUNDLES_PATH):
+    """Published version number, or None if the repo has no bundle."""
+    if "/" not in repo_key:
+        return None
+    try:
+        with open(os.path.join(repo_dir(repo_key, base_path), CURRENT_FILE), "r") as f:
+            match = _VERSION_RE.match(f.read().strip())
+    except FileNotFoundError:
+        return None
+    return int(match.group(1)) if match else None
+
+
+def version_dir(repo_key, version, base_path=BUNDLES_PATH):
+    return os.path.join(repo_dir(repo_key, base_path), f"v{version}")
+
+
+def list_repo_keys(base_path=BUNDLES_PATH):
+    """Keys of every repo with a published bundle."""
+    keys = []
+    for pointer in sorted(glob.glob(os.path.join(base_path, "*", "*", CURRENT_FILE))):
+        name_dir = os.path.dirname(pointer)
+        keys.append(f"{os.path.basename(os.path.dirname(name_dir))}/{os.path.basename(name_dir)}")
+    return keys
+
+
+def resolve_repo_key(repo_name, base_path=BUNDLES_PATH):
+    """
+    Map a bare repo name to its "owner/name" key when exactly one owner has
+    it indexed. Anything else (full keys, ambiguous or unknown names) is
+    returned unchanged.
+    """
+    if "/" in repo_name:
+        return repo_name
+    matches = [key for key in list_repo_keys(base_path) if key.split("/", 1)[1] == repo_name]
+    return matches[0] if len(matches) == 1 else repo_name
+
+
+def file_sha256(path, block_size=1024 * 1024):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def publish_bundle(repo_key, write, manifest, base_path=BUNDLES_PATH):
+    """
+    Create and publish the repo's next version. `write(directory)` writes
+    the bundle files; the manifest gets their sizes and checksums. Returns
+    the new version number.
+    """
+    root = repo_dir(repo_key, base_path)
+    os.makedirs(root, exist_ok=True)
+    version = max(list_versions(repo_key, base_path), default=0) + 1
+
+    staging = tempfile.mkdtemp(prefix=".staging-", dir=root)
+    try:
+        write(staging)
+        files = {}
+        for name in sorted(os.listdir(staging)):
+            path = os.path.join(staging, name)
+            files[name] = {"bytes": os.path.getsize(path), "sha256": file_sha256(path)}
+
+        manifest = dict(manifest, repo=repo_key, version=version, created_at=time.time(), files=files)
+        with atomic_write(os.path.join(staging, MANIFEST_FILE), "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2)
+
+        os.rename(staging, version_dir(repo_key, version, base_path))
+    except BaseException:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+
+    with atomic_write(os.path.join(root, CURRENT_FILE), "w") as f:
+        f.write(f"v{version}\n")
+
+    prune_versions(repo_key, base_path)
+    print(f"[+] Published bundle {repo_key} v{version}")
+    return version
+
+
+def prune_versions(repo_key, base_path=BUNDLES_PATH, keep=KEEP_VERSIONS):
+    current = current_version(repo_key, base_path)
+    for version in list_versions(repo_key, base_path)[:-keep]:
+        if version != current:
+            shutil.rmtree(version_dir(repo_key, version, base_path), ignore_errors=True)
+
+
+def verify_bundle(repo_key, version=None, base_path=BUNDLES_PATH):
+    """Names of the bundle files whose checksum does not match the manifest."""
+    bundle = open_bundle(repo_key, version, base_path)
+    if bundle is None:
+        raise FileNotFoundError(f"No bundle for '{repo_key}'")
+    return [name for name, entry in bundle.manifest["files"].items()
+            if not os.path.exists(bundle.file(name)) or file_sha256(bundle.file(name)) != entry["sha256"]]
+
+
+def write_repo_bundle(repo_key, chunks, index, vector_chunk_ids, state, model, metric,
+                      base_path=BUNDLES_PATH, embeddings=None):
+    """
+    Publish a full set of repo artifacts as a new bundle version.
+
+    chunks           - every chunk of the repo, with content
+    index            - FAISS index over vector ids
+    vector_chunk_ids - vector id -> chunk_id of the chunk it embeds
+    state            - ingest state (see backend/ingestion/incremental.py)
+    metric           - "l2", "cosine" or "ip" (see index_factory.py); the
+                       query path normalizes and scores accordingly
+    embeddings       - optional full-precision (ids, vectors) of the index,
+                       saved if the index quantizes them
+    """
+    import faiss
+    from backend.chunking.chunk_store import write_chunk_store
+    from backend.vector_store.index_factory import index_spec, keeps_full_vectors
+    from backend.vector_store.lexical_index import write_lexical_index
+
+    lexical = {}
+
+    def write(directory):
+        rows = write_chunk_store(os.path.join(directory, CHUNKS_FILE), repo_key, chunks)
+        indexed, terms = write_lexical_index(os.path.join(directory, LEXICAL_FILE), chunks, rows, len(chunks))
+        lexical.update(indexed=indexed, terms=terms)
+        row_of = {chunk["chunk_id"]: row for chunk, row in zip(chunks, rows)}
+
+        pairs = np.zeros(len(vector_chunk_ids), dtype=VECTOR_ROW_DTYPE)
+        for i, (vector_id, chunk_id) in enumerate(vector_chunk_ids.items()):
+            pairs[i] = (vector_id, row_of[chunk_id], 0)
+        pairs.sort(order="vector_id")
+        np.save(os.path.join(directory, VECTORS_FILE), pairs)
+
+        if embeddings is not None and keeps_full_vectors(index):
+            ids, vectors = embeddings
+            full = np.zeros(len(vectors), dtype=[("vector_id", "<i8"), ("vector", "<f4", (index.d,))])
+            full["vector_id"] = np.asarray(ids, dtype="int64")
+            full["vector"] = np.reshape(vectors, (len(vectors), index.d))
+            full.sort(order="vector_id")
+            np.save(os.path.join(directory, EMBEDDINGS_FILE), full)
+
+        faiss.write_index(index, os.path.join(directory, INDEX_FILE))
+        with open(os.path.join(directory, STATE_FILE), "w", encoding="utf-8") as f:
+            json.dump(state, f)
+
+    manifest = {
+        "embedding_model": model,
+        "dimension": int(index.d),
+        "metric": metric,
+        # Index type and search-time knobs (efSearch / nprobe)
+        "index": index_spec(index),
+        "commit_sha": state.get("commit_sha"),
+        "chunk_count": len(chunks),
+        "vector_count": int(index.ntotal),
+        # Chunks and distinct terms in the lexical index
+        "lexical": lexical,
+    }
+    return publish_bundle(repo_key, write, manifest, base_path)
+
+
+class Bundle:
+    """
+    Read-only view of one published version. Files are opened on first use;
+    the chunk store and the vector table are memory-mapped.
+    """
+
+    def __init__(self, repo_key, version, path):
+        self.repo_key = repo_key
+        self.version = version
+        self.path = path
+        with open(self.file(MANIFEST_FILE), "r", encoding="utf-8") as f:
+            self.manifest = json.load(f)
+        self._store = None
+        self._vectors = None
+        self._lexical = None
+
+    def file(self, name):
+        return os.path.join(self.path, name)
+
+    @property
+    def store(self):
+        if self._store is None:
+            from backend.chunking.chunk_store import ChunkStore
+            self._store = ChunkStore(self.file(CHUNKS_FILE))
+        return self._store
+
+    @property
+    def vectors(self):
+        if self._vectors is None:
+            self._vectors = np.load(self.file(VECTORS_FILE), mmap_mode="r")
+        return self._vectors
+
+    @property
+    def lexical(self):
+        """The bundle's LexicalIndex; FileNotFoundError for bundles without one."""
+        if self._lexical is None:
+            from backend.vector_store.lexical_index import LexicalIndex
+            self._lexical = LexicalIndex(self.file(LEXICAL_FILE))
+        return self._lexical
+
+    def read_index(self, io_flags=0):
+        import faiss
+        return faiss.read_index(self.file(INDEX_FILE), io_flags)
+
+    def read_embeddings(self):
+        """
+        Full-precision (ids, vectors) of the index, or None if the bundle
+        doesn't keep them (unquantized index, or written before they were).
+        """
+        try:
+            full = np.load(self.file(EMBEDDINGS_FILE))
+        except FileNotFoundError:
+            return None
+        return full["vector_id"], full["vector"]
+
+    def read_state(self):
+        with open(self.file(STATE_FILE), "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def chunk_for_vector(self, vector_id, with_content=False):
+        """The chunk embedded as `vector_id`, or None."""
+        ids = self.vectors["vector_id"]
+        i = int(np.searchsorted(ids, vector_id))
+        if i >= len(ids) or ids[i] != vector_id:
+            return None
+        return self.store.chunk(int(self.vectors["row"][i]), with_content=with_content)
+
+    def vector_chunk_ids(self):
+        """vector id -> chunk_id for every vector in the index."""
+        return {int(vector_id): self.store.chunk(int(row), with_content=False)["chunk_id"]
+                for vector_id, row in zip(self.vectors["vector_id"], self.vectors["row"])}
+
+    def __len__(self):
+        return len(self.vectors)
+
+    def close(self):
+        if self._store is not None:
+            self._store.close()
+        if self._lexical is not None:
+            self._lexical.close()
+        self._store = self._vectors = self._lexical = None
+
+
+def open_bundle(repo_key, version=None, base_path=BUNDLES_PATH):
+    """Open the published (or a given) version of a repo's bundle, or None."""
+    if version is None:
+        version = current_version(repo_key, base_path)
+    if version is None:
+        return None
+    path = version_dir(repo_key, version, base_path)
+    if not os.path.exists(os.path.join(path, MANIFEST_FILE)):
+        return None
+    return Bundle(repo_key, version, path)
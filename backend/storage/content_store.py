@@ -0,0 +1,138 @@
+"""
+Content-addressed store shared by all repositories.
+
+Identical chunks (forks, vendored libraries, copied files) are stored and
+embedded once:
+  bodies  - chunk text keyed by the sha256 of the exact text
+  vectors - embeddings keyed by the sha256 of the normalized text and the
+            embedding model
+
+Per-repo chunk stores (backend/chunking/chunk_store.py) keep only a
+`body_hash` reference plus the chunk's location (see chunk_refs /
+hydrate_chunks). The store is a
+single SQLite file, so concurrent ingest workers and processes can share it.
+"""
+import os
+import hashlib
+import sqlite3
+import threading
+
+import numpy as np
+
+STORE_PATH = os.getenv("CONTENT_STORE_PATH", "data/shared/content_store.db")
+
+# SQLite caps bound parameters per statement
+_QUERY_CHUNK = 500
+
+_local = threading.local()
+
+
+def _connect(path=None):
+    path = path or STORE_PATH
+    conns = getattr(_local, "conns", None)
+    if conns is None:
+        conns = _local.conns = {}
+    conn = conns.get(path)
+    if conn is None:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        conn = sqlite3.connect(path, timeout=60)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("CREATE TABLE IF NOT EXISTS bodies (hash TEXT PRIMARY KEY, content TEXT NOT NULL)")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS vectors ("
+            "hash TEXT NOT NULL, model TEXT NOT NULL, vector BLOB NOT NULL, "
+            "PRIMARY KEY (hash, model))"
+        )
+        conn.commit()
+        conns[path] = conn
+    return conn
+
+
+def normalize_content(text):
+    """Line endings and trailing whitespace don't change what a chunk means."""
+    lines = text.replace("\r\n", "\n").replace("\r", "\n").split("\n")
+    return "\n".join(line.rstrip() for line in lines).strip("\n")
+
+
+def body_hash(text):
+    return hashlib.sha256(text.encode("utf-8", errors="surrogatepass")).hexdigest()
+
+
+def vector_hash(text):
+    return body_hash(normalize_content(text))
+
+
+def _select(conn, sql, keys, *params):
+    keys = list(keys)
+    for i in range(0, len(keys), _QUERY_CHUNK):
+        part = keys[i:i + _QUERY_CHUNK]
+        marks = ",".join("?" * len(part))
+        yield from conn.execute(sql.format(marks=marks), (*params, *part))
+
+
+def put_bodies(bodies, path=None):
+    """Store {body_hash: content}; existing bodies are left alone."""
+    if not bodies:
+        return
+    conn = _connect(path)
+    with conn:
+        conn.executemany("INSERT OR IGNORE INTO bodies (hash, content) VALUES (?, ?)", bodies.items())
+
+
+def get_bodies(hashes, path=None):
+    """{body_hash: content} for the hashes present in the store."""
+    conn = _connect(path)
+    return dict(_select(conn, "SELECT hash, content FROM bodies WHERE hash IN ({marks})", set(hashes)))
+
+
+def put_vectors(vectors, model, path=None):
+    """Store {vector_hash: embedding} for `model`."""
+    if not vectors:
+        return
+    conn = _connect(path)
+    rows = [(h, model, np.asarray(v, dtype="float32").tobytes()) for h, v in vectors.items()]
+    with conn:
+        conn.executemany("INSERT OR IGNORE INTO vectors (hash, model, vector) VALUES (?, ?, ?)", rows)
+
+
+def get_vectors(hashes, model, path=None):
+    """{vector_hash: float32 array} for the hashes already embedded with `model`."""
+    conn = _connect(path)
+    rows = _select(conn, "SELECT hash, vector FROM vectors WHERE model = ? AND hash IN ({marks})",
+                   set(hashes), model)
+    return {h: np.frombuffer(blob, dtype="float32") for h, blob in rows}
+
+
+def chunk_refs(chunks, path=None):
+    """
+    Move chunk bodies into the store and return copies of the chunks that
+    hold a `body_hash` reference instead of `content`. Chunks that are
+    already references pass through unchanged.
+    """
+    bodies, refs = {}, []
+    for chunk in chunks:
+        if "content" not in chunk:
+            refs.append(chunk)
+            continue
+        ref = dict(chunk)
+        content = ref.pop("content") or ""
+        ref["body_hash"] = body_hash(content)
+        bodies[ref["body_hash"]] = content
+        refs.append(ref)
+    put_bodies(bodies, path)
+    return refs
+
+
+def hydrate_chunks(chunks, path=None):
+    """Copies of reference chunks with `content` filled in from the store."""
+    bodies = get_bodies((c["body_hash"] for c in chunks if "body_hash" in c), path)
+    hydrated = []
+    for chunk in chunks:
+        if "content" in chunk or "body_hash" not in chunk:
+            hydrated.append(chunk)
+            continue
+        chunk = dict(chunk)
+        chunk["content"] = bodies.get(chunk["body_hash"], "")
+        hydrated.append(chunk)
+    return hydrated
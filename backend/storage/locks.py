@@ -0,0 +1,23 @@
+"""
+Cross-process per-repo locks, backed by lock files in the data directory so
+that every worker process of the API (and ad-hoc scripts) agree on who is
+ingesting a repository.
+"""
+import os
+from filelock import FileLock
+
+LOCK_DIR = "data/locks"
+
+# An ingest can legitimately run for a long time; waiters give up after this
+LOCK_TIMEOUT_SECONDS = int(os.getenv("INGEST_LOCK_TIMEOUT", 6 * 3600))
+
+
+def repo_lock(repo_name, lock_dir=LOCK_DIR, timeout=LOCK_TIMEOUT_SECONDS):
+    """
+    Lock guarding every write to a repo's clone and artifacts. Use as a
+    context manager; blocks until the lock is free (or timeout).
+    """
+    os.makedirs(lock_dir, exist_ok=True)
+    # "owner/name" keys map to one flat lock file per repo
+    lock_name = repo_name.replace("/", "__")
+    return FileLock(os.path.join(lock_dir, f"{lock_name}.lock"), timeout=timeout)
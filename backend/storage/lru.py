@@ -0,0 +1,86 @@
+"""
+Thread-safe LRU cache bounded by total size in bytes, not entry count.
+"""
+import threading
+from collections import OrderedDict
+
+
+class ByteLRU:
+    def __init__(self, max_bytes, on_evict=None):
+        self.max_bytes = max_bytes
+        # Called with (key, value) for every entry that leaves the cache
+        self.on_evict = on_evict
+        self._entries = OrderedDict()  # key -> (value, size)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value, size):
+        """
+        Insert (or replace) an entry and evict least recently used ones until
+        the cache fits. An entry larger than the whole budget is not kept.
+        """
+        dropped = []
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+                dropped.append((key, old[0]))
+            if size <= self.max_bytes:
+                self._entries[key] = (value, size)
+                self._bytes += size
+            while self._bytes > self.max_bytes:
+                evicted_key, (evicted, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self.evictions += 1
+                dropped.append((evicted_key, evicted))
+        self._dropped(dropped)
+        return value
+
+    def invalidate(self, predicate):
+        """Drop every entry whose key matches predicate(key)."""
+        dropped = []
+        with self._lock:
+            for key in [k for k in self._entries if predicate(k)]:
+                value, size = self._entries.pop(key)
+                self._bytes -= size
+                self.invalidations += 1
+                dropped.append((key, value))
+        self._dropped(dropped)
+        return len(dropped)
+
+    def clear(self):
+        return self.invalidate(lambda key: True)
+
+    def _dropped(self, dropped):
+        # Outside the lock: callbacks may be slow (closing files, freeing memory)
+        if self.on_evict:
+            for key, value in dropped:
+                self.on_evict(key, value)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
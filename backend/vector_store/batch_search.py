@@ -0,0 +1,102 @@
+"""
+Many queries in one call.
+
+Queries are embedded in batched requests, then grouped by repo and filter
+set: each group is one index.search over the matrix of its query vectors,
+with the groups of different repos running on the federated search pool.
+A query over several repos merges its per-repo hits by cosine distance, as
+federated_search does.
+
+Failures are per query: a query that cannot be embedded, or whose repo is
+missing or incompatible, gets an error while the others are answered.
+"""
+import os
+
+from .federated_search import check_dimension, comparable_hits, merge_hits, pool
+from .index_registry import get_resident
+from .search_filters import rules_key
+
+QUERY_BATCH_MAX = int(os.getenv("QUERY_BATCH_MAX", 1000))
+
+
+def _search_repo_groups(repo_name, groups, queries, vectors, load_path):
+    """{query position: hits} for every query on one repo."""
+    from .faiss_store import search_resident_batch
+
+    resident = get_resident(repo_name, load_path)
+    check_dimension(resident, vectors[groups[0][1][0]])
+
+    results = {}
+    for filters, positions in groups:
+        k = max(queries[p]["top_k"] for p in positions)
+        hit_lists = search_resident_batch(resident, [vectors[p] for p in positions], k, filters)
+        for p, hits in zip(positions, hit_lists):
+            hits = hits[:queries[p]["top_k"]]
+            if len(queries[p]["repos"]) > 1:
+                hits = comparable_hits(resident, hits, vectors[p])
+            for hit in hits:
+                hit["repo_name"] = resident.repo_name
+            results[p] = hits
+    return results
+
+
+def batch_search(queries, load_path="vector_store"):
+    """
+    Answer `queries`, [{"query", "repos", "top_k", "filters"}] with repos
+    as resolved keys. Returns one {"hits", "error", "errors"} per query, in
+    order: `error` is set when the query got no answer at all, `errors`
+    maps repos of a multi-repo query that could not be searched.
+    """
+    from .faiss_store import get_gemini_embeddings
+
+    if len(queries) > QUERY_BATCH_MAX:
+        raise ValueError(f"{len(queries)} queries, at most {QUERY_BATCH_MAX} per batch")
+
+    out = [{"hits": [], "error": None, "errors": {}} for _ in queries]
+
+    # Empty texts would fail the whole embedding request
+    pending = [p for p, q in enumerate(queries) if q["query"].strip() and q["repos"]]
+    for p, q in enumerate(queries):
+        if not q["query"].strip():
+            out[p]["error"] = "empty query"
+        elif not q["repos"]:
+            out[p]["error"] = "no repositories matched"
+
+    vectors = dict(zip(pending, get_gemini_embeddings([queries[p]["query"] for p in pending])))
+    for p in pending:
+        if vectors[p] is None:
+            out[p]["error"] = "could not embed the query"
+    pending = [p for p in pending if vectors[p] is not None]
+
+    # repo -> filter set -> (filters, query positions)
+    by_repo = {}
+    for p in pending:
+        filters = queries[p].get("filters") or None
+        for repo in queries[p]["repos"]:
+            groups = by_repo.setdefault(repo, {})
+            groups.setdefault(rules_key(filters or {}), (filters, []))[1].append(p)
+
+    futures = {repo: pool().submit(_search_repo_groups, repo, list(groups.values()), queries, vectors, load_path)
+               for repo, groups in by_repo.items()}
+
+    for repo, future in futures.items():
+        try:
+            for p, hits in future.result().items():
+                out[p]["hits"].extend(hits)
+        except Exception as e:
+            reason = "not indexed" if isinstance(e, FileNotFoundError) else str(e)
+            if not isinstance(e, FileNotFoundError):
+                print(f"[!] Batch search skipped {repo}: {e}")
+            for _, positions in by_repo[repo].values():
+                for p in positions:
+                    out[p]["errors"][repo] = reason
+
+    for p in pending:
+        result = out[p]
+        result["hits"] = merge_hits(result["hits"], queries[p]["top_k"])
+        if len(result["errors"]) == len(queries[p]["repos"]):
+            result["error"] = "; ".join(f"{repo}: {reason}" for repo, reason in result["errors"].items())
+
+    print(f"[+] Answered {sum(r['error'] is None for r in out)}/{len(queries)} queries "
+          f"over {len(by_repo)} repos")
+    return out
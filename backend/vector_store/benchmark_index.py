@@ -0,0 +1,124 @@
+"""
+Benchmark of the FAISS index types in index_factory.py.
+
+Builds every index type in every vector storage (float32, fp16, sq8) over
+the same vectors and metric and reports, against the exact float32 flat
+index as ground truth:
+  build    - build (and training) time
+  MB       - serialized index size, i.e. roughly its memory
+  ms/query - median single-query latency
+  recall@k - share of the true k nearest neighbours returned
+
+Vectors are a repo's own (--repo owner/name, flat or HNSW bundles) or
+synthetic clustered data. Queries are perturbed corpus vectors.
+
+    python -m backend.vector_store.benchmark_index [--vectors 200000] [--dim 256]
+    python -m backend.vector_store.benchmark_index --repo owner/name
+    python -m backend.vector_store.benchmark_index --types flat hnsw --storages float32 sq8 --metric l2
+"""
+import time
+import argparse
+
+import faiss
+import numpy as np
+
+from .index_factory import (
+    INDEX_METRIC,
+    INDEX_TYPES,
+    METRICS,
+    STORAGES,
+    all_vectors,
+    build_index,
+    choose_index_type,
+    index_spec,
+    new_index,
+    prepare_vectors,
+)
+
+
+def synthetic_vectors(n, dim, clusters=256, seed=0):
+    """Gaussian clusters: closer to real embeddings than uniform noise."""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dim)).astype("float32")
+    labels = rng.integers(0, clusters, n)
+    return centers[labels] + 0.35 * rng.normal(size=(n, dim)).astype("float32")
+
+
+def repo_vectors(repo_key):
+    from backend.storage.bundles import open_bundle
+    bundle = open_bundle(repo_key)
+    if bundle is None:
+        raise SystemExit(f"No bundle for '{repo_key}'")
+    _, vectors = all_vectors(bundle.read_index())
+    return vectors
+
+
+def make_queries(vectors, n_queries, seed=1):
+    rng = np.random.default_rng(seed)
+    picked = vectors[rng.choice(len(vectors), n_queries, replace=False)]
+    scale = 0.05 * float(np.abs(vectors).mean())
+    return (picked + scale * rng.normal(size=picked.shape)).astype("float32")
+
+
+def recall_at_k(found, truth):
+    k = truth.shape[1]
+    return float(np.mean([len(set(f) & set(t)) / k for f, t in zip(found, truth)]))
+
+
+def bench_type(index_type, vectors, queries, truth, k, metric=INDEX_METRIC, storage="float32"):
+    ids = np.arange(len(vectors), dtype="int64")
+    start = time.perf_counter()
+    index = build_index(vectors, ids, index_type, metric=metric, storage=storage)
+    build = time.perf_counter() - start
+
+    latencies, found = [], []
+    for q in prepare_vectors(queries, metric):
+        start = time.perf_counter()
+        _, I = index.search(q.reshape(1, -1), k)
+        latencies.append(time.perf_counter() - start)
+        found.append(I[0])
+
+    return {
+        "build": build,
+        "mb": len(faiss.serialize_index(index)) / 1e6,
+        "ms": float(np.median(latencies)) * 1000,
+        "recall": recall_at_k(np.array(found), truth),
+        "spec": index_spec(index),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repo", help="benchmark a repo's own vectors (owner/name)")
+    parser.add_argument("--vectors", type=int, default=200_000)
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--types", nargs="*", default=list(INDEX_TYPES))
+    parser.add_argument("--storages", nargs="*", default=list(STORAGES))
+    parser.add_argument("--metric", choices=list(METRICS), default=INDEX_METRIC)
+    args = parser.parse_args(argv)
+
+    vectors = repo_vectors(args.repo) if args.repo else synthetic_vectors(args.vectors, args.dim)
+    n, dim = vectors.shape
+    queries = make_queries(vectors, min(args.queries, n))
+
+    exact = new_index(dim, args.metric)
+    exact.add_with_ids(prepare_vectors(vectors, args.metric), np.arange(n, dtype="int64"))
+    _, truth = exact.search(prepare_vectors(queries, args.metric), args.k)
+
+    print(f"[*] {n} vectors, dim {dim}, {len(queries)} queries, metric {args.metric}; "
+          f"auto-selected type: {choose_index_type(n, dim)}")
+    print(f"{'type':<10}{'storage':<9}{'build s':>9}{'MB':>9}{'ms/query':>10}{f'recall@{args.k}':>11}   params")
+    for index_type in args.types:
+        # IVF-PQ stores its own codes whatever the storage
+        storages = ["float32"] if index_type == "ivf_pq" else args.storages
+        for storage in storages:
+            r = bench_type(index_type, vectors, queries, truth, args.k, args.metric, storage)
+            params = {key: v for key, v in r["spec"].items() if key not in ("type", "storage")}
+            print(f"{index_type:<10}{r['spec']['storage']:<9}{r['build']:>9.2f}{r['mb']:>9.1f}"
+                  f"{r['ms']:>10.3f}{r['recall']:>11.3f}   {params}")
+
+
+if __name__ == "__main__":
+    main()
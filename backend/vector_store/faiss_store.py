@@ -2,6 +2,21 @@ import os
 import pickle
 import faiss
 import numpy as np
+from backend.storage.bundles import Bundle, open_bundle, resolve_repo_key
+from backend.vector_store.index_factory import (
+    INDEX_METRIC,
+    all_vectors,
+    build_index,
+    index_metric,
+    index_spec,
+    is_final,
+    new_index,
+    prepare_vectors,
+    supports_removal,
+    to_distances,
+)
+from backend.vector_store.index_registry import get_resident
+from backend.vector_store.search_filters import merge_rules, repo_rules
 import os
 import pickle
 import time
@@ -24,6 +39,9 @@ load_dotenv()
 # Configure the API globally
 genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
 
+# Texts per batched embedding request (the API's limit)
+QUERY_EMBED_BATCH = 100
+
 def get_gemini_embedding(text, task_type="retrieval_query"):
     try:
         # Switching to the stable, generally available model
@@ -45,30 +63,118 @@ def get_gemini_embedding(text, task_type="retrieval_query"):
         print(f"[-] Error embedding chunk with model '{model_name}': {e}")
         return None
 
-def create_faiss_index(repo_name, vectors, metadata, save_path="vector_store"):
-    os.makedirs(save_path, exist_ok=True)
-
+def get_gemini_embeddings(texts, task_type="retrieval_query"):
+    """
+    Embed many texts in batched requests (QUERY_EMBED_BATCH per request).
+    One vector per text, None for the texts of a batch that failed.
+    """
+    model_name = "models/gemini-embedding-001"
+    vectors = []
+    for i in range(0, len(texts), QUERY_EMBED_BATCH):
+        batch = texts[i:i + QUERY_EMBED_BATCH]
+        try:
+            result = genai.embed_content(model=model_name, content=batch, task_type=task_type)
+            vectors.extend(result['embedding'])
+        except Exception as e:
+            print(f"[-] Error embedding texts {i} to {i + len(batch)} with model '{model_name}': {e}")
+            vectors.extend([None] * len(batch))
+    return vectors
+
+def new_faiss_index(dim, metric=INDEX_METRIC):
+    # Explicit vector ids let incremental re-ingests remove and re-add
+    # the vectors of a single file without rebuilding the index.
+    # Vectors added to it must go through prepare_vectors(..., metric).
+    return new_index(dim, metric)
+
+
+def create_faiss_index(vectors, ids=None, index_type=None, metric=INDEX_METRIC):
+    """
+    Build an id-mapped index over `vectors` (ids default to positions). The
+    index type (flat, HNSW, IVF-Flat or IVF-PQ) follows the vector count and
+    memory budget unless given; metric and storage are fixed here for the
+    index's lifetime. See index_factory.py.
+    """
     # Convert vectors → numpy array (float32 required by FAISS)
     vec_array = np.array(vectors).astype("float32")
 
-    dim = vec_array.shape[1]  # embedding dimension
-
-    index = faiss.IndexFlatL2(dim)
-    index.add(vec_array)
+    if ids is None:
+        ids = np.arange(len(vec_array), dtype="int64")
 
-    # Save index
-    faiss.write_index(index, f"{save_path}/{repo_name}_faiss.index")
+    index = build_index(vec_array, ids, index_type, metric=metric)
+    spec = index_spec(index)
+    print(f"[+] Built {spec['type']} index over {index.ntotal} vectors ({metric}) {spec}")
+    return index
 
-    # Save metadata (pickle)
-    with open(f"{save_path}/{repo_name}_metadata.pkl", "wb") as f:
-        pickle.dump(metadata, f)
 
-    print("[+] Saved FAISS index and metadata")
-    print("[+] Total vectors indexed:", index.ntotal)
+def update_faiss_index(index, remove_ids, vectors, ids, metric=None, stored=None):
+    """
+    Patch an ID-mapped index: drop `remove_ids`, then add `vectors` under
+    `ids`. `metric` is the index's recorded metric (inferred if None).
+    Returns the patched index, which is a rebuilt one when the index
+    cannot remove vectors (HNSW) or no longer has the type and storage its
+    size calls for (e.g. a flat index past FLAT_MAX_VECTORS).
+
+    Rebuilds start from `stored`, full-precision (ids, vectors) of what the
+    index holds (see Bundle.read_embeddings), if given; otherwise from the
+    index's decoded vectors, which quantized storage has degraded.
+    """
+    metric = index_metric(index, metric)
+    remove_ids = np.asarray(remove_ids, dtype="int64")
+    vectors = prepare_vectors(np.reshape(vectors, (len(vectors), index.d)), metric)
+    ids = np.asarray(ids, dtype="int64")
+
+    rebuildable = index_spec(index)["type"] in ("flat", "hnsw")
+    n = index.ntotal - len(remove_ids) + len(vectors)
+    if (len(remove_ids) and not supports_removal(index)) or (rebuildable and not is_final(index, n=n)):
+        # Rebuild from the stored vectors (flat and HNSW can decode them)
+        old_ids, old_vectors = stored if stored is not None else all_vectors(index)
+        keep = ~np.isin(old_ids, remove_ids)
+        index = create_faiss_index(np.vstack([old_vectors[keep], vectors]),
+                                   np.concatenate([old_ids[keep], ids]), metric=metric)
+        print(f"[+] Rebuilt FAISS index: -{len(remove_ids)} +{len(vectors)} vectors (total {index.ntotal})")
+        return index
+
+    if len(remove_ids):
+        index.remove_ids(remove_ids)
+
+    if len(vectors):
+        index.add_with_ids(vectors, ids)
+
+    print(f"[+] Patched FAISS index: -{len(remove_ids)} +{len(vectors)} vectors (total {index.ntotal})")
 
     return index
-def load_faiss_index(repo_name, load_path="vector_store"):
-    index = faiss.read_index(f"{load_path}/{repo_name}_faiss.index")
+
+
+def lookup_chunk(metadata, idx):
+    """
+    Resolve a search hit to its chunk: through the repo's bundle, or legacy
+    id-keyed dict / positional list metadata.
+    """
+    if isinstance(metadata, Bundle):
+        return metadata.chunk_for_vector(int(idx))
+    if isinstance(metadata, dict):
+        return metadata.get(int(idx))
+    if 0 <= idx < len(metadata):
+        return metadata[idx]
+    return None
+
+
+def load_faiss_index(repo_name, load_path="vector_store", io_flags=0):
+    """
+    (index, metadata) of a repo, read from disk. For bundled repos the
+    metadata is the Bundle itself, which maps vector ids to chunks without
+    loading content. Queries go through index_registry.get_index instead,
+    which keeps indexes loaded.
+    """
+    bundle = open_bundle(resolve_repo_key(repo_name))
+    if bundle is not None:
+        return bundle.read_index(io_flags), bundle
+
+    # Repos indexed before bundles
+    index_path = f"{load_path}/{repo_name}_faiss.index"
+    if not os.path.exists(index_path):
+        raise FileNotFoundError(index_path)
+    index = faiss.read_index(index_path, io_flags)
 
     with open(f"{load_path}/{repo_name}_metadata.pkl", "rb") as f:
         metadata = pickle.load(f)
@@ -150,9 +256,9 @@ def load_faiss_index(repo_name, load_path="vector_store"):
 
 #     return valid_results
 
-def search_similar(repo_name, query_text, top_k=8, load_path="vector_store"):
-    # Load index (assuming load_faiss_index is defined elsewhere in your file)
-    index, metadata = load_faiss_index(repo_name, load_path)
+def search_similar(repo_name, query_text, top_k=8, load_path="vector_store", filters=None):
+    # Resident index of the repo's current version (loaded on first use)
+    resident = get_resident(repo_name, load_path)
     
     # --- CHANGED: Use Gemini for Query Embedding ---
     query_vec_list = get_gemini_embedding(query_text, task_type="retrieval_query")
@@ -160,47 +266,59 @@ def search_similar(repo_name, query_text, top_k=8, load_path="vector_store"):
     if query_vec_list is None:
         print("Failed to generate query embedding.")
         return []
-
-    # Convert to numpy array for FAISS
-    query_vec = np.array(query_vec_list).astype("float32").reshape(1, -1)
     # -----------------------------------------------
 
-    valid_results = []
-    search_batch = top_k  # how many to fetch per FAISS search
-    offset = 0            # how far into results we are
-
-    # Safety check: Ensure index exists
-    if index is None: 
-        return []
-
-    while len(valid_results) < top_k:
-        distances, indices = index.search(query_vec, search_batch + offset)
-
-        # If no more results available
-        if len(indices[0]) <= offset:
-            break
-
-        for idx, dist in zip(indices[0][offset:], distances[0][offset:]):
-            if idx >= len(metadata):
+    return search_resident(resident, query_vec_list, top_k, filters)
+
+
+def search_resident(resident, query_vec_list, top_k=8, filters=None):
+    """
+    Top-k eligible chunks of a ResidentIndex for an embedded query, closest
+    first: [{"distance", "vector_id", "chunk"}]. `filters` (see
+    search_filters.py) narrow the repo's own rules.
+    """
+    return search_resident_batch(resident, [query_vec_list], top_k, filters)[0]
+
+
+def search_resident_batch(resident, query_vecs, top_k=8, filters=None):
+    """
+    search_resident for many embedded queries with the same filters, as a
+    single index.search over the query matrix. One hit list per query.
+    """
+    index, metadata = resident.index, resident.metadata
+
+    # Convert to numpy array for FAISS, normalized as the index's metric
+    # requires
+    query_mat = prepare_vectors(query_vecs, resident.metric)
+
+    # The repo's eligibility rules (e.g. no chunks under 10 lines) and the
+    # query's filters are a selector over vector ids, so one k-NN call
+    # returns only eligible hits
+    rules = merge_rules(repo_rules(resident.repo_name), filters)
+    search_filter = resident.search_filter(rules)
+    k = min(top_k, search_filter.eligible)
+    if k <= 0:
+        return [[] for _ in query_mat]
+
+    scores, indices = index.search(query_mat, k, params=search_filter.params())
+    # Lower is closer for every metric
+    distances = to_distances(scores, resident.metric)
+
+    results = []
+    for row_ids, row_distances in zip(indices, distances):
+        hits = []
+        for idx, dist in zip(row_ids, row_distances):
+            # -1 pads the row when fewer than k vectors are eligible
+            if idx < 0:
                 continue
-
-            chunk = metadata[idx]
-            start = chunk.get("start_line", 0)
-            end = chunk.get("end_line", 0)
-            line_length = end - start
-
-            # Skip chunks with <10 lines
-            if line_length < 10:
+            chunk = lookup_chunk(metadata, idx)
+            if chunk is None:
                 continue
-
-            valid_results.append({
+            hits.append({
                 "distance": float(dist),
+                "vector_id": int(idx),
                 "chunk": chunk
             })
+        results.append(hits)
 
-            if len(valid_results) == top_k:
-                break
-
-        offset += search_batch  # move deeper for next loop
-
-    return valid_results
\ No newline at end of file
+    return results
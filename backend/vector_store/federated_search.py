@@ -0,0 +1,154 @@
+"""
+One query across many repos.
+
+The query is embedded once, every repo's resident index is searched on a
+shared thread pool (FEDERATED_MAX_WORKERS searches at a time across all
+requests) and the per-repo top-k lists are merged into one top-k.
+
+Merged hits are ranked by cosine distance (1 - cos) so that repos are
+comparable whatever metric their index was built with: cosine indexes
+report it directly, hits of L2 / inner-product indexes are re-scored
+against their stored vectors.
+
+Repo groups are named lists of repo keys or fnmatch patterns over them,
+read from REPO_GROUPS_PATH (reloaded when it changes):
+
+    {"backend": ["acme/api", "acme/auth-*"], "everything": ["*/*"]}
+
+A group can also be given inline as a pattern, e.g. "acme/*".
+"""
+import os
+import json
+import heapq
+import fnmatch
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from backend.storage.bundles import list_repo_keys, resolve_repo_key
+from .index_factory import cosine_distances
+from .index_registry import get_resident
+
+FEDERATED_MAX_WORKERS = int(os.getenv("FEDERATED_MAX_WORKERS", 8))
+FEDERATED_MAX_REPOS = int(os.getenv("FEDERATED_MAX_REPOS", 64))
+REPO_GROUPS_PATH = os.getenv("REPO_GROUPS_PATH", "data/repo_groups.json")
+
+_executor = None
+_executor_lock = threading.Lock()
+
+# (mtime, parsed groups) of REPO_GROUPS_PATH
+_groups = {"mtime": None, "groups": {}}
+
+
+def pool():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=FEDERATED_MAX_WORKERS,
+                                               thread_name_prefix="federated")
+    return _executor
+
+
+def load_groups(path=REPO_GROUPS_PATH):
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return {}
+    if _groups["mtime"] != mtime:
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                groups = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"[!] Ignoring unreadable repo groups {path}: {e}")
+            groups = {}
+        _groups.update(mtime=mtime, groups=groups)
+    return _groups["groups"]
+
+
+def resolve_repos(repos=None, group=None):
+    """
+    Repo keys to search: `repos` (bare names resolved) plus the members of
+    `group`, deduplicated in order. Raises ValueError for an unknown group
+    or more than FEDERATED_MAX_REPOS repos.
+    """
+    keys = [resolve_repo_key(name) for name in repos or []]
+
+    if group:
+        patterns = load_groups().get(group)
+        if patterns is None:
+            if "*" not in group and "?" not in group:
+                raise ValueError(f"Unknown repo group '{group}'")
+            patterns = [group]
+        indexed = list_repo_keys()
+        for pattern in patterns:
+            keys.extend(fnmatch.filter(indexed, pattern) if any(c in pattern for c in "*?[")
+                        else [resolve_repo_key(pattern)])
+
+    keys = list(dict.fromkeys(keys))
+    if len(keys) > FEDERATED_MAX_REPOS:
+        raise ValueError(f"{len(keys)} repos requested, at most {FEDERATED_MAX_REPOS} per query")
+    return keys
+
+
+def check_dimension(resident, query_vec_list):
+    if resident.index.d != len(query_vec_list):
+        raise ValueError(f"index dimension {resident.index.d} does not match the query embedding "
+                         f"({len(query_vec_list)}); re-ingest it")
+
+
+def comparable_hits(resident, hits, query_vec_list):
+    """
+    Tag `hits` of a resident index with their repo and give them cosine
+    distances, comparable with other repos' hits.
+    """
+    if hits and resident.metric != "cosine":
+        distances = cosine_distances(resident.index, [h["vector_id"] for h in hits], query_vec_list)
+        for hit, distance in zip(hits, distances):
+            hit["distance"] = float(distance)
+
+    for hit in hits:
+        hit["repo_name"] = resident.repo_name
+    return hits
+
+
+def _search_repo(repo_name, query_vec_list, top_k, load_path, filters):
+    from .faiss_store import search_resident
+
+    resident = get_resident(repo_name, load_path)
+    check_dimension(resident, query_vec_list)
+    return comparable_hits(resident, search_resident(resident, query_vec_list, top_k, filters), query_vec_list)
+
+
+def merge_hits(hits, top_k):
+    return heapq.nsmallest(top_k, hits, key=lambda h: h["distance"])
+
+
+def federated_search(repo_names, query_text, top_k=8, load_path="vector_store", filters=None):
+    """
+    Search every repo in `repo_names` (with the same `filters`) and merge
+    their hits into one top-k, closest first. Returns (hits, errors) where
+    each hit also carries its "repo_name" and `errors` maps repos that
+    could not be searched (not indexed, incompatible index) to the reason.
+    """
+    from .faiss_store import get_gemini_embedding
+
+    query_vec_list = get_gemini_embedding(query_text, task_type="retrieval_query")
+    if query_vec_list is None:
+        print("Failed to generate query embedding.")
+        return [], {}
+
+    futures = {repo: pool().submit(_search_repo, repo, query_vec_list, top_k, load_path, filters)
+               for repo in repo_names}
+
+    hits, errors = [], {}
+    for repo, future in futures.items():
+        try:
+            hits.extend(future.result())
+        except FileNotFoundError:
+            errors[repo] = "not indexed"
+        except Exception as e:
+            print(f"[!] Federated search skipped {repo}: {e}")
+            errors[repo] = str(e)
+
+    print(f"[+] Searched {len(repo_names) - len(errors)}/{len(repo_names)} repos")
+    return merge_hits(hits, top_k), errors
@@ -0,0 +1,65 @@
+"""
+Lexical and hybrid retrieval for one repo.
+
+    lexical  BM25 over the repo's lexical index (lexical_index.py): no
+             query embedding, so no embedding backend is needed or imported
+    hybrid   lexical and vector search, each RRF_DEPTH deep, fused by
+             reciprocal rank: score = sum over lists of 1 / (RRF_K + rank)
+
+Both return hits shaped like search_similar's, with "score" (BM25 or RRF,
+higher is better) and a "distance" derived from it, lower is closer:
+1 / (1 + BM25) for lexical, 1 - RRF / best possible RRF for hybrid. The
+repo's search rules and the query's filters apply to both lists, except
+the repo's min_lines: an exact identifier or error string is worth
+returning from a one-line chunk, so lexical results are only held to a
+min_lines the query asks for.
+"""
+import os
+
+from .index_registry import get_lexical
+from .search_filters import merge_rules, repo_rules
+
+RRF_K = 60
+RRF_DEPTH = int(os.getenv("RRF_DEPTH", 50))
+
+
+def lexical_search(repo_name, query_text, top_k=8, filters=None):
+    resident = get_lexical(repo_name)
+    rules = repo_rules(resident.repo_name)
+    rules.pop("min_lines", None)
+    rules = merge_rules(rules, filters)
+    store = resident.bundle.store
+
+    results = []
+    for row, score in resident.index.search(query_text, top_k, resident.eligible(rules)):
+        results.append({
+            "distance": 1.0 / (1.0 + score),
+            "score": score,
+            "chunk": store.chunk(row, with_content=False)
+        })
+    return results
+
+
+def fuse(ranked_lists, top_k):
+    """Reciprocal-rank fusion of hit lists, identified by chunk_id."""
+    fused = {}
+    for hits in ranked_lists:
+        for rank, hit in enumerate(hits, start=1):
+            chunk_id = hit["chunk"]["chunk_id"]
+            entry = fused.setdefault(chunk_id, {"score": 0.0, "chunk": hit["chunk"]})
+            entry["score"] += 1.0 / (RRF_K + rank)
+
+    best = len(ranked_lists) / (RRF_K + 1)
+    results = sorted(fused.values(), key=lambda e: e["score"], reverse=True)[:top_k]
+    for entry in results:
+        entry["distance"] = 1.0 - entry["score"] / best
+    return results
+
+
+def hybrid_search(repo_name, query_text, top_k=8, filters=None, load_path="vector_store"):
+    from .faiss_store import search_similar
+
+    depth = max(top_k, RRF_DEPTH)
+    lexical = lexical_search(repo_name, query_text, depth, filters)
+    vector = search_similar(repo_name, query_text, depth, load_path, filters)
+    return fuse([vector, lexical], top_k)
@@ -0,0 +1,309 @@
+"""
+FAISS index type chosen by corpus size and memory budget.
+
+    flat      exact search; up to FLAT_MAX_VECTORS vectors
+    hnsw      HNSW graph over full vectors, while it fits INDEX_MEMORY_BUDGET
+              (and up to HNSW_MAX_VECTORS)
+    ivf_flat  inverted lists of full vectors, while those fit the budget
+    ivf_pq    inverted lists of product-quantized codes otherwise
+
+Every index is wrapped in IndexIDMap2 so vectors keep stable ids. IVF
+quantizers are trained on a sample of the vectors. The search-time knobs
+(efSearch / nprobe) are stored in the index itself and listed by
+index_spec(), which goes into the bundle manifest; search_parameters()
+passes them along with a search filter's selector.
+
+Each index has one metric, fixed when it is built and recorded with it:
+    l2      squared L2 over raw vectors
+    cosine  inner product over L2-normalized vectors (stored and queries)
+    ip      inner product over raw vectors
+prepare_vectors() applies the metric's normalization to vectors being
+added and to queries alike; to_distances() turns scores into distances
+(lower is closer) whatever the metric.
+
+Vectors are stored as float32, or scalar-quantized to fp16 (half the
+memory) or sq8 (a quarter) with VECTOR_STORAGE; IVF-PQ always stores PQ
+codes. Bundles keep float32 copies of quantized flat / HNSW vectors, which
+rebuilds start from (see keeps_full_vectors).
+
+FAISS_INDEX_TYPE forces one type. Compare types and storages on real or
+synthetic data with `python -m backend.vector_store.benchmark_index`.
+"""
+import os
+import math
+
+import faiss
+import numpy as np
+
+FLAT_MAX_VECTORS = int(os.getenv("FLAT_MAX_VECTORS", 100_000))
+HNSW_MAX_VECTORS = int(os.getenv("HNSW_MAX_VECTORS", 5_000_000))
+INDEX_MEMORY_BUDGET = int(os.getenv("INDEX_MEMORY_BUDGET", 8 * 1024 * 1024 * 1024))
+FORCED_INDEX_TYPE = os.getenv("FAISS_INDEX_TYPE")
+INDEX_METRIC = os.getenv("INDEX_METRIC", "cosine")
+VECTOR_STORAGE = os.getenv("VECTOR_STORAGE", "float32")
+
+INDEX_TYPES = ("flat", "hnsw", "ivf_flat", "ivf_pq")
+METRICS = {"l2": faiss.METRIC_L2, "cosine": faiss.METRIC_INNER_PRODUCT, "ip": faiss.METRIC_INNER_PRODUCT}
+# Bytes per dimension, and the ScalarQuantizer type of quantized storages
+STORAGES = {"float32": (4, None), "fp16": (2, "QT_fp16"), "sq8": (1, "QT_8bit")}
+
+HNSW_M = 32
+HNSW_EF_CONSTRUCTION = 80
+HNSW_EF_SEARCH = int(os.getenv("HNSW_EF_SEARCH", 64))
+
+# Training points per inverted list (FAISS warns below 39, ignores above 256)
+IVF_TRAIN_PER_LIST = 64
+# PQ codebooks (256 centroids each) want ~40 points per centroid
+PQ_MIN_TRAIN = 10_000
+# Dimensions per PQ sub-quantizer: 4 turns a 3072-dim float32 vector
+# (12 KB) into a 768-byte code. Coarser codes (8, 16) cost a lot of
+# recall@10 in the benchmark.
+PQ_DIMS_PER_CODE = 4
+PQ_NBITS = 8
+
+
+def ivf_lists(n):
+    # ~4 sqrt(n) lists, but enough points left to train each one
+    return max(1, min(int(4 * math.sqrt(n)), n // 39))
+
+
+def ivf_probes(nlist):
+    return max(1, min(nlist, max(8, nlist // 32)))
+
+
+def pq_subquantizers(dim):
+    m = max(1, dim // PQ_DIMS_PER_CODE)
+    while dim % m:
+        m -= 1
+    return m
+
+
+def estimate_bytes(index_type, n, dim, storage=VECTOR_STORAGE):
+    """Rough resident size of an index of `n` vectors (id map included)."""
+    vectors = n * dim * STORAGES[storage][0]
+    id_map = n * 16
+    if index_type == "flat":
+        return vectors + id_map
+    if index_type == "hnsw":
+        # Level 0 keeps 2*M int32 neighbours per vector, upper levels ~5% more
+        return vectors + int(n * HNSW_M * 2 * 4 * 1.05) + id_map
+    nlist = ivf_lists(n)
+    if index_type == "ivf_flat":
+        return vectors + n * 8 + nlist * dim * 4 + id_map
+    m = pq_subquantizers(dim)
+    return n * (m + 8) + nlist * dim * 4 + (1 << PQ_NBITS) * dim * 4 + id_map
+
+
+def choose_index_type(n, dim, budget=INDEX_MEMORY_BUDGET, storage=VECTOR_STORAGE):
+    if FORCED_INDEX_TYPE in INDEX_TYPES:
+        return FORCED_INDEX_TYPE
+    if n <= FLAT_MAX_VECTORS:
+        return "flat"
+    if n <= HNSW_MAX_VECTORS and estimate_bytes("hnsw", n, dim, storage) <= budget:
+        return "hnsw"
+    if estimate_bytes("ivf_flat", n, dim, storage) <= budget:
+        return "ivf_flat"
+    return "ivf_pq"
+
+
+def prepare_vectors(vectors, metric):
+    """float32 copy of `vectors` (2-D), L2-normalized for the cosine metric."""
+    vectors = np.array(vectors, dtype="float32", ndmin=2)
+    if metric == "cosine":
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors /= np.where(norms > 0, norms, 1)
+    return vectors
+
+
+def to_distances(scores, metric):
+    """FAISS scores as distances, lower is closer (1 - cosine for cosine)."""
+    if metric == "cosine":
+        return 1.0 - scores
+    if metric == "ip":
+        return -scores
+    return scores
+
+
+def cosine_distances(index, ids, query):
+    """
+    1 - cosine similarity between `query` and the stored vectors `ids` of
+    an ID-mapped index (decoded). IVF indexes need their direct map (see
+    enable_reconstruct), or FAISS raises RuntimeError.
+    """
+    stored = prepare_vectors([index.reconstruct(int(i)) for i in ids], "cosine")
+    return 1.0 - stored @ prepare_vectors(query, "cosine")[0]
+
+
+def index_metric(index, recorded=None):
+    """
+    The metric an index was built with: as recorded (bundle manifest), else
+    inferred from the index. Legacy inner-product indexes were built over
+    normalized vectors (cosine).
+    """
+    if recorded in METRICS:
+        return recorded
+    return "l2" if index.metric_type == faiss.METRIC_L2 else "cosine"
+
+
+def new_index(dim, metric=INDEX_METRIC):
+    """Empty ID-mapped flat float32 index, for vectors added as they stream in."""
+    return faiss.IndexIDMap2(faiss.IndexFlat(dim, METRICS[metric]))
+
+
+def _scalar_quantizer(storage):
+    return getattr(faiss.ScalarQuantizer, STORAGES[storage][1])
+
+
+def training_sample(vectors, size, seed=0):
+    if len(vectors) <= size:
+        return vectors
+    rng = np.random.default_rng(seed)
+    return vectors[np.sort(rng.choice(len(vectors), size, replace=False))]
+
+
+def build_index(vectors, ids, index_type=None, budget=INDEX_MEMORY_BUDGET,
+                metric=INDEX_METRIC, storage=VECTOR_STORAGE):
+    """
+    ID-mapped index of the chosen (or given) type over `vectors`, which
+    are normalized as the metric requires.
+    """
+    vectors = prepare_vectors(vectors, metric)
+    ids = np.asarray(ids, dtype="int64")
+    n, dim = vectors.shape
+    index_type = index_type or choose_index_type(n, dim, budget, storage)
+    metric_type = METRICS[metric]
+    quantized = storage != "float32" and index_type != "ivf_pq"
+
+    if index_type == "flat":
+        if quantized:
+            inner = faiss.IndexScalarQuantizer(dim, _scalar_quantizer(storage), metric_type)
+        else:
+            inner = faiss.IndexFlat(dim, metric_type)
+        sample = training_sample(vectors, PQ_MIN_TRAIN)
+    elif index_type == "hnsw":
+        if quantized:
+            inner = faiss.IndexHNSWSQ(dim, _scalar_quantizer(storage), HNSW_M, metric_type)
+        else:
+            inner = faiss.IndexHNSWFlat(dim, HNSW_M, metric_type)
+        inner.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+        inner.hnsw.efSearch = HNSW_EF_SEARCH
+        sample = training_sample(vectors, PQ_MIN_TRAIN)
+    elif index_type in ("ivf_flat", "ivf_pq"):
+        nlist = ivf_lists(n)
+        quantizer = faiss.IndexFlat(dim, metric_type)
+        if index_type == "ivf_pq":
+            inner = faiss.IndexIVFPQ(quantizer, dim, nlist, pq_subquantizers(dim), PQ_NBITS, metric_type)
+            sample = training_sample(vectors, max(nlist * IVF_TRAIN_PER_LIST, PQ_MIN_TRAIN))
+        elif quantized:
+            inner = faiss.IndexIVFScalarQuantizer(quantizer, dim, nlist, _scalar_quantizer(storage), metric_type)
+            sample = training_sample(vectors, nlist * IVF_TRAIN_PER_LIST)
+        else:
+            inner = faiss.IndexIVFFlat(quantizer, dim, nlist, metric_type)
+            sample = training_sample(vectors, nlist * IVF_TRAIN_PER_LIST)
+        inner.nprobe = ivf_probes(nlist)
+    else:
+        raise ValueError(f"Unknown index type '{index_type}'")
+
+    # Flat float32 needs no training; scalar quantizers learn value ranges
+    if not inner.is_trained:
+        inner.train(sample)
+
+    # FAISS's Python wrappers keep `inner` (and the quantizer) referenced
+    index = faiss.IndexIDMap2(inner)
+    if n:
+        index.add_with_ids(vectors, ids)
+    return index
+
+
+def inner_index(index):
+    """The index under an IndexIDMap(2) wrapper (or `index` itself)."""
+    if isinstance(index, (faiss.IndexIDMap, faiss.IndexIDMap2)):
+        return faiss.downcast_index(index.index)
+    return index
+
+
+def _storage(inner):
+    sq = getattr(inner, "sq", None)
+    if sq is None and isinstance(inner, faiss.IndexHNSW):
+        sq = getattr(faiss.downcast_index(inner.storage), "sq", None)
+    if sq is not None:
+        return "fp16" if sq.qtype == faiss.ScalarQuantizer.QT_fp16 else "sq8"
+    return "pq" if isinstance(inner, faiss.IndexIVFPQ) else "float32"
+
+
+def index_spec(index):
+    """Type, storage and search-time parameters of an index, for the manifest."""
+    inner = inner_index(index)
+    spec = {"storage": _storage(inner)}
+    if isinstance(inner, faiss.IndexHNSW):
+        spec.update(type="hnsw", M=inner.hnsw.nb_neighbors(1),
+                    efConstruction=inner.hnsw.efConstruction, efSearch=inner.hnsw.efSearch)
+    elif isinstance(inner, faiss.IndexIVFPQ):
+        spec.update(type="ivf_pq", nlist=inner.nlist, nprobe=inner.nprobe, m=inner.pq.M, nbits=inner.pq.nbits)
+    elif isinstance(inner, faiss.IndexIVF):
+        spec.update(type="ivf_flat", nlist=inner.nlist, nprobe=inner.nprobe)
+    else:
+        spec.update(type="flat")
+    return spec
+
+
+def is_final(index, storage=VECTOR_STORAGE, n=None):
+    """
+    Whether the index already has the type and storage its size (or `n`
+    vectors) calls for.
+    """
+    spec = index_spec(index)
+    wanted_type = choose_index_type(index.ntotal if n is None else n, index.d, storage=storage)
+    return spec["type"] == wanted_type and spec["storage"] in (storage, "pq")
+
+
+def enable_reconstruct(index):
+    """
+    Build the direct map an IVF index needs to reconstruct vectors by id.
+    Returns the bytes it adds (8 per vector; 0 for other indexes).
+    """
+    inner = inner_index(index)
+    if not isinstance(inner, faiss.IndexIVF) or inner.direct_map.type != faiss.DirectMap.NoMap:
+        return 0
+    inner.make_direct_map()
+    return inner.ntotal * 8
+
+
+def supports_removal(index):
+    return not isinstance(inner_index(index), faiss.IndexHNSW)
+
+
+def keeps_full_vectors(index, storage=VECTOR_STORAGE):
+    """
+    Whether full-precision copies of the index's vectors are worth keeping
+    next to it: flat and HNSW indexes are rebuilt from their vectors (see
+    faiss_store.update_faiss_index), and decoding quantized ones would lose
+    precision again on every rebuild.
+    """
+    return STORAGES[storage][1] is not None and index_spec(index)["type"] in ("flat", "hnsw")
+
+
+def search_parameters(index, selector=None):
+    """
+    SearchParameters for `index` restricted to `selector`, carrying the
+    index's own efSearch / nprobe (explicit parameters replace them). None
+    when there is nothing to restrict.
+    """
+    if selector is None:
+        return None
+    inner = inner_index(index)
+    if isinstance(inner, faiss.IndexHNSW):
+        return faiss.SearchParametersHNSW(sel=selector, efSearch=inner.hnsw.efSearch)
+    if isinstance(inner, faiss.IndexIVF):
+        return faiss.SearchParametersIVF(sel=selector, nprobe=inner.nprobe)
+    return faiss.SearchParameters(sel=selector)
+
+
+def all_vectors(index):
+    """
+    (ids, vectors) of every vector in an ID-mapped flat or HNSW index
+    (decoded, so approximate for quantized storage).
+    """
+    inner = inner_index(index)
+    ids = faiss.vector_to_array(index.id_map).astype("int64")
+    return ids, inner.reconstruct_n(0, inner.ntotal)
@@ -0,0 +1,270 @@
+"""
+Process-wide registry of loaded FAISS indexes.
+
+Indexes stay resident between queries, keyed by (repo, artifact version);
+so do bundles' lexical indexes (lexical_index.py), which are memory-mapped.
+Every lookup checks the repo's published bundle version (one small read of
+CURRENT); once a re-ingest publishes a new version, the next query loads it
+and swaps it in, while queries already running finish on the index they
+hold. Entries of older versions are dropped from the registry and freed
+when their last query is done.
+
+Index files of INDEX_MMAP_MIN_BYTES and up are opened with FAISS's mmap IO
+flags: vectors are paged in from the bundle on demand instead of being
+copied to the heap, which also makes the load itself nearly free. Resident
+indexes are evicted least recently used once their estimated heap use
+passes INDEX_CACHE_BYTES.
+"""
+import os
+import time
+import threading
+
+import faiss
+import numpy as np
+
+from backend.storage.bundles import (
+    INDEX_FILE,
+    Bundle,
+    current_version,
+    open_bundle,
+    resolve_repo_key,
+    version_dir,
+)
+from backend.storage.lru import ByteLRU
+
+INDEX_CACHE_BYTES = int(os.getenv("INDEX_CACHE_BYTES", 2 * 1024 * 1024 * 1024))
+INDEX_MMAP_MIN_BYTES = int(os.getenv("INDEX_MMAP_MIN_BYTES", 64 * 1024 * 1024))
+# Compiled search filters kept per loaded index (queries can bring their
+# own filters, so these are bounded too)
+FILTER_CACHE_BYTES = int(os.getenv("FILTER_CACHE_BYTES", 16 * 1024 * 1024))
+
+# IO_FLAG_MMAP_IFC maps the stored codes of flat, HNSW and IVF indexes (on
+# FAISS versions without it, IO_FLAG_MMAP). The two cannot be combined for
+# IVF indexes. Mapped indexes are read-only.
+MMAP_IO_FLAGS = getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP) | faiss.IO_FLAG_READ_ONLY
+
+# Heap bytes per vector that stay resident even when the codes are mapped
+# (IndexIDMap2's id list and reverse id map)
+ID_MAP_BYTES = 32
+
+# ("index", repo, version) -> ResidentIndex
+# ("lexical", repo, version) -> ResidentLexical
+_registry = ByteLRU(INDEX_CACHE_BYTES)
+
+# One lock per entry being loaded, so concurrent first queries load once
+_load_locks = {}
+_locks_lock = threading.Lock()
+
+# Last version seen per repo
+_versions = {}
+
+_counters = {"loads": 0, "mmap_loads": 0, "load_seconds": 0.0, "swaps": 0}
+
+
+class ResidentIndex:
+    """
+    A loaded index with its metadata, plus the search filters compiled
+    against it (see search_filters.py), built on first use per rule set
+    and kept least recently used within FILTER_CACHE_BYTES.
+    """
+
+    def __init__(self, repo_name, version, index, metadata):
+        from .index_factory import index_metric
+
+        self.repo_name = repo_name
+        self.version = version
+        self.index = index
+        self.metadata = metadata
+        # Queries are prepared and scores read with the metric the index
+        # was built with
+        recorded = metadata.manifest.get("metric") if isinstance(metadata, Bundle) else None
+        self.metric = index_metric(index, recorded)
+        self._columns = None
+        self._filters = ByteLRU(FILTER_CACHE_BYTES)
+        self._lock = threading.Lock()
+
+    def search_filter(self, rules):
+        from .search_filters import compile_filter, rules_key, vector_columns
+
+        key = rules_key(rules)
+        compiled = self._filters.get(key)
+        if compiled is None:
+            with self._lock:
+                compiled = self._filters.get(key)
+                if compiled is None:
+                    if self._columns is None:
+                        self._columns = vector_columns(self.metadata, self.repo_name)
+                    compiled = compile_filter(self._columns, rules, self.index)
+                    self._filters.put(key, compiled, compiled.nbytes + 256)
+        return compiled
+
+
+class ResidentLexical:
+    """
+    A bundle's lexical index, plus the row masks of the search rules
+    compiled against it (see search_filters.py).
+    """
+
+    def __init__(self, repo_name, version, bundle):
+        self.repo_name = repo_name
+        self.version = version
+        self.bundle = bundle
+        self.index = bundle.lexical
+        self._columns = None
+        self._masks = ByteLRU(FILTER_CACHE_BYTES)
+        self._lock = threading.Lock()
+
+    def eligible(self, rules):
+        """Boolean mask over chunk store rows, or None when every row is eligible."""
+        from .search_filters import eligible_mask, rules_key, store_columns
+
+        key = rules_key(rules)
+        mask = self._masks.get(key)
+        if mask is None:
+            with self._lock:
+                mask = self._masks.get(key)
+                if mask is None:
+                    if self._columns is None:
+                        rows = np.arange(self.index.n_rows)
+                        self._columns = store_columns(self.bundle.store, rows, rows, self.repo_name)
+                    mask = eligible_mask(self._columns, rules)
+                    self._masks.put(key, mask, mask.nbytes + 256)
+        return None if mask.all() else mask
+
+
+def index_version(repo_name, load_path="vector_store"):
+    """
+    (version, index file) for a repo, or (None, None) if it has no index.
+    Bundled repos use their published version; legacy index files their
+    inode and mtime.
+    """
+    version = current_version(repo_name)
+    if version is not None:
+        return ("bundle", version), os.path.join(version_dir(repo_name, version), INDEX_FILE)
+
+    index_path = f"{load_path}/{repo_name}_faiss.index"
+    try:
+        st = os.stat(index_path)
+    except FileNotFoundError:
+        return None, None
+    return ("legacy", st.st_ino, st.st_mtime_ns), index_path
+
+
+def _index_cost(index, mmapped, file_bytes):
+    if mmapped:
+        return index.ntotal * ID_MAP_BYTES
+    return file_bytes + index.ntotal * ID_MAP_BYTES
+
+
+def _load(repo_name, version, index_path, load_path):
+    from .faiss_store import load_faiss_index
+    from .index_factory import enable_reconstruct
+
+    file_bytes = os.path.getsize(index_path)
+    mmapped = file_bytes >= INDEX_MMAP_MIN_BYTES
+    io_flags = MMAP_IO_FLAGS if mmapped else 0
+    start = time.perf_counter()
+    # The exact version looked up, even if a newer one was published since
+    bundle = open_bundle(repo_name, version[1]) if version[0] == "bundle" else None
+    if bundle is not None:
+        index, metadata = bundle.read_index(io_flags), bundle
+    else:
+        index, metadata = load_faiss_index(repo_name, load_path, io_flags)
+    resident = ResidentIndex(repo_name, version, index, metadata)
+    # Federated search re-scores L2 / inner-product hits from their stored
+    # vectors, which IVF indexes only give back with a direct map
+    extra = enable_reconstruct(index) if resident.metric != "cosine" else 0
+    elapsed = time.perf_counter() - start
+
+    _counters["loads"] += 1
+    _counters["mmap_loads"] += int(mmapped)
+    _counters["load_seconds"] += elapsed
+    print(f"[+] Loaded index {repo_name} ({file_bytes / 1e6:.1f} MB"
+          f"{', mmap' if mmapped else ''}) in {elapsed * 1000:.0f} ms")
+    return resident, _index_cost(index, mmapped, file_bytes) + extra
+
+
+def get_index(repo_name, load_path="vector_store"):
+    """
+    (index, metadata) of the repo's current version, loading it on first
+    use. Raises FileNotFoundError if the repo has no index.
+    """
+    resident = get_resident(repo_name, load_path)
+    return resident.index, resident.metadata
+
+
+def _seen_version(repo_name, version):
+    if _versions.get(repo_name) != version:
+        if repo_name in _versions:
+            _counters["swaps"] += 1
+        _versions[repo_name] = version
+        # Running queries keep their reference; new ones get the new version
+        _registry.invalidate(lambda key: key[1] == repo_name and key[2] != version)
+
+
+def _get_or_load(key, load):
+    entry = _registry.get(key)
+    if entry is not None:
+        return entry
+
+    with _locks_lock:
+        lock = _load_locks.setdefault(key, threading.Lock())
+    with lock:
+        entry = _registry.get(key)
+        if entry is None:
+            entry, cost = load()
+            _registry.put(key, entry, cost)
+    with _locks_lock:
+        _load_locks.pop(key, None)
+    return entry
+
+
+def get_resident(repo_name, load_path="vector_store"):
+    """The repo's current ResidentIndex (see get_index)."""
+    repo_name = resolve_repo_key(repo_name)
+    version, index_path = index_version(repo_name, load_path)
+    if version is None:
+        raise FileNotFoundError(f"No index for '{repo_name}'")
+
+    _seen_version(repo_name, version)
+    return _get_or_load(("index", repo_name, version),
+                        lambda: _load(repo_name, version, index_path, load_path))
+
+
+def _load_lexical(repo_name, version):
+    bundle = open_bundle(repo_name, version[1])
+    if bundle is None:
+        raise FileNotFoundError(f"No bundle for '{repo_name}'")
+    try:
+        resident = ResidentLexical(repo_name, version, bundle)
+    except FileNotFoundError:
+        raise FileNotFoundError(f"'{repo_name}' has no lexical index; re-ingest it")
+    print(f"[+] Opened lexical index {repo_name} ({resident.index.size / 1e6:.1f} MB, mmap)")
+    # Mapped: the heap cost is the filter columns built on first use
+    return resident, resident.index.n_rows * ID_MAP_BYTES
+
+
+def get_lexical(repo_name):
+    """
+    The ResidentLexical of the repo's published bundle, opened on first
+    use. Raises FileNotFoundError if the repo has no bundle or the bundle
+    no lexical index.
+    """
+    repo_name = resolve_repo_key(repo_name)
+    number = current_version(repo_name)
+    if number is None:
+        raise FileNotFoundError(f"No bundle for '{repo_name}'")
+
+    version = ("bundle", number)
+    _seen_version(repo_name, version)
+    return _get_or_load(("lexical", repo_name, version), lambda: _load_lexical(repo_name, version))
+
+
+def clear_registry():
+    _registry.clear()
+    _versions.clear()
+
+
+def registry_stats():
+    """Registry size and hit/miss/eviction counters plus load totals."""
+    return dict(_registry.stats(), **_counters)
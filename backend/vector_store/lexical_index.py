@@ -0,0 +1,206 @@
+"""
+Per-repo BM25 inverted index over chunk content: lexical.idx in a repo's
+artifact bundle (see backend/storage/bundles.py), next to the chunk store
+whose record rows it indexes.
+
+Tokens are code-aware: every identifier is kept whole (lowercased) and,
+when it is camelCase / snake_case / kebab-case, also split into its words,
+so "getUserById" matches queries for "getUserById" as well as "user id".
+
+Layout (little endian, sections 8-byte aligned, offsets in the header),
+read through numpy views over a memory map like the chunk store:
+
+  header    magic, version, rows, indexed rows, terms, average length
+  terms     (hash of term, postings offset, document frequency), by hash
+  docs      chunk store rows per term, ascending (uint32)
+  tfs       term frequency of each posting (uint16, saturated)
+  lengths   token count per chunk store row (0 = not indexed)
+
+Searching touches only the postings of the query's terms, and needs no
+embedding backend.
+"""
+import re
+import math
+import mmap
+import struct
+import hashlib
+from collections import Counter
+
+import numpy as np
+
+from backend.storage.atomic import atomic_write
+
+MAGIC = b"RQLEX001"
+VERSION = 1
+
+# magic, version, n_rows, n_indexed, n_terms, average length, pad, then
+# offset+length of each section
+_SECTIONS = ("terms", "docs", "tfs", "lengths")
+_HEADER = struct.Struct("<8sIIIIfI" + "QQ" * len(_SECTIONS))
+
+TERM_DTYPE = np.dtype([("hash", "<u8"), ("offset", "<u8"), ("df", "<u4"), ("pad", "<u4")])
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+MAX_TOKEN_LENGTH = 64
+
+_IDENTIFIER_RE = re.compile(r"[A-Za-z_$][A-Za-z0-9_$]*(?:-[A-Za-z0-9_$]+)*|\d+")
+# Words of an identifier: "HTTPServerError2" -> HTTP, Server, Error, 2
+_WORD_RE = re.compile(r"[A-Z]+(?=[A-Z][a-z])|[A-Z]?[a-z]+|[A-Z]+|\d+")
+
+
+def tokenize(text):
+    """Lowercased identifiers, each followed by its words when it has several."""
+    tokens = []
+    for identifier in _IDENTIFIER_RE.findall(text):
+        if len(identifier) > MAX_TOKEN_LENGTH:
+            continue
+        tokens.append(identifier.lower())
+        words = _WORD_RE.findall(identifier)
+        if len(words) > 1:
+            tokens.extend(word.lower() for word in words)
+    return tokens
+
+
+def term_hash(term):
+    return int.from_bytes(hashlib.blake2b(term.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+def is_indexable(chunk):
+    # Functions split into parts are indexed through their parts, as they
+    # are embedded
+    return bool(chunk.get("content")) and not chunk.get("parts")
+
+
+def _align(buf):
+    buf.extend(b"\0" * (-len(buf) % 8))
+
+
+def write_lexical_index(path, chunks, rows, n_rows):
+    """
+    Index the content of `chunks`, stored at chunk store `rows` (one per
+    chunk, out of `n_rows`), into a lexical index at `path`.
+    """
+    lengths = np.zeros(n_rows, dtype="<u4")
+    postings = {}
+    hashes = {}
+    for chunk, row in zip(chunks, rows):
+        if not is_indexable(chunk):
+            continue
+        counts = Counter(tokenize(chunk["content"]))
+        lengths[row] = sum(counts.values())
+        for term, tf in counts.items():
+            h = hashes.get(term)
+            if h is None:
+                h = hashes[term] = term_hash(term)
+            postings.setdefault(h, []).append((row, tf))
+
+    terms = np.zeros(len(postings), dtype=TERM_DTYPE)
+    terms["hash"] = np.fromiter(postings, dtype="<u8", count=len(postings))
+    terms.sort(order="hash")
+
+    total = sum(len(p) for p in postings.values())
+    docs = np.zeros(total, dtype="<u4")
+    tfs = np.zeros(total, dtype="<u2")
+    offset = 0
+    for entry in terms:
+        plist = sorted(postings[int(entry["hash"])])
+        entry["offset"], entry["df"] = offset, len(plist)
+        docs[offset:offset + len(plist)] = [row for row, _ in plist]
+        tfs[offset:offset + len(plist)] = [min(tf, 0xFFFF) for _, tf in plist]
+        offset += len(plist)
+
+    n_indexed = int(np.count_nonzero(lengths))
+    avg_length = float(lengths.sum()) / n_indexed if n_indexed else 0.0
+    sections = {
+        "terms": terms.tobytes(),
+        "docs": docs.tobytes(),
+        "tfs": tfs.tobytes(),
+        "lengths": lengths.tobytes(),
+    }
+
+    body = bytearray()
+    layout = []
+    for name in _SECTIONS:
+        _align(body)
+        layout.append((_HEADER.size + len(body), len(sections[name])))
+        body.extend(sections[name])
+
+    header = _HEADER.pack(MAGIC, VERSION, n_rows, n_indexed, len(terms), avg_length, 0,
+                          *[v for pair in layout for v in pair])
+    with atomic_write(path, "wb") as f:
+        f.write(header)
+        f.write(body)
+    return n_indexed, len(terms)
+
+
+class LexicalIndex:
+    """Read-only, memory-mapped view of a lexical index."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            raw = f.read(_HEADER.size)
+            if len(raw) < _HEADER.size:
+                raise ValueError(f"Truncated lexical index: {path}")
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.n_rows, self.n_indexed, self.n_terms, self.avg_length, _, *layout = \
+            _HEADER.unpack(raw)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"Not a lexical index (or unsupported version): {path}")
+        self._sections = {name: (layout[2 * i], layout[2 * i + 1]) for i, name in enumerate(_SECTIONS)}
+        self.size = len(self._mm)
+        self.terms = self._array("terms", TERM_DTYPE)
+        self.docs = self._array("docs", np.dtype("<u4"))
+        self.tfs = self._array("tfs", np.dtype("<u2"))
+        self.lengths = self._array("lengths", np.dtype("<u4"))
+
+    def _array(self, name, dtype):
+        offset, length = self._sections[name]
+        return np.frombuffer(self._mm, dtype=dtype, count=length // dtype.itemsize, offset=offset)
+
+    def close(self):
+        # Drop the numpy views first: mmap refuses to close while exported
+        self.terms = self.docs = self.tfs = self.lengths = None
+        try:
+            self._mm.close()
+        except BufferError:
+            pass
+
+    def postings(self, term):
+        """(rows, term frequencies) of a term; empty arrays if absent."""
+        h = np.uint64(term_hash(term))
+        i = int(np.searchsorted(self.terms["hash"], h))
+        if i >= len(self.terms) or self.terms["hash"][i] != h:
+            return self.docs[:0], self.tfs[:0]
+        start, df = int(self.terms["offset"][i]), int(self.terms["df"][i])
+        return self.docs[start:start + df], self.tfs[start:start + df]
+
+    def scores(self, query):
+        """BM25 score of every chunk store row for `query` (0 = no match)."""
+        scores = np.zeros(self.n_rows, dtype=np.float32)
+        if not self.n_indexed:
+            return scores
+        for term in set(tokenize(query)):
+            rows, tfs = self.postings(term)
+            if not len(rows):
+                continue
+            df = len(rows)
+            idf = math.log(1 + (self.n_indexed - df + 0.5) / (df + 0.5))
+            tf = tfs.astype(np.float32)
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * self.lengths[rows] / self.avg_length)
+            # Rows are unique within a term's postings
+            scores[rows] += idf * tf * (BM25_K1 + 1) / (tf + norm)
+        return scores
+
+    def search(self, query, top_k=8, mask=None):
+        """[(row, score)] of the top_k matching rows, best first; `mask` limits the rows."""
+        scores = self.scores(query)
+        if mask is not None:
+            scores[~mask] = 0
+        matches = np.flatnonzero(scores > 0)
+        if len(matches) > top_k:
+            matches = matches[np.argpartition(-scores[matches], top_k - 1)[:top_k]]
+        matches = matches[np.argsort(-scores[matches], kind="stable")]
+        return [(int(row), float(scores[row])) for row in matches]
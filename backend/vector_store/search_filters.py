@@ -0,0 +1,238 @@
+"""
+Which vectors a search may return, decided before the k-NN search.
+
+A repo's eligibility rules are compiled once per loaded index into a FAISS
+IDSelectorBitmap over vector ids, so every query is a single index.search
+that only ever scores eligible vectors (instead of searching, dropping
+ineligible hits and searching again deeper).
+
+Rules (all optional):
+    min_lines    - chunks spanning fewer lines are never returned
+    max_lines    - nor are chunks spanning more
+    languages    - only files of these languages ("go", "python", ...: the
+                   names shown with results, or the parser's)
+    path_prefix  - only files under this path, relative to the repo root
+    path_glob    - only files matching this fnmatch pattern ("*" also
+                   matches "/"), relative to the repo root
+    chunk_type   - "function" (parsed functions) or "fallback" (the rest)
+
+Defaults come from the environment; per-repo overrides from
+SEARCH_RULES_PATH, a JSON object keyed by "owner/name":
+
+    {"acme/tiny-scripts": {"min_lines": 3}}
+
+A query's own filters narrow its repo's rules (merge_rules). Path and
+language rules are evaluated once per file, then spread to the vectors
+through their file ids.
+"""
+import os
+import json
+import fnmatch
+
+import faiss
+import numpy as np
+
+from backend.chunking.chunk_store import FLAG_FALLBACK, FLAG_FUNCTION
+from backend.parsing.language_map import LANGUAGE_BY_EXTENSION, display_language
+from backend.storage.bundles import Bundle
+from .index_factory import search_parameters
+
+SEARCH_MIN_LINES = int(os.getenv("SEARCH_MIN_LINES", 10))
+SEARCH_RULES_PATH = os.getenv("SEARCH_RULES_PATH", "data/search_rules.json")
+# Where ingested file paths are rooted: data/repos/{owner}/{name}/...
+REPOS_PATH = "data/repos"
+
+DEFAULT_RULES = {"min_lines": SEARCH_MIN_LINES}
+
+# (mtime, parsed overrides) of SEARCH_RULES_PATH
+_overrides = {"mtime": None, "rules": {}}
+
+
+def _load_overrides(path=SEARCH_RULES_PATH):
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return {}
+    if _overrides["mtime"] != mtime:
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                rules = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"[!] Ignoring unreadable search rules {path}: {e}")
+            rules = {}
+        _overrides.update(mtime=mtime, rules=rules)
+    return _overrides["rules"]
+
+
+def repo_rules(repo_name):
+    """Effective rules for a repo: defaults updated with its overrides."""
+    return dict(DEFAULT_RULES, **_load_overrides().get(repo_name, {}))
+
+
+def merge_rules(rules, filters):
+    """
+    `rules` narrowed by a query's `filters`: line limits combine (the
+    stricter wins), other filters replace the rule of the same name.
+    """
+    merged = dict(rules)
+    for key, value in (filters or {}).items():
+        if value is None or value == []:
+            continue
+        if key == "min_lines":
+            merged[key] = max(merged.get(key) or 0, value)
+        elif key == "max_lines" and merged.get(key) is not None:
+            merged[key] = min(merged[key], value)
+        else:
+            merged[key] = value
+    return merged
+
+
+def rules_key(rules):
+    return tuple(sorted((k, tuple(v) if isinstance(v, list) else v) for k, v in rules.items()))
+
+
+def repo_relative(path, repo_name=None):
+    """
+    A stored file path relative to its repo's root: chunks record the
+    clone path, "data/repos/acme/api/src/app.py" -> "src/app.py".
+    """
+    path = path.replace("\\", "/")
+    if repo_name:
+        # Repos cloned before owner/name keys live at data/repos/{name}
+        for root in (repo_name, repo_name.rsplit("/", 1)[-1]):
+            prefix = f"{REPOS_PATH}/{root}/"
+            if path.startswith(prefix):
+                return path[len(prefix):]
+    return path
+
+
+def store_columns(store, rows, ids, repo_name=None):
+    """
+    The columns of vector_columns for chunk store `rows`, one per id in
+    `ids` (vector ids, or the rows themselves).
+    """
+    rows = np.asarray(rows, dtype=np.int64)
+    records = store.records[rows]
+    is_function = (records["flags"] & FLAG_FUNCTION) != 0
+    # Stores written before the type flags: read the type from meta
+    untyped = np.flatnonzero((records["flags"] & (FLAG_FUNCTION | FLAG_FALLBACK)) == 0)
+    for i in untyped:
+        is_function[i] = store.chunk(int(rows[i]), with_content=False).get("type") == "function"
+    return {
+        "vector_id": np.asarray(ids, dtype=np.int64),
+        "start_line": records["start_line"].astype(np.int64),
+        "end_line": records["end_line"].astype(np.int64),
+        "file_id": records["file_id"].astype(np.int64),
+        "is_function": is_function,
+        "files": [repo_relative(store.file_path(i), repo_name) for i in range(store.n_files)],
+    }
+
+
+def vector_columns(metadata, repo_name=None):
+    """
+    Per-vector numpy columns of an index's metadata (a Bundle, or legacy
+    id-keyed dict / list): "vector_id", "start_line", "end_line",
+    "file_id", "is_function", plus "files", the repo-relative path of each
+    file id.
+    """
+    if isinstance(metadata, Bundle):
+        return store_columns(metadata.store, metadata.vectors["row"], metadata.vectors["vector_id"],
+                             repo_name)
+
+    items = metadata.items() if isinstance(metadata, dict) else enumerate(metadata)
+    ids, starts, ends, file_ids, functions = [], [], [], [], []
+    files = {}
+    for vector_id, chunk in items:
+        ids.append(int(vector_id))
+        starts.append(chunk.get("start_line", 0))
+        ends.append(chunk.get("end_line", 0))
+        file_ids.append(files.setdefault(chunk.get("file_path", ""), len(files)))
+        functions.append(chunk.get("type") == "function")
+    return {
+        "vector_id": np.asarray(ids, dtype=np.int64),
+        "start_line": np.asarray(starts, dtype=np.int64),
+        "end_line": np.asarray(ends, dtype=np.int64),
+        "file_id": np.asarray(file_ids, dtype=np.int64),
+        "is_function": np.asarray(functions, dtype=bool),
+        "files": [repo_relative(path, repo_name) for path in files],
+    }
+
+
+def _file_matches(path, rules):
+    prefix = rules.get("path_prefix")
+    if prefix and not path.startswith(prefix.lstrip("/")):
+        return False
+    glob = rules.get("path_glob")
+    if glob and not fnmatch.fnmatchcase(path, glob.lstrip("/")):
+        return False
+    languages = rules.get("languages")
+    if languages:
+        ext = os.path.splitext(path)[1].lower()
+        names = {display_language(path), LANGUAGE_BY_EXTENSION.get(ext)}
+        if not names & {language.lower() for language in languages}:
+            return False
+    return True
+
+
+def eligible_mask(columns, rules):
+    mask = np.ones(len(columns["vector_id"]), dtype=bool)
+    lines = columns["end_line"] - columns["start_line"]
+    min_lines = rules.get("min_lines") or 0
+    if min_lines > 0:
+        mask &= lines >= min_lines
+    if rules.get("max_lines") is not None:
+        mask &= lines <= rules["max_lines"]
+
+    chunk_type = rules.get("chunk_type")
+    if chunk_type == "function":
+        mask &= columns["is_function"]
+    elif chunk_type == "fallback":
+        mask &= ~columns["is_function"]
+    elif chunk_type:
+        raise ValueError(f"Unknown chunk_type '{chunk_type}' (function or fallback)")
+
+    if any(rules.get(key) for key in ("path_prefix", "path_glob", "languages")):
+        files_ok = np.fromiter((_file_matches(path, rules) for path in columns["files"]),
+                               dtype=bool, count=len(columns["files"]))
+        mask &= files_ok[columns["file_id"]]
+    return mask
+
+
+class CompiledFilter:
+    """
+    Rules compiled against one loaded index: the eligibility bitmap and its
+    selector (None when every vector is eligible).
+    """
+
+    def __init__(self, vector_ids, mask, index=None):
+        self.eligible = int(mask.sum())
+        self.index = index
+        self.selector = None
+        self._bitmap = None
+        if self.eligible < len(mask):
+            ids = vector_ids[mask]
+            size = int(vector_ids.max()) + 1 if len(vector_ids) else 0
+            # Bit i of the bitmap (LSB first) marks vector id i eligible
+            bitmap = np.zeros((size + 7) // 8, dtype=np.uint8)
+            np.bitwise_or.at(bitmap, ids >> 3, (1 << (ids & 7)).astype(np.uint8))
+            # FAISS keeps a raw pointer: the array must outlive the selector
+            self._bitmap = bitmap
+            self.selector = faiss.IDSelectorBitmap(len(bitmap), faiss.swig_ptr(bitmap))
+
+    def params(self):
+        """
+        Fresh SearchParameters (the selector plus the index's efSearch /
+        nprobe) for one index.search call, or None. Never share them between
+        calls: IndexIDMap2.search swaps `params.sel` for a selector on its
+        own stack while it runs, so concurrent searches through one object
+        crash.
+        """
+        return search_parameters(self.index, self.selector)
+
+    @property
+    def nbytes(self):
+        return self._bitmap.nbytes if self._bitmap is not None else 0
+
+
+def compile_filter(columns, rules, index=None):
+    return CompiledFilter(columns["vector_id"], eligible_mask(columns, rules), index)
@@ -5,19 +5,31 @@ import numpy as np
 import faiss
 
 from sentence_transformers import SentenceTransformer, CrossEncoder
+from backend.storage.bundles import open_bundle, resolve_repo_key
+from backend.storage.content_store import hydrate_chunks
+from backend.vector_store.index_factory import index_metric, prepare_vectors
 
 def load_faiss_index(repo_name, load_path="vector_store"):
+    bundle = open_bundle(resolve_repo_key(repo_name))
+    if bundle is not None:
+        metadata = {int(i): bundle.chunk_for_vector(int(i), with_content=True)
+                    for i in bundle.vectors["vector_id"]}
+        index = bundle.read_index()
+        return index, metadata, index_metric(index, bundle.manifest.get("metric"))
     index = faiss.read_index(f"{load_path}/{repo_name}_faiss.index")
     with open(f"{load_path}/{repo_name}_metadata.pkl", "rb") as f:
         metadata = pickle.load(f)
-    return index, metadata
+    # Chunk bodies live in the shared content store
+    if isinstance(metadata, dict):
+        metadata = dict(zip(metadata, hydrate_chunks(list(metadata.values()))))
+    return index, metadata, index_metric(index)
 
 def search_similar(repo_name, query_text, top_k=50, final_k=5, load_path="vector_store"):
     # Keep raw query for reranker
     raw_query = query_text
 
     # Load index + metadata
-    index, metadata = load_faiss_index(repo_name, load_path)
+    index, metadata, metric = load_faiss_index(repo_name, load_path)
 
     # Load embedding model
     # embed_model = SentenceTransformer("BAAI/bge-small-en-v1.5")
@@ -29,9 +41,8 @@ def search_similar(repo_name, query_text, top_k=50, final_k=5, load_path="vector
     # Query embedding
     query_vec = embed_model.encode(embed_query).astype("float32")
 
-    # Normalize for cosine
-    query_vec = query_vec / np.linalg.norm(query_vec)
-    query_vec = query_vec.reshape(1, -1)
+    # Normalized as the index's metric requires
+    query_vec = prepare_vectors(query_vec, metric)
 
     # Vector search
     scores, indices = index.search(query_vec, top_k)
@@ -1,5 +1,8 @@
 from backend.vector_store.faiss_store import create_faiss_index
-from backend.embeddings.generate_embeddings_local import generate_embeddings_local
+from backend.vector_store.index_factory import INDEX_METRIC
+from backend.embeddings.generate_embeddings_local import EMBEDDING_MODEL, generate_embeddings_local
+from backend.ingestion.incremental import build_ingest_state
+from backend.storage.bundles import write_repo_bundle
 from backend.ingestion.pipeline import ingest_repo
 from backend.chunking.chunk_resolver import resolve_chunks
 # Ingest and chunk
@@ -12,5 +15,8 @@ chunks = resolve_chunks(repo_name, files)
 # Embed
 vectors, metadata = generate_embeddings_local(chunks, data["repo_name"])
 
-# Create FAISS index
-create_faiss_index(data["repo_name"], vectors, metadata)
+# Create FAISS index and publish the repo's bundle
+index = create_faiss_index(vectors)
+state = build_ingest_state(data["commit_sha"], {}, metadata, range(len(metadata)))
+write_repo_bundle(repo_name, chunks, index, {i: c["chunk_id"] for i, c in enumerate(metadata)},
+                  state, EMBEDDING_MODEL, INDEX_METRIC)
@@ -0,0 +1,66 @@
+"""
+Tests for index updates: python -m pytest backend/vector_store/test_index_update.py
+"""
+import os
+import sys
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Re-embeds a tenth of an sq8 HNSW index per update, ten times over, carrying
+# the full-precision vectors along through a bundle as incremental_ingest
+# does. Every update removes vectors from HNSW, so every one is a rebuild.
+# Exits non-zero if recall@10 against exact search moves.
+_UPDATE_REBUILDS = """
+import sys
+import tempfile
+import numpy as np
+from backend.storage.bundles import open_bundle, write_repo_bundle
+from backend.vector_store.faiss_store import create_faiss_index, update_faiss_index
+from backend.vector_store.index_factory import index_spec, prepare_vectors
+
+rng = np.random.default_rng(0)
+n, dim, k = 5000, 32, 10
+base = rng.standard_normal((n, dim)).astype("float32")
+queries = prepare_vectors(rng.standard_normal((200, dim)), "cosine")
+truth = np.argsort(-(prepare_vectors(base, "cosine") @ queries.T), axis=0)[:k].T
+
+def recall(index, row_of):
+    _, got = index.search(queries, k)
+    return np.mean([len(set(t) & {row_of[i] for i in g}) / k for t, g in zip(truth, got)])
+
+index = create_faiss_index(base, metric="cosine")
+assert index_spec(index)["type"] == "hnsw" and index_spec(index)["storage"] == "sq8"
+row_of = {i: i for i in range(n)}
+embeddings = (np.arange(n), base)
+before = recall(index, row_of)
+base_path = tempfile.mkdtemp()
+
+for r in range(10):
+    write_repo_bundle("o/r", [], index, {}, {}, "test", "cosine", base_path=base_path,
+                      embeddings=embeddings)
+    bundle = open_bundle("o/r", base_path=base_path)
+    stored = bundle.read_embeddings()
+    bundle.close()
+
+    rows = np.arange(r * 500, (r + 1) * 500)
+    remove = [i for i, row in row_of.items() if r * 500 <= row < (r + 1) * 500]
+    ids = np.arange(n + r * 500, n + (r + 1) * 500)
+    index = update_faiss_index(index, remove, base[rows], ids, "cosine", stored)
+    keep = ~np.isin(stored[0], remove)
+    embeddings = (np.concatenate([stored[0][keep], ids]), np.vstack([stored[1][keep], base[rows]]))
+    for i in remove:
+        del row_of[i]
+    row_of.update(zip(ids.tolist(), rows.tolist()))
+
+after = recall(index, row_of)
+print(before, after, file=sys.stderr)
+raise SystemExit(0 if abs(after - before) <= 0.005 else 1)
+"""
+
+
+def test_rebuilds_keep_recall_of_quantized_hnsw():
+    env = dict(os.environ, VECTOR_STORAGE="sq8", FLAT_MAX_VECTORS="0", INDEX_METRIC="cosine")
+    result = subprocess.run([sys.executable, "-c", _UPDATE_REBUILDS], cwd=ROOT, env=env,
+                            capture_output=True, text=True, timeout=600)
+    assert result.returncode == 0, result.stderr[-2000:]
@@ -0,0 +1,90 @@
+"""
+Tests for lexical and hybrid search: python -m pytest backend/vector_store/test_lexical_search.py
+"""
+import numpy as np
+
+from backend.vector_store import faiss_store, hybrid_search
+from backend.vector_store.hybrid_search import RRF_DEPTH, RRF_K, fuse
+from backend.vector_store.lexical_index import LexicalIndex, tokenize, write_lexical_index
+
+CHUNKS = [
+    {"content": "def getUserById(user_id):\n    return db.users.get(user_id)\n"},
+    {"content": "def delete_user(user_id):\n    db.users.delete(user_id)\n    audit.log('deleted', user_id)\n"},
+    {"content": "class HTTPServerError(Exception):\n    pass\n"},
+    {"content": "def render(template, context):\n    return template.format(**context)\n"},
+    # Split functions are searched through their parts
+    {"content": "def getUserById(): ...", "parts": ["p0", "p1"]},
+    {"content": ""},
+]
+
+
+def test_code_aware_tokens():
+    assert tokenize("getUserById") == ["getuserbyid", "get", "user", "by", "id"]
+    assert tokenize("HTTPServerError2") == ["httpservererror2", "http", "server", "error", "2"]
+    assert tokenize("user-id x_y") == ["user-id", "user", "id", "x_y", "x", "y"]
+
+
+def test_bm25_ranking(tmp_path):
+    path = str(tmp_path / "lexical.idx")
+    # Chunk store rows in reverse input order, as rows are sorted by path
+    rows = list(reversed(range(len(CHUNKS))))
+    assert write_lexical_index(path, CHUNKS, rows, len(CHUNKS))[0] == 4
+    index = LexicalIndex(path)
+    row_of = dict(zip(range(len(CHUNKS)), rows))
+
+    def ranked(query, **kwargs):
+        return [rows.index(row) for row, _ in index.search(query, **kwargs)]
+
+    # The whole identifier outranks chunks matching only its words
+    assert ranked("getUserById") == [0, 1]
+    # delete_user mentions both words more often
+    assert ranked("user id") == [1, 0]
+    assert ranked("server error") == [2]
+    assert ranked("template")[0] == 3
+    assert ranked("nothing matches") == []
+    assert ranked("user", top_k=1) == [1]
+
+    mask = np.ones(len(CHUNKS), dtype=bool)
+    mask[row_of[1]] = False
+    assert ranked("user id", mask=mask) == [0]
+    # Scores are positive and best first
+    scores = [score for _, score in index.search("user id")]
+    assert scores == sorted(scores, reverse=True) and scores[-1] > 0
+    index.close()
+
+
+def hits(*chunk_ids):
+    return [{"chunk": {"chunk_id": chunk_id}, "distance": 0.0} for chunk_id in chunk_ids]
+
+
+def test_reciprocal_rank_fusion():
+    fused = fuse([hits("a", "b", "c"), hits("c", "d")], top_k=3)
+
+    # c is in both lists: 1/(k+3) + 1/(k+1) beats a's 1/(k+1)
+    # b and d tie (rank 2 each); ties keep the order they were first seen in
+    assert [e["chunk"]["chunk_id"] for e in fused] == ["c", "a", "b"]
+    assert fused[0]["score"] == 1 / (RRF_K + 3) + 1 / (RRF_K + 1)
+    best = 2 / (RRF_K + 1)
+    assert [e["distance"] for e in fused] == [1 - e["score"] / best for e in fused]
+    # First in every list is the best possible fusion
+    assert fuse([hits("a"), hits("a")], 1)[0]["distance"] == 0.0
+
+
+def test_hybrid_search_fuses_vector_and_lexical_lists(monkeypatch):
+    calls = {}
+
+    def vector(repo_name, query_text, top_k, load_path, filters):
+        calls["vector"] = top_k, filters
+        return hits("v1", "both")
+
+    def lexical(repo_name, query_text, top_k, filters):
+        calls["lexical"] = top_k, filters
+        return hits("both", "l1")
+
+    monkeypatch.setattr(faiss_store, "search_similar", vector)
+    monkeypatch.setattr(hybrid_search, "lexical_search", lexical)
+    results = hybrid_search.hybrid_search("o/r", "query", top_k=2, filters={"language": "python"})
+
+    assert [r["chunk"]["chunk_id"] for r in results] == ["both", "v1"]
+    assert calls == {"vector": (RRF_DEPTH, {"language": "python"}),
+                     "lexical": (RRF_DEPTH, {"language": "python"})}
@@ -0,0 +1,89 @@
+"""
+Tests for search filters: python -m pytest backend/vector_store/test_search_filters.py
+"""
+import os
+import sys
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Many threads searching one resident index through one compiled filter, as
+# the API threadpool and the federated / batch pools do. Exits non-zero (or
+# crashes) if results differ from a single-threaded search.
+_THREADED_SEARCH = """
+import threading
+import numpy as np
+from backend.vector_store.index_factory import build_index
+from backend.vector_store.index_registry import ResidentIndex
+from backend.vector_store.faiss_store import search_resident
+
+rng = np.random.default_rng(0)
+n, dim = 20000, 64
+vectors = rng.random((n, dim)).astype("float32")
+metadata = {i: {"chunk_id": f"c{i}", "file_path": "a.py", "start_line": 0, "end_line": i % 20}
+            for i in range(n)}
+resident = ResidentIndex("o/r", ("legacy", 0), build_index(vectors, np.arange(n), "flat"), metadata)
+filters = {"min_lines": 10}
+queries = vectors[:16]
+expected = [[h["vector_id"] for h in search_resident(resident, q, 10, filters)] for q in queries]
+failures = []
+
+def run():
+    for _ in range(200):
+        for q, want in zip(queries, expected):
+            got = [h["vector_id"] for h in search_resident(resident, q, 10, filters)]
+            if got != want:
+                failures.append(got)
+
+threads = [threading.Thread(target=run) for _ in range(8)]
+for t in threads:
+    t.start()
+for t in threads:
+    t.join()
+raise SystemExit(1 if failures else 0)
+"""
+
+
+def test_concurrent_filtered_searches_share_one_compiled_filter():
+    result = subprocess.run([sys.executable, "-c", _THREADED_SEARCH], cwd=ROOT,
+                            capture_output=True, text=True, timeout=600)
+    assert result.returncode == 0, result.stderr[-2000:]
+
+
+def test_path_filters_are_repo_relative(tmp_path, monkeypatch):
+    import numpy as np
+    from backend.storage import content_store
+    from backend.storage.bundles import open_bundle, write_repo_bundle
+    from backend.vector_store.index_factory import build_index
+    from backend.vector_store.index_registry import ResidentIndex, ResidentLexical
+
+    monkeypatch.setattr(content_store, "STORE_PATH", str(tmp_path / "content_store.db"))
+    # File paths as ingest records them: rooted at the clone, data/repos/{owner}/{name}
+    repo_path = os.path.join("data/repos", "acme", "api")
+    files = ["src/billing/charge.py", "src/auth/login.py", "docs/billing.md"]
+    chunks = [{"chunk_id": f"acme/api_{name}_0", "repo_name": "acme/api", "type": "function",
+               "file_path": os.path.join(repo_path, name), "start_line": 0, "end_line": 20,
+               "content": f"def charge_{i}():\n    return retry_billing()\n"}
+              for i, name in enumerate(files)]
+    vectors = np.random.default_rng(0).random((len(chunks), 8)).astype("float32")
+    write_repo_bundle("acme/api", chunks, build_index(vectors, np.arange(len(chunks)), "flat"),
+                      {i: c["chunk_id"] for i, c in enumerate(chunks)}, {}, "test", "l2",
+                      base_path=str(tmp_path))
+    bundle = open_bundle("acme/api", base_path=str(tmp_path))
+    resident = ResidentIndex("acme/api", ("bundle", 1), bundle.read_index(), bundle)
+    lexical = ResidentLexical("acme/api", ("bundle", 1), bundle)
+
+    def files_for(**filters):
+        rules = dict(filters, min_lines=0)
+        vector_ok = resident.search_filter(rules).eligible
+        mask = lexical.eligible(rules)
+        rows = range(len(chunks)) if mask is None else np.flatnonzero(mask)
+        lexical_files = sorted(bundle.store.chunk(int(r))["file_path"] for r in rows)
+        assert vector_ok == len(lexical_files)
+        return [os.path.relpath(path, repo_path).replace("\\", "/") for path in lexical_files]
+
+    assert files_for(path_prefix="src/billing/") == ["src/billing/charge.py"]
+    assert files_for(path_prefix="/src/") == ["src/auth/login.py", "src/billing/charge.py"]
+    assert files_for(path_glob="*.md") == ["docs/billing.md"]
+    assert files_for(path_glob="src/*/login.py") == ["src/auth/login.py"]
+    assert files_for(path_prefix="data/repos/") == []
@@ -3,6 +3,20 @@ import './App.css'
 
 const API_BASE = import.meta.env.VITE_API_URL || 'http://localhost:8000/api'
 // const API_BASE =  'http://localhost:8000/api'
+const INGEST_POLL_MS = 2000
+
+// Human-readable progress line for a running ingest job
+const describeProgress = (job) => {
+  const p = job.progress
+  if (p.stage === 'queued' || p.stage === 'cloning') {
+    return 'Cloning repository...'
+  }
+  let message = `${p.files_extracted} files, ${p.chunks} chunks, ${p.vectors_indexed} vectors indexed`
+  if (job.eta_seconds != null) {
+    message += ` (about ${Math.ceil(job.eta_seconds)}s left)`
+  }
+  return message
+}
 
 
 function App() {
@@ -33,9 +47,35 @@ function App() {
         body: JSON.stringify({ url: repoUrl })
       })
 
-      const data = await response.json()
+      let job = await response.json()
 
-      if (response.ok) {
+      if (!response.ok) {
+        setIngestStatus({
+          type: 'error',
+          message: job.detail || 'Failed to process repository'
+        })
+        return
+      }
+
+      // Ingestion runs as a background job: poll until it finishes
+      while (job.status === 'queued' || job.status === 'running') {
+        await new Promise((resolve) => setTimeout(resolve, INGEST_POLL_MS))
+        const statusResponse = await fetch(`${API_BASE}/ingest/${job.job_id}`)
+        job = await statusResponse.json()
+        if (!statusResponse.ok) {
+          setIngestStatus({
+            type: 'error',
+            message: job.detail || 'Lost track of the ingest job'
+          })
+          return
+        }
+        if (job.progress) {
+          setIngestStatus({ type: 'loading', message: describeProgress(job) })
+        }
+      }
+
+      if (job.status === 'completed' && job.result) {
+        const data = job.result
         setRepoName(data.repo_name)
         setChunkCount(data.chunk_count)
         setIngestStatus({
@@ -45,7 +85,7 @@ function App() {
       } else {
         setIngestStatus({
           type: 'error',
-          message: data.detail || 'Failed to process repository'
+          message: job.error || 'Failed to process repository'
         })
       }
     } catch (error) {
@@ -110,10 +150,10 @@ function App() {
     return parts[parts.length - 1]
   }
 
-  // Get relative path (remove data/repos prefix)
+  // Get relative path (remove data/repos/{owner}/{name} prefix)
   const getRelativePath = (path) => {
     const normalized = path.replace(/\\/g, '/')
-    const match = normalized.match(/data\/repos\/[^/]+\/(.+)/)
+    const match = normalized.match(/data\/repos\/[^/]+\/[^/]+\/(.+)/)
     return match ? match[1] : normalized
   }
 